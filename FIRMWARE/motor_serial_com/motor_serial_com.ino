@@ -32,10 +32,28 @@ int stp_pins[3] = {X_STP, Y_STP, Z_STP};
 
 #define BAUD_RATE 2000000  // the rate at which data is read
 
+// Capabilities reported to the PC in reply to <HELLO,000,0,0,0> (bitmask in arg_m1)
+#define CAP_SEQ   1       // commands may carry a sequence number that is echoed back
+#define CAP_BINARY 2      // binary framing can be enabled with <FRAMING,000,1,0,0>
+#define CAP_MOVE_TO 4     // MOVE_TO moves to absolute positions
+const int capabilities = CAP_SEQ | CAP_BINARY | CAP_MOVE_TO;
+
+// Binary framing: each command is a fixed-size packet, COBS encoded and
+// terminated by a zero byte. Replies use the same format.
+#define PACKET_DELIMITER 0x00
+typedef struct __attribute__((packed)) {
+  uint8_t opcode;   // index in the functions table
+  uint8_t motors;   // motor mask, motor 1 is the most significant bit (100 = 4)
+  uint8_t seq;
+  float args[3];
+  uint16_t crc;     // CRC16-CCITT of the fields above
+} Packet;
+
 // WRITE COMMAND: <RUN,123,0.0,0.0,0.0>
 // <mode, motorID, arg_m1, arg_m2, arg_m3>
+// or, with a sequence number that is echoed back: <mode, motorID, arg_m1, arg_m2, arg_m3, seq>
 
-// Where mode is ["RUN", "STOP", "RESUME", "PAUSE", "SET_SPEED", "SET_ACCEL"]
+// Where mode is ["RUN", "STOP", "RESUME", "PAUSE", "SET_SPEED", "SET_ACCEL", "HELLO", "FRAMING", "MOVE_TO"]
 // motorID is int [1, 1, 1] (can be combo if numbers ie 100 or 101 or 001 (binary indicator)
 // arg_m1 is [any floating number]
 // arg_m2 is [any floating number]
@@ -79,6 +97,13 @@ float args[3] = {arg_m1, arg_m2, arg_m3};
 
 float remainder[3] = {0.0, 0.0, 0.0};
 
+// Sequence number of the last command (only echoed if the PC sent one)
+int seq = 0;
+boolean hasSeq = false;
+
+// Whether commands and replies use binary framing instead of <...>
+boolean binaryMode = false;
+
 unsigned long curMillis;
 
 
@@ -109,7 +134,20 @@ void _run() {
       steppers[i].move(args[i]);
     }
   }
+  _run_to_target();
+}
 
+void _move_to() {
+  // Absolute positions, in steps from where the motors were at the last SET_SPEED
+  for (int i = 0; i < 3; i += 1) {
+    if (motors[i] == 1) {
+      steppers[i].moveTo(args[i]);
+    }
+  }
+  _run_to_target();
+}
+
+void _run_to_target() {
   int stepperStatus[3] = {0, 0, 0};
 
   // Enable the steppers when in motion
@@ -180,14 +218,29 @@ void _set_accel() {
   }
 }
 
-const int function_count = 6;
+void _hello() {
+  // Nothing to do, the capabilities were already sent in the reply.
+}
+
+void _framing() {
+  // Switch after the reply, so the PC receives it in the framing it used.
+  binaryMode = args[0] != 0;
+  // Start the next frame at the beginning of the buffer.
+  bytesRecvd = 0;
+  readInProgress = false;
+}
+
+const int function_count = 9;
 const FunctionMap functions[function_count] {
   {0, "RUN", _run},
   {1, "STOP", _stop},
   {2, "RESUME", _resume},
   {3, "PAUSE", _pause},
   {4, "SET_SPEED", _set_speed},
-  {5, "SET_ACCEL", _set_accel}
+  {5, "SET_ACCEL", _set_accel},
+  {6, "HELLO", _hello},
+  {7, "FRAMING", _framing},
+  {8, "MOVE_TO", _move_to}
 };
 
 
@@ -241,6 +294,18 @@ void getDataFromPC() {
     // read the a single character
     char x = Serial.read();
 
+    if (binaryMode) {
+      if (x == PACKET_DELIMITER) {
+        parsePacket();
+        bytesRecvd = 0;
+      } else if (bytesRecvd < buffSize) {
+        inputBuffer[bytesRecvd] = x;
+        bytesRecvd ++;
+      }
+      digitalWrite(ledPin, LOW);
+      return;
+    }
+
     // the order of these IF clauses is significant
     if (x == endMarker) {
       readInProgress = false;
@@ -248,7 +313,9 @@ void getDataFromPC() {
       // clear the buffer
       inputBuffer[bytesRecvd] = 0;
       // and parse the data
-      return parseData();
+      parseData();
+      bytesRecvd = 0;
+      return;
     }
 
     if (readInProgress) {
@@ -299,9 +366,129 @@ void parseData() {
   args[1] = arg_m2;
   args[2] = arg_m3;
 
+  // optional sixth part - the sequence number
+  strtokIndx = strtok(NULL, ",");
+  hasSeq = strtokIndx != NULL;
+  if (hasSeq) {
+    seq = atoi(strtokIndx);
+  }
+
+  // Tell the PC what this firmware supports.
+  if (strcmp(mode, "HELLO") == 0) {
+    args[0] = capabilities;
+  }
+
   newDataFromPC = true;
 }
 
+// CRC16-CCITT (polynomial 0x1021, initial value 0xFFFF)
+uint16_t crc16(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int b = 0; b < 8; b++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Consistent Overhead Byte Stuffing, so that packets contain no zero bytes
+size_t cobsEncode(const uint8_t *in, size_t len, uint8_t *out) {
+  size_t codeIdx = 0;
+  size_t o = 1;
+  uint8_t code = 1;
+  for (size_t i = 0; i < len; i++) {
+    if (in[i] == 0) {
+      out[codeIdx] = code;
+      codeIdx = o++;
+      code = 1;
+    } else {
+      out[o++] = in[i];
+      code++;
+    }
+  }
+  out[codeIdx] = code;
+  return o;
+}
+
+size_t cobsDecode(const uint8_t *in, size_t len, uint8_t *out) {
+  size_t i = 0;
+  size_t o = 0;
+  while (i < len) {
+    uint8_t code = in[i];
+    if (code == 0 || i + code > len) {
+      return 0;
+    }
+    for (uint8_t k = 1; k < code; k++) {
+      out[o++] = in[i + k];
+    }
+    i += code;
+    if (i < len) {
+      out[o++] = 0;
+    }
+  }
+  return o;
+}
+
+// Here is where we take a binary packet that we have read from the serial port and parse it.
+// Corrupted packets are dropped without a reply.
+void parsePacket() {
+  Packet packet;
+
+  // A packet is always sizeof(Packet) bytes, plus one byte of COBS overhead
+  if (bytesRecvd != sizeof(Packet) + 1) {
+    return;
+  }
+  if (cobsDecode((uint8_t *)inputBuffer, bytesRecvd, (uint8_t *)&packet) != sizeof(Packet)) {
+    return;
+  }
+  if (crc16((uint8_t *)&packet, sizeof(Packet) - sizeof(packet.crc)) != packet.crc) {
+    return;
+  }
+  if (packet.opcode >= function_count) {
+    return;
+  }
+
+  strcpy(mode, functions[packet.opcode].mode);
+  motors[0] = (packet.motors >> 2) & 1;
+  motors[1] = (packet.motors >> 1) & 1;
+  motors[2] = packet.motors & 1;
+  for (int i = 0; i < 3; i += 1) {
+    args[i] = packet.args[i];
+  }
+  seq = packet.seq;
+  hasSeq = true;
+
+  if (strcmp(mode, "HELLO") == 0) {
+    args[0] = capabilities;
+  }
+
+  newDataFromPC = true;
+}
+
+void replyWithPacket() {
+  Packet packet;
+  uint8_t encoded[sizeof(Packet) + 1];
+
+  packet.opcode = 0;
+  for (int i = 0; i < function_count; i++) {
+    if (strcmp(mode, functions[i].mode) == 0) {
+      packet.opcode = functions[i].mode_idx;
+    }
+  }
+  packet.motors = (motors[0] << 2) | (motors[1] << 1) | motors[2];
+  packet.seq = seq;
+  for (int i = 0; i < 3; i += 1) {
+    packet.args[i] = args[i];
+  }
+  packet.crc = crc16((uint8_t *)&packet, sizeof(Packet) - sizeof(packet.crc));
+
+  size_t len = cobsEncode((uint8_t *)&packet, sizeof(Packet), encoded);
+  Serial.write(encoded, len);
+  Serial.write((uint8_t)PACKET_DELIMITER);
+}
+
 // Here is where we reply to the PC if we find that we have new data from the PC
 // This is executed on everyloop if we detect that we have new data from the pc
 
@@ -309,6 +496,12 @@ void replyToPC() {
   if (newDataFromPC) {
 
     newDataFromPC = false;
+    if (binaryMode) {
+      replyWithPacket();
+      executeCommand = true;
+      return;
+    }
+
     Serial.print("<");
     Serial.print(mode);
     Serial.print(",");
@@ -319,7 +512,17 @@ void replyToPC() {
     Serial.print(args[1]);
     Serial.print(",");
     Serial.print(args[2]);
-    Serial.println(">");
+    if (hasSeq) {
+      Serial.print(",");
+      Serial.print(seq);
+    }
+    if (strcmp(mode, "FRAMING") == 0) {
+      // The PC reads binary packets right after the '>', so a line ending
+      // would be taken as the start of the first packet.
+      Serial.print(">");
+    } else {
+      Serial.println(">");
+    }
 
     executeCommand = true;
   }
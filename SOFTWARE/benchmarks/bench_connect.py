@@ -0,0 +1,36 @@
+"""Connect latency of Colosseum.initialize.
+
+The firmware emulator is served on a pseudo-terminal and prints its banner
+after a simulated boot time, like an Arduino that was reset by opening the
+port. Colosseum connects to it repeatedly, and the p50/p99 of the connect
+latency (port opened to setup commands acknowledged) are reported.
+
+Run from the SOFTWARE/ folder (POSIX only) with:
+
+    python -m benchmarks.bench_connect
+"""
+import argparse
+
+from colosseum_ui import metrics
+from colosseum_ui.colosseum import Colosseum
+from colosseum_ui.emulator import FirmwareEmulator
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--connections', type=int, default=20)
+    parser.add_argument('--boot-time', type=float, default=0.0,
+                        help='simulated firmware boot time in seconds')
+    args = parser.parse_args()
+
+    for _ in range(args.connections):
+        emulator = FirmwareEmulator(boot_time=args.boot_time)
+        colosseum = Colosseum(emulator.open_pty())
+        colosseum.serial.close()
+        emulator.close_pty()
+
+    connect = metrics.latency('connect')
+    print(f'boot time {args.boot_time * 1000:.0f} ms -> {connect}')
+    print('(the fixed sleeps used to add 6 s to every connection)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Microbenchmark of frame parsing in serial_comm.listen.
+
+Compares the original byte-at-a-time listen() with the buffered FrameReader
+that now backs it. The port is replaced by an in-memory stream that hands out
+data in 64 byte USB packets, so only the host-side parsing cost is measured.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m benchmarks.bench_listen
+"""
+import argparse
+import time
+
+from colosseum_ui.serial_comm import FrameReader, listen
+
+startMarker = 60 # <
+endMarker = 62 # >
+
+class MemorySerial:
+    """Stand-in for serial.Serial that replays a fixed byte stream."""
+
+    def __init__(self, data, packet_size=64):
+        self.data = data
+        self.pos = 0
+        self.packet_size = packet_size
+
+    @property
+    def in_waiting(self):
+        return min(self.packet_size, len(self.data) - self.pos)
+
+    def inWaiting(self):
+        return self.in_waiting
+
+    def read(self, size=1):
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+def legacy_listen(s):
+    # listen() as it was before the FrameReader.
+    msg = ""
+    x = "z"
+    while True:
+        x = s.read()
+        try:
+            if ord(x) == startMarker:
+                break
+        except:
+            pass
+    while ord(x) != endMarker:
+        if ord(x) != startMarker:
+            msg = msg + x.decode()
+        x = s.read()
+    return(msg)
+
+def make_stream(n_frames):
+    frame = b'<SET_SPEED,111,1000.00,1000.00,1000.00>\r\n'
+    return frame * n_frames
+
+def bench(name, read_one, n_frames):
+    start = time.perf_counter()
+    for _ in range(n_frames):
+        read_one()
+    elapsed = time.perf_counter() - start
+    print(f'{name:>10}: {n_frames / elapsed:12,.0f} frames/s')
+    return n_frames / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--frames', type=int, default=20000)
+    args = parser.parse_args()
+
+    data = make_stream(args.frames)
+
+    s = MemorySerial(data)
+    before = bench('before', lambda: legacy_listen(s), args.frames)
+
+    s = MemorySerial(data)
+    after = bench('listen', lambda: listen(s), args.frames)
+
+    s = MemorySerial(data)
+    reader = FrameReader()
+    raw = bench('raw frames', lambda: reader.read_frame(s), args.frames)
+
+    print(f'speedup: {after / before:.1f}x (listen), {raw / before:.1f}x (raw frames)')
+
+if __name__ == '__main__':
+    main()
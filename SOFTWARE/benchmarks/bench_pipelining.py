@@ -0,0 +1,52 @@
+"""Command latency of talk() with and without sequence numbers.
+
+The firmware emulator is served on a pseudo-terminal, with a fixed turnaround
+delay before each reply. The benchmark times sending the setup commands and a
+batch of SET_SPEED commands with the plain stop-and-wait protocol (emulating
+firmware without CAP_SEQ), with sequence numbers at several window sizes, and
+with binary framing.
+
+Run from the SOFTWARE/ folder (POSIX only) with:
+
+    python -m benchmarks.bench_pipelining
+"""
+import argparse
+import time
+
+from colosseum_ui.constants import SETUP_CMDS
+from colosseum_ui.emulator import FirmwareEmulator
+from colosseum_ui.serial_comm import CAP_BINARY, CAP_SEQ, connect, listen, negotiate, talk
+
+def bench(name, capabilities, window, n, turnaround, binary=False):
+    emulator = FirmwareEmulator(capabilities=capabilities, turnaround=turnaround)
+    s = connect(emulator.open_pty())
+    listen(s, timeout=5)
+    negotiate(s, binary=binary)
+
+    start = time.perf_counter()
+    talk(s, SETUP_CMDS, window=window)
+    setup = time.perf_counter() - start
+
+    commands = ['<SET_SPEED,111,1000.0,1000.0,1000.0>'] * n
+    start = time.perf_counter()
+    talk(s, commands, window=window)
+    per_command = (time.perf_counter() - start) / n
+
+    print(f'{name:>18}: setup {setup * 1000:8.1f} ms, {per_command * 1000:7.2f} ms per command')
+    s.close()
+    emulator.close_pty()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--commands', type=int, default=50)
+    parser.add_argument('--turnaround', type=float, default=0.002,
+                        help='simulated firmware turnaround in seconds')
+    args = parser.parse_args()
+
+    bench('stop-and-wait', 0, 1, args.commands, args.turnaround)
+    for window in (1, 2, 4):
+        bench(f'sequenced window={window}', CAP_SEQ, window, args.commands, args.turnaround)
+    bench('binary window=3', CAP_SEQ | CAP_BINARY, 3, args.commands, args.turnaround, binary=True)
+
+if __name__ == '__main__':
+    main()
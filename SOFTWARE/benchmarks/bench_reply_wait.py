@@ -0,0 +1,85 @@
+"""CPU time spent waiting for replies in serial_comm.talk.
+
+A thread plays the Arduino on the master side of a pseudo-terminal and echoes
+every command after a fixed delay (standing in for the reply latency of a tube
+move). talk() is then timed with the original inWaiting() busy-spin and with
+the blocking, deadline-based wait. CPU time is measured on the calling thread
+only, so the simulated device does not count.
+
+Run from the SOFTWARE/ folder (POSIX only) with:
+
+    python -m benchmarks.bench_reply_wait
+"""
+import argparse
+import os
+import threading
+import time
+
+from colosseum_ui import serial_comm
+from colosseum_ui.serial_comm import cmd_valid, connect, listen, write_to_serial
+
+COMMAND = '<RUN,111,84,84,84>'
+
+def echo_device(fd, delay):
+    buffer = b''
+    while True:
+        try:
+            data = os.read(fd, 1024)
+        except OSError:
+            return
+        if not data:
+            return
+        buffer += data
+        while b'>' in buffer:
+            frame, buffer = buffer.split(b'>', 1)
+            time.sleep(delay)
+            os.write(fd, frame[frame.rfind(b'<'):] + b'>\r\n')
+
+def legacy_talk(s, commands):
+    # talk() as it was before the deadline-based wait (without the prints).
+    waitingForReply = False
+    for teststr in commands:
+        if not cmd_valid(teststr):
+            continue
+        if waitingForReply == False:
+            write_to_serial(s, teststr)
+            waitingForReply = True
+        if waitingForReply == True:
+            while s.inWaiting() == 0:
+                pass
+            listen(s)
+            waitingForReply = False
+        time.sleep(0.1)
+
+def bench(name, talk, s, n):
+    cpu = time.thread_time()
+    wall = time.perf_counter()
+    for _ in range(n):
+        talk(s, [COMMAND])
+    cpu = (time.thread_time() - cpu) / n
+    wall = (time.perf_counter() - wall) / n
+    print(f'{name:>6}: {cpu * 1000:8.2f} ms CPU / {wall * 1000:8.2f} ms wall per command')
+    return cpu
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--commands', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=0.2,
+                        help='simulated reply latency in seconds')
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    device = threading.Thread(target=echo_device, args=(master, args.delay), daemon=True)
+    device.start()
+    s = connect(os.ttyname(slave))
+
+    before = bench('before', legacy_talk, s, args.commands)
+    after = bench('talk', serial_comm.talk, s, args.commands)
+    print(f'CPU per command reduced {before / max(after, 1e-9):.0f}x')
+
+    s.close()
+    os.close(slave)
+    os.close(master)
+
+if __name__ == '__main__':
+    main()
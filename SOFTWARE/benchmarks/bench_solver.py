@@ -0,0 +1,55 @@
+"""Throughput of the run-parameter solver.
+
+Times unit_conversion.RunSolver solving one run at a time, as the parameter
+table does on every edit, and solving a sweep of flow rates and numbers of
+fractions in one call, against the same sweep solved in a loop.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m benchmarks.bench_solver
+    python -m benchmarks.bench_solver --flow-rates 1000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from colosseum_ui.constants import ANGLES
+from colosseum_ui.unit_conversion import RunSolver
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10000, help='number of single solves')
+    parser.add_argument('--flow-rates', type=int, default=100,
+                        help='number of flow rates in the sweep')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.n):
+        RunSolver('mL/min', 'min', 'mL', 'uL').solve(1.0, total_time=60, n_fractions=87)
+    single = (time.perf_counter() - start) / args.n
+    print(f'single run: {single * 1e6:.2f} us per solve (units included)')
+
+    solver = RunSolver('mL/min', 'min', 'mL', 'uL')
+    flow_rates = np.linspace(0.1, 10, args.flow_rates)
+    n_fractions = np.arange(1, len(ANGLES) + 1)
+    n_runs = len(flow_rates) * len(n_fractions)
+
+    start = time.perf_counter()
+    sweep = solver.solve(flow_rates[:, None], total_time=60, n_fractions=n_fractions)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looped = np.array([
+        [solver.solve(float(rate), total_time=60, n_fractions=float(n)).fraction_volume
+         for n in n_fractions]
+        for rate in flow_rates
+    ])
+    loop = time.perf_counter() - start
+
+    assert np.allclose(sweep.fraction_volume, looped)
+    print(f'sweep of {n_runs} runs: {vectorized * 1000:.2f} ms vectorized, '
+          f'{loop * 1000:.2f} ms looped ({loop / vectorized:.0f}x)')
+
+if __name__ == '__main__':
+    main()
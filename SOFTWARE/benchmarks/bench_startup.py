@@ -0,0 +1,76 @@
+"""Cold-start time of the command-line interface.
+
+Measures how long a fresh `colosseum-cli run` process takes to send its first
+command to the (emulated) Arduino: interpreter start, imports, connecting and
+the first setup command. Exits with status 1 if the median is over budget.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --budget 0.5 -n 20
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from colosseum_ui.metrics import LatencyRecorder
+
+# Seconds from starting the process to the first command sent
+STARTUP_BUDGET = 1.0
+
+FIRST_COMMAND = b'Sent from PC'
+
+def time_to_first_command(port='emulator://'):
+    """Seconds from starting `colosseum-cli run` to it sending a command."""
+    start = time.perf_counter()
+    # Commands are logged at DEBUG level, which --verbose sends to stderr.
+    process = subprocess.Popen(
+        [sys.executable, '-u', '-m', 'colosseum_ui.cli', '--verbose', 'run', port,
+         '--dwell', '0'],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    elapsed = None
+    for line in process.stderr:
+        if FIRST_COMMAND in line:
+            elapsed = time.perf_counter() - start
+            break
+    process.kill()
+    process.wait()
+    if elapsed is None:
+        raise RuntimeError('colosseum-cli exited without sending a command')
+    return elapsed
+
+def time_to_import(module):
+    """Seconds for a fresh interpreter to import 'module' and exit."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10, help='number of processes to start')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET,
+                        help=f'seconds allowed to the first command (default {STARTUP_BUDGET})')
+    args = parser.parse_args()
+
+    interpreter = LatencyRecorder('python -c pass')
+    imports = LatencyRecorder('import colosseum_ui.cli')
+    first_command = LatencyRecorder('first command')
+    for _ in range(args.n):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        interpreter.record(time.perf_counter() - start)
+        imports.record(time_to_import('colosseum_ui.cli'))
+        first_command.record(time_to_first_command())
+
+    for recorder in (interpreter, imports, first_command):
+        print(recorder)
+    if first_command.p50 > args.budget:
+        print(f'OVER BUDGET: first command after {first_command.p50:.3f} s '
+              f'(budget {args.budget:.3f} s)')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
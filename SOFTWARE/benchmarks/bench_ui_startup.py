@@ -0,0 +1,101 @@
+"""Time to window of the Qt UI.
+
+Measures how long a fresh process takes to show the main window, with the .ui
+file parsed by uic.loadUi (as the UI used to) and with the module compiled by
+colosseum_ui/ui_compile.py, and how long building the widgets alone takes.
+The window is shown on Qt's offscreen platform and the port selection popup
+is skipped, so no display or Arduino is needed. Requires PyQt5.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m benchmarks.bench_ui_startup
+    python -m benchmarks.bench_ui_startup -n 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from colosseum_ui.metrics import LatencyRecorder
+
+# Prints the seconds from interpreter start to the window being shown.
+WINDOW_SCRIPT = '''
+import sys, time
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+if {loadui}:
+    from PyQt5 import uic
+    from colosseum_ui import ui
+    from colosseum_ui.constants import UI_PATH
+    class Ui:
+        def setupUi(self, window):
+            uic.loadUi(UI_PATH, window)
+            self.window = window
+        def __getattr__(self, name):
+            return getattr(self.window, name)
+    ui.load_ui_class = lambda: Ui
+from colosseum_ui.ui import MainWindow
+MainWindow.show_port_selection_popup = lambda self: None
+window = MainWindow()
+app.processEvents()
+print(time.perf_counter() - {start})
+'''
+
+def time_to_window(loadui=False):
+    """Seconds from starting a process to its MainWindow being shown."""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    start = time.perf_counter()
+    # perf_counter is system-wide on Linux and macOS, so the child can
+    # subtract the parent's start.
+    script = WINDOW_SCRIPT.format(loadui=loadui, start=start)
+    output = subprocess.run(
+        [sys.executable, '-c', script], env=env, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    ).stdout
+    return float(output.splitlines()[-1])
+
+def time_setup(n):
+    """Seconds to build the widgets of the window with uic.loadUi and with the
+    compiled module, 'n' times each, in this process."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import uic
+    from PyQt5.QtWidgets import QApplication, QMainWindow
+    from colosseum_ui.constants import UI_PATH
+    from colosseum_ui.ui_compile import load_ui_class
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    loadui = LatencyRecorder('uic.loadUi')
+    compiled = LatencyRecorder('setupUi (compiled)')
+    Ui = load_ui_class()
+    for _ in range(n):
+        start = time.perf_counter()
+        uic.loadUi(UI_PATH, QMainWindow())
+        loadui.record(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        Ui().setupUi(QMainWindow())
+        compiled.record(time.perf_counter() - start)
+    app.processEvents()
+    return loadui, compiled
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10, help='number of processes to start')
+    args = parser.parse_args()
+
+    from colosseum_ui.ui_compile import compile_ui, is_current
+    if not is_current():
+        compile_ui()
+
+    loadui = LatencyRecorder('time to window (uic.loadUi)')
+    compiled = LatencyRecorder('time to window (compiled)')
+    for _ in range(args.n):
+        loadui.record(time_to_window(loadui=True))
+        compiled.record(time_to_window())
+
+    for recorder in (loadui, compiled, *time_setup(args.n)):
+        print(recorder)
+
+if __name__ == '__main__':
+    main()
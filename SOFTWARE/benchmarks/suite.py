@@ -0,0 +1,190 @@
+"""Benchmark suite of the host I/O path in serial_comm.
+
+Measures, against the firmware emulator served on a loopback pseudo-terminal:
+
+    * encode - command parsing/validation and encoding throughput
+    * listen - frame parsing rate of listen()
+    * talk - round-trip latency distribution of talk(), per protocol
+    * connect - Colosseum connect time
+    * startup - time for a new colosseum-cli process to send its first command
+
+Results are printed, and can be written as JSON and compared with an earlier
+run, in which case the exit status is 1 if any result regressed by more than
+the tolerance.
+
+Run from the SOFTWARE/ folder (POSIX only) with:
+
+    python -m benchmarks.suite --json results.json
+    python -m benchmarks.suite --baseline results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from colosseum_ui import metrics
+from colosseum_ui.colosseum import Colosseum
+from colosseum_ui.command import Command, as_command
+from colosseum_ui.constants import COMMANDS, SETUP_CMDS
+from colosseum_ui.emulator import FirmwareEmulator
+from colosseum_ui.serial_comm import (
+    CAP_BINARY,
+    CAP_SEQ,
+    cmd_valid,
+    connect,
+    encode_packet,
+    listen,
+    negotiate,
+    talk,
+    wait_until_ready,
+)
+
+from .bench_listen import MemorySerial, make_stream
+from .bench_startup import time_to_first_command
+
+def rate(func, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return n / (time.perf_counter() - start)
+
+def result(value, unit, better):
+    return {'value': value, 'unit': unit, 'better': better}
+
+def bench_encode(n):
+    text = COMMANDS[1].text
+    command = COMMANDS[1]
+    return {
+        'parse': result(rate(lambda: Command.parse(text), n), 'commands/s', 'higher'),
+        'validate': result(rate(lambda: cmd_valid(text), n), 'commands/s', 'higher'),
+        'build': result(
+            rate(lambda: Command('RUN', '111', (84, 84, 84)), n), 'commands/s', 'higher'
+        ),
+        'as_command': result(rate(lambda: as_command(command), n), 'commands/s', 'higher'),
+        'encode_packet': result(
+            rate(lambda: encode_packet(command, 1), n), 'packets/s', 'higher'
+        ),
+    }
+
+def bench_listen(n):
+    s = MemorySerial(make_stream(n))
+    return {'listen': result(rate(lambda: listen(s), n), 'frames/s', 'higher')}
+
+def bench_talk(n, turnaround):
+    results = {}
+    variants = (
+        ('stop-and-wait', 0, False),
+        ('sequenced', CAP_SEQ, False),
+        ('binary', CAP_SEQ | CAP_BINARY, True),
+    )
+    for name, capabilities, binary in variants:
+        emulator = FirmwareEmulator(capabilities=capabilities, turnaround=turnaround)
+        s = connect(emulator.open_pty())
+        wait_until_ready(s)
+        negotiate(s, binary=binary)
+
+        latency = metrics.LatencyRecorder(name)
+        for _ in range(n):
+            with latency.time():
+                talk(s, SETUP_CMDS[:1])
+        s.close()
+        emulator.close_pty()
+
+        results[f'{name} p50'] = result(latency.p50 * 1000, 'ms', 'lower')
+        results[f'{name} p99'] = result(latency.p99 * 1000, 'ms', 'lower')
+    return results
+
+def bench_connect(n, boot_time):
+    latency = metrics.latency('connect')
+    latency.samples.clear()
+    for _ in range(n):
+        emulator = FirmwareEmulator(boot_time=boot_time)
+        colosseum = Colosseum(emulator.open_pty())
+        colosseum.serial.close()
+        emulator.close_pty()
+    return {
+        'connect p50': result(latency.p50 * 1000, 'ms', 'lower'),
+        'connect p99': result(latency.p99 * 1000, 'ms', 'lower'),
+    }
+
+def bench_startup(n):
+    latency = metrics.LatencyRecorder('startup')
+    for _ in range(n):
+        latency.record(time_to_first_command())
+    return {
+        'first command p50': result(latency.p50 * 1000, 'ms', 'lower'),
+        'first command p99': result(latency.p99 * 1000, 'ms', 'lower'),
+    }
+
+def compare(results, baseline, tolerance, slack_ms=1.0):
+    """List the results that are worse than in 'baseline' by more than
+    'tolerance' (a fraction). Latencies within 'slack_ms' of the baseline are
+    scheduling noise and never count as regressions."""
+    regressions = []
+    for section, values in results.items():
+        for name, current in values.items():
+            before = baseline.get(section, {}).get(name)
+            if not before or not before['value']:
+                continue
+            if current['unit'] == 'ms' and abs(current['value'] - before['value']) < slack_ms:
+                continue
+            change = current['value'] / before['value'] - 1
+            if current['better'] == 'lower':
+                change = -change
+            if change < -tolerance:
+                regressions.append(
+                    f'{section}/{name}: {before["value"]:.4g} -> '
+                    f'{current["value"]:.4g} {current["unit"]}'
+                )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=20000,
+                        help='iterations of the throughput benchmarks')
+    parser.add_argument('--round-trips', type=int, default=200)
+    parser.add_argument('--connections', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=5,
+                        help='CLI processes started by the startup benchmark')
+    parser.add_argument('--turnaround', type=float, default=0.0,
+                        help='simulated firmware turnaround in seconds')
+    parser.add_argument('--boot-time', type=float, default=0.0,
+                        help='simulated firmware boot time in seconds')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare with results from this file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative regression (default 0.25)')
+    args = parser.parse_args()
+
+    results = {
+        'encode': bench_encode(args.n),
+        'listen': bench_listen(args.n),
+        'talk': bench_talk(args.round_trips, args.turnaround),
+        'connect': bench_connect(args.connections, args.boot_time),
+        'startup': bench_startup(args.processes),
+    }
+    for section, values in results.items():
+        for name, value in values.items():
+            print(f'{section:>8} {name:>20}: {value["value"]:14,.3f} {value["unit"]}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'results': results,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""asyncio version of Colosseum (see colosseum.Colosseum)."""
+import asyncio
+import logging
+import time
+
+from . import metrics
+from .async_serial_comm import (
+    AsyncSerial,
+    async_talk,
+    async_wait_until_ready,
+)
+from .colosseum import Colosseum
+from .constants import SETUP_CMDS, STOP_CMD
+from .motion import MotionModel
+from .scheduler import DeadlineScheduler
+from .serial_comm import READY_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class AsyncColosseum:
+    """asyncio version of Colosseum, where all waiting is done on the event
+    loop, so one loop can drive a whole rack of collectors:
+
+        collectors = [await AsyncColosseum.create(port) for port in ports]
+        await asyncio.gather(*(c.run(1, 'mL', 1, 'mL/min', 86) for c in collectors))
+
+    It does not negotiate capabilities with the firmware, so it always sends
+    relative RUN commands (see schedule.Schedule.relative), like Colosseum
+    does with firmware without MOVE_TO.
+    """
+    def __init__(self, port, testing=False, ready_timeout=READY_TIMEOUT, motion=None):
+        logger.info(f'[setup] initializing async Arduino connection at port {port}')
+        self.testing = testing
+        self.port = port
+        self.ready_timeout = ready_timeout
+        # Travel time of the tube moves (see Colosseum)
+        self.motion = MotionModel() if motion is None else motion
+        self.running = False
+        self.done = False
+        self.position = 0
+        self.serial = None
+        # See Colosseum. Create instances from a coroutine (see create), so
+        # that these belong to the running loop.
+        self.interrupt = asyncio.Event()
+        self.io_lock = asyncio.Lock()
+
+        # We need to cache these values to be able to resume
+        self.run_cache = None
+
+        self.start_time = None
+        # Monotonic start of the run, and the timing of every tube change
+        self.run_start = None
+        self.fractions = []
+
+    @classmethod
+    async def create(cls, port, testing=False, ready_timeout=READY_TIMEOUT, motion=None):
+        colosseum = cls(port, testing=testing, ready_timeout=ready_timeout, motion=motion)
+        await colosseum.initialize()
+        return colosseum
+
+    async def initialize(self):
+        start = time.perf_counter()
+        logger.debug(f'[setup] Connecting to port: {self.port}')
+        self.serial = await AsyncSerial.open(self.port, dry_run=self.testing)
+        boot_time = await async_wait_until_ready(
+            self.serial, timeout=self.ready_timeout
+        )
+        logger.debug(f'[setup] Arduino ready after {boot_time:.3f} s')
+
+        # Send setup commands.
+        logger.debug(f'[setup] sending setup commands')
+        await async_talk(self.serial, SETUP_CMDS)
+        if not self.testing:
+            connect_latency = metrics.latency('connect')
+            connect_latency.record(time.perf_counter() - start)
+            logger.info(f'[setup] connected, {connect_latency}')
+
+    calculate_collection_time = Colosseum.calculate_collection_time
+    make_schedule = Colosseum.make_schedule
+
+    async def run(
+        self, size_value=None, size_unit=None, flow_value=None, flow_unit=None,
+        n_fractions=None, schedule=None, flow_profile=None,
+    ):
+        if self.done:
+            raise Exception('run already completed')
+        self.run_cache = locals().copy()
+        del self.run_cache['self']
+        self.running = True
+        self.interrupt.clear()
+        if schedule is None:
+            schedule = self.make_schedule(
+                size_value, size_unit, flow_value, flow_unit, n_fractions,
+                flow_profile=flow_profile,
+            )
+        if self.start_time is None:
+            self.start_time = time.time()
+            self.run_start = time.monotonic()
+        first = self.position
+        travel = self.motion.travel_times(schedule)[first:]
+        now = time.monotonic()
+        scheduler = DeadlineScheduler(
+            changes=schedule.offsets(first), start=now, offset=now - self.run_start
+        )
+        commands = schedule.relative()
+        # Note: we assume the run starts at the 0th tube
+        for i in range(first, len(schedule)):
+            command = commands[i]
+            if not await scheduler.wait_async(i - first + 1, interrupt=self.interrupt):
+                logger.info(f'[run] pausing')
+                return
+            async with self.io_lock:
+                if not self.running:
+                    logger.info(f'[run] pausing')
+                    return
+                logger.debug(f'[run] sending command {command}')
+                sent = time.monotonic()
+                await async_talk(self.serial, [command])
+                done = time.monotonic()
+            self.fractions.append(scheduler.record(i, i - first + 1, sent, done))
+            self.position = i + 1
+
+            if not self.running:
+                logger.info(f'[run] pausing')
+                return
+
+        if self.fractions:
+            worst = max(abs(fraction.error) for fraction in self.fractions)
+            logger.info(f'[run] done, tube changes within {worst * 1000:.1f} ms of plan')
+        else:
+            logger.info('[run] done')
+        # Any command interrupts the move in progress, so let the last tube
+        # change complete before stopping.
+        if self.position > first:
+            try:
+                await asyncio.wait_for(
+                    self.interrupt.wait(), sent + travel[-1] - time.monotonic()
+                )
+            except asyncio.TimeoutError:
+                pass
+        await self.stop()
+
+    async def pause(self):
+        logger.info(f'[pause] pausing run at position {self.position}')
+        self.running = False
+        self.interrupt.set()
+
+    async def resume(self):
+        if self.run_cache is None:
+            raise Exception('run was never started')
+        logger.info(f'[resume] resuming run at position {self.position}')
+        await self.run(**self.run_cache)
+
+    async def stop(self):
+        logger.debug('[stop] stopping')
+        self.running = False
+        self.interrupt.set()
+        async with self.io_lock:
+            if self.done:
+                return
+            self.done = True
+            logger.debug('[stop] sending stop command')
+            await async_talk(self.serial, [STOP_CMD])
+            logger.debug(f'[stop] closing serial port {self.port}')
+            self.serial.close()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Async Serial Comm Utils
+
+asyncio counterparts of the utilities in serial_comm. The serial port is still
+opened and configured with pyserial, but it is then read through the event
+loop (by watching the port's file descriptor), so a single loop can talk to
+many Arduinos without a thread per device.
+
+This file can also be imported as a module and contains the following
+functions:
+
+    * AsyncSerial - asyncio wrapper around an open serial port
+    * async_listen - wait for a message from the serial port
+    * async_wait_until_ready - wait until the Arduino has booted
+    * async_talk - send multiple commands to the serial port
+"""
+
+import asyncio
+import logging
+import time
+
+from .command import as_command
+from .serial_comm import (
+    FrameReader,
+    HELLO_CMD,
+    READY_BANNER,
+    READY_TIMEOUT,
+    REPLY_TIMEOUT,
+    check_echo,
+    connect,
+)
+
+logger = logging.getLogger(__name__)
+
+class AsyncSerial:
+    """asyncio transport for a serial port opened with serial_comm.connect.
+
+    Where the event loop can watch file descriptors (all POSIX loops), incoming
+    data is read from a reader callback as soon as it arrives. Otherwise (e.g.
+    the proactor loop on Windows) each read is run in the default executor.
+    """
+
+    def __init__(self, s, dry_run=False):
+        self.serial = s
+        self.dry_run = dry_run
+        self.reader = FrameReader()
+        self._loop = asyncio.get_event_loop()
+        self._waiter = None
+        self._fd = None
+
+        if dry_run:
+            return
+        try:
+            fd = s.fileno()
+            self._loop.add_reader(fd, self._on_readable)
+        except (AttributeError, NotImplementedError):
+            return
+        self._fd = fd
+        # Reads only happen once the loop reports data, so never block.
+        s.timeout = 0
+
+    @classmethod
+    async def open(cls, port, baudrate=2000000, dry_run=False):
+        """Connect to the specified serial port.
+
+        Parameters
+        ----------
+        port : str
+            Location of the serial port.
+        baudrate : int (optional)
+            See serial_comm.connect. The default is 2000000.
+
+        Returns
+        -------
+        AsyncSerial
+            The transport wrapping the open port.
+        """
+        s = connect(port, baudrate=baudrate, dry_run=dry_run)
+        return cls(s, dry_run=dry_run)
+
+    def _on_readable(self):
+        s = self.serial
+        try:
+            data = s.read(s.in_waiting or 1)
+        except Exception as e:
+            self._wake(e)
+            return
+        if data and self.reader.feed(data):
+            self._wake()
+
+    def _wake(self, exc=None):
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+    async def read_frame(self, timeout=None):
+        """Wait until a complete frame is available and return it.
+
+        Parameters
+        ----------
+        timeout : float (optional)
+            Maximum number of seconds to wait for a frame. By default, wait
+            forever.
+
+        Returns
+        -------
+        memoryview
+            The contents of the frame, without the markers.
+
+        Raises
+        ------
+        TimeoutError
+            If no complete frame arrived before the timeout.
+        """
+        pending = self.reader.pending
+        if not pending:
+            try:
+                await asyncio.wait_for(self._wait_for_frame(), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f'no reply within {timeout} seconds') from None
+        return pending.popleft()
+
+    async def _wait_for_frame(self):
+        pending = self.reader.pending
+        while not pending:
+            if self._fd is None:
+                await self._loop.run_in_executor(None, self.reader.fill, self.serial)
+                continue
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def write(self, string):
+        """Write a string to the serial port.
+
+        Parameters
+        ----------
+        string : str or bytes
+            The string that will be sent to the arduino.
+        """
+        if self.dry_run:
+            return
+        self.serial.flushInput()
+        self.reader.clear()
+        self.serial.write(string.encode() if isinstance(string, str) else string)
+
+    def close(self):
+        """Stop watching the port and close it."""
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self.serial.close()
+
+async def async_listen(aserial, timeout=None):
+    """Wait for a string to be sent from the Arduino.
+
+    Parameters
+    ----------
+    aserial : AsyncSerial
+        The transport of the port your Arduino is interfacing.
+    timeout : float (optional)
+        Maximum number of seconds to wait for a message. By default, wait
+        forever.
+
+    Returns
+    -------
+    msg: str
+        The string that was sent from the Arduino to the computer.
+    """
+    if aserial.dry_run:
+        return ""
+
+    return str(await aserial.read_frame(timeout=timeout), 'utf-8')
+
+async def _async_wait_for_banner(aserial, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            frame = await aserial.read_frame(timeout=remaining)
+        except TimeoutError:
+            return False
+        if bytes(frame).startswith(READY_BANNER):
+            return True
+
+async def async_wait_until_ready(aserial, timeout=READY_TIMEOUT):
+    """Wait until the Arduino has booted and is ready to receive commands.
+    This follows the same handshake as serial_comm.wait_until_ready.
+
+    Parameters
+    ----------
+    aserial : AsyncSerial
+        The transport of the port your Arduino is interfacing.
+    timeout : float (optional)
+        Maximum number of seconds to wait for the banner, each time it is
+        waited for. The default is READY_TIMEOUT.
+
+    Returns
+    -------
+    float
+        The number of seconds it took until the Arduino was ready.
+
+    Raises
+    ------
+    TimeoutError
+        If the Arduino never became ready.
+    """
+    if aserial.dry_run:
+        return 0.0
+
+    start = time.monotonic()
+    if await _async_wait_for_banner(aserial, timeout):
+        return time.monotonic() - start
+
+    aserial.write(HELLO_CMD.encoded)
+    try:
+        await aserial.read_frame(timeout=1)
+        return time.monotonic() - start
+    except TimeoutError:
+        pass
+
+    aserial.reader.clear()
+    s = aserial.serial
+    try:
+        s.dtr = False
+        await asyncio.sleep(0.1)
+        s.dtr = True
+    except OSError:
+        pass
+    if await _async_wait_for_banner(aserial, timeout):
+        return time.monotonic() - start
+    raise TimeoutError(f'Arduino at {s.port} is not responding')
+
+async def async_talk(aserial, commands, timeout=REPLY_TIMEOUT):
+    """Send a list of commands to the Arduino and wait for each reply. This
+    behaves exactly like serial_comm.talk, but yields to the event loop while
+    waiting.
+
+    Parameters
+    ----------
+    aserial : AsyncSerial
+        The transport of the port your Arduino is interfacing.
+    commands : list
+        A list of Command objects or properly formatted string commands to
+        send to the Arduino. See serial_comm.talk for the structure of a
+        command.
+    timeout : float (optional)
+        Maximum number of seconds to wait for the reply to each command. The
+        default is REPLY_TIMEOUT.
+
+    Returns
+    -------
+
+    Raises
+    ------
+    TimeoutError
+        If the Arduino did not reply to a command in time.
+    """
+    for command in commands:
+        command = as_command(command)
+        if command is None:
+            continue
+        aserial.write(command.encoded)
+        logger.debug("Sent from PC -- " + command.text)
+
+        dataRecvd = await async_listen(aserial, timeout=timeout)
+        logger.debug("Reply Received -- " + dataRecvd)
+        if not aserial.dry_run:
+            check_echo(command, dataRecvd)
+
+        logger.debug("Send and receive complete")
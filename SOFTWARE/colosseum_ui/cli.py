@@ -0,0 +1,164 @@
+"""Command-line interface, without the Qt UI.
+
+Drives a collector from a terminal or a script on machines without a display:
+
+    colosseum-cli ports
+    colosseum-cli run /dev/ttyACM0 --size 1 mL --flow 1 mL/min --fractions 86
+    colosseum-cli simulate --size 1 mL --flow 1 mL/min --fractions 86
+    colosseum-cli status run.jsonl
+
+Every subcommand only imports what it needs, so the CLI starts quickly (see
+benchmarks/bench_startup.py).
+"""
+import argparse
+import json
+import logging
+import sys
+
+def _add_run_args(parser):
+    parser.add_argument('--size', nargs=2, metavar=('VALUE', 'UNIT'),
+                        help='volume per fraction, e.g. 1 mL')
+    parser.add_argument('--flow', nargs=2, metavar=('VALUE', 'UNIT'),
+                        help='flow rate, e.g. 1 mL/min')
+    parser.add_argument('--fractions', type=int,
+                        help='number of fractions (the run changes tubes once more)')
+    parser.add_argument('--dwell', type=float, nargs='+', metavar='SECONDS',
+                        help='seconds each fraction is collected for, instead of '
+                        '--size, --flow and --fractions')
+
+def _run_kwargs(parser, args):
+    if args.dwell:
+        from .schedule import Schedule
+        try:
+            return {'schedule': Schedule(args.dwell)}
+        except ValueError as e:
+            parser.error(str(e))
+    if not (args.size and args.flow and args.fractions is not None):
+        parser.error('either --dwell or all of --size, --flow and --fractions are required')
+    try:
+        size_value, flow_value = float(args.size[0]), float(args.flow[0])
+    except ValueError:
+        parser.error('--size and --flow take a number and a unit')
+    # Build the schedule once to report bad parameters before connecting.
+    from .colosseum import Colosseum
+    from .schedule import Schedule
+    try:
+        Schedule.constant(
+            Colosseum.calculate_collection_time(
+                size_value, args.size[1], flow_value, args.flow[1]
+            ),
+            args.fractions + 1,
+        )
+    except KeyError as e:
+        parser.error(f'unknown unit {e.args[0]!r}')
+    except ZeroDivisionError:
+        parser.error('--flow must not be 0')
+    except ValueError as e:
+        parser.error(str(e))
+    return {
+        'size_value': size_value,
+        'size_unit': args.size[1],
+        'flow_value': flow_value,
+        'flow_unit': args.flow[1],
+        'n_fractions': args.fractions,
+    }
+
+def _print_fractions(fractions):
+    for fraction in fractions:
+        print(
+            f'tube change {fraction.index}: planned {fraction.planned:.3f} s, '
+            f'actual {fraction.actual:.3f} s'
+        )
+
+def ports(parser, args):
+    from .serial_comm import get_arduino_ports
+    for port in get_arduino_ports(probe=args.probe, emulator=args.emulator):
+        print(f'{port.device}\t{port.description}')
+
+def run(parser, args):
+    from .colosseum import Colosseum
+    kwargs = _run_kwargs(parser, args)
+    colosseum = Colosseum(args.port, binary=args.binary, journal=args.journal)
+    try:
+        colosseum.run(**kwargs)
+    except KeyboardInterrupt:
+        print(f'interrupted at tube {colosseum.position}', file=sys.stderr)
+        colosseum.stop()
+        sys.exit(130)
+    except (KeyError, ValueError) as e:
+        colosseum.close()
+        parser.error(str(e))
+    if args.verbose:
+        _print_fractions(colosseum.fractions)
+    print(f'{colosseum.position} tube changes')
+
+def simulate(parser, args):
+    from .simulate import simulate
+    try:
+        result = simulate(port=args.port, **_run_kwargs(parser, args))
+    except (KeyError, ValueError) as e:
+        parser.error(str(e))
+    if args.verbose:
+        _print_fractions(result.fractions)
+    if args.trace:
+        with open(args.trace, 'w') as f:
+            for event in result.trace:
+                f.write(json.dumps(event) + '\n')
+    print(f'{len(result.fractions)} tube changes in {result.duration:.1f} s '
+          f'(simulated in {result.wall * 1000:.1f} ms)')
+    print(f'final motor positions: {result.positions}')
+
+def status(parser, args):
+    from .journal import replay
+    try:
+        state = replay(args.journal)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    dwell = state['dwell']
+    position = state['position']
+    print(f'port: {state["port"]}')
+    print(f'state: {state["state"]}')
+    print(f'tube changes: {position} of {len(dwell)}')
+    print(f'remaining: {sum(dwell[position:]):.1f} s')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='colosseum-cli')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_ports = subparsers.add_parser('ports', help='list the serial ports of Arduinos')
+    parser_ports.add_argument('--probe', action='store_true',
+                              help='open every port to check for the firmware')
+    parser_ports.add_argument('--emulator', action='store_true',
+                              help='also list the firmware emulator')
+    parser_ports.set_defaults(func=ports)
+
+    parser_run = subparsers.add_parser('run', help='run a collection')
+    parser_run.add_argument('port', help='serial port of the Arduino, or emulator://')
+    parser_run.add_argument('--journal', help='record the run in this file')
+    parser_run.add_argument('--binary', action='store_true',
+                            help='use binary framing if the firmware supports it')
+    _add_run_args(parser_run)
+    parser_run.set_defaults(func=run)
+
+    parser_simulate = subparsers.add_parser(
+        'simulate', help='run a collection on the emulator, on a virtual clock'
+    )
+    parser_simulate.add_argument('--port', default='emulator://',
+                                 help='emulator port, e.g. emulator://?turnaround=0.002')
+    parser_simulate.add_argument('--trace', help='write the events of the run to this file')
+    _add_run_args(parser_simulate)
+    parser_simulate.set_defaults(func=simulate)
+
+    parser_status = subparsers.add_parser('status', help='show the state of a journaled run')
+    parser_status.add_argument('journal', help='journal of the run')
+    parser_status.set_defaults(func=status)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        stream=sys.stderr, level=logging.DEBUG if args.verbose else logging.WARNING
+    )
+    args.func(parser, args)
+
+if __name__ == '__main__':
+    main()
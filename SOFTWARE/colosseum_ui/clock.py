@@ -0,0 +1,70 @@
+"""Clocks used to time runs.
+
+Everything that waits or timestamps during a run goes through a Clock, so the
+real clock can be swapped for a VirtualClock, which jumps straight to the end
+of every wait. A multi-hour run then completes in milliseconds, with the same
+commands and timings as in real time:
+
+    colosseum = Colosseum('emulator://', clock=VirtualClock())
+"""
+import time
+
+class Clock:
+    """The real clock."""
+    # Whether time only passes when something waits on the clock.
+    virtual = False
+
+    def time(self):
+        """Wall-clock time, in seconds since the epoch."""
+        return time.time()
+
+    def monotonic(self):
+        """Monotonic time, in seconds."""
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """Wait for 'seconds'."""
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """Wait for 'timeout' seconds or until 'event' (a threading.Event) is
+        set, whichever comes first.
+
+        Returns
+        -------
+        bool
+            True if the event is set.
+        """
+        return event.wait(timeout)
+
+SYSTEM_CLOCK = Clock()
+
+class VirtualClock(Clock):
+    """Simulated clock that only moves when something waits on it.
+
+    Parameters
+    ----------
+    start : float (optional)
+        Initial wall-clock time. By default, the current time.
+    """
+    virtual = True
+
+    def __init__(self, start=None):
+        self.start = time.time() if start is None else start
+        self.now = 0.0
+
+    def time(self):
+        return self.start + self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def wait(self, event, timeout):
+        if event.is_set():
+            return True
+        self.sleep(timeout)
+        return event.is_set()
@@ -1,48 +1,113 @@
 import logging
+import threading
 import time
 
+import numpy as np
+
+from . import metrics
+from .clock import SYSTEM_CLOCK
+from .command import ALL_MOTORS, Command, Mode
+from . import constants
 from .constants import (
-    COMMANDS,
     FRACSIZE_TO_UL,
     FRUNIT_TO_UL_HR,
     SETUP_CMDS,
     STOP_CMD,
 )
+from .journal import Journal, replay
+from .motion import MotionModel
+from .schedule import Schedule
+from .scheduler import DeadlineScheduler
 from .serial_comm import (
-    populate_ports,
+    CAP_MOVE_TO,
+    READY_TIMEOUT,
     connect,
-    listen,
+    negotiate,
+    remember_port,
     talk,
+    wait_until_ready,
 )
 
 logger = logging.getLogger(__name__)
 
 class Colosseum:
-    def __init__(self, port, testing=False):
+    def __init__(
+        self, port, testing=False, binary=False, ready_timeout=READY_TIMEOUT,
+        journal=None, clock=SYSTEM_CLOCK, keep_open=False, motion=None,
+        compensate_travel=False,
+    ):
         logger.info(f'[setup] initializing Arduino connection at port {port}')
         self.testing = testing
         self.port = port
+        # Time source of the run (see clock.VirtualClock to simulate runs)
+        self.clock = clock
+        # Record the run in this file or journal.Journal
+        if isinstance(journal, str):
+            journal = Journal(journal, clock=clock)
+        self.journal = journal
+        # Use binary framing if the firmware supports it.
+        self.binary = binary
+        # Maximum number of seconds to wait for the Arduino to boot
+        self.ready_timeout = ready_timeout
+        # Keep the port open at the end of a run, to start another one after
+        # reset() (see session.ColosseumSession)
+        self.keep_open = keep_open
+        self.closed = False
+        # Travel time of the tube moves, and whether to send every tube change
+        # early by it so that the tube is in place at the planned time
+        self.motion = MotionModel() if motion is None else motion
+        self.compensate_travel = compensate_travel
         self.running = False
         self.done = False
         self.position = 0
+        # Set by pause() and stop() to wake up the run loop
+        self.interrupt = threading.Event()
+        # Held while talking to the Arduino, so that stop() never closes the
+        # port in the middle of a command
+        self.io_lock = threading.Lock()
         self.initialize()
 
         # We need to cache these values to be able to resume
         self.run_cache = None
 
         self.start_time = None
+        # Monotonic start of the run, and the timing of every tube change
+        self.run_start = None
+        self.fractions = []
+        # Schedule of the current run, and the monotonic time it is expected
+        # to end at while it runs
+        self.schedule = None
+        self.run_end = None
 
     def initialize(self):
+        start = time.perf_counter()
         logger.debug(f'[setup] Connecting to port: {self.port}')
-        self.serial = connect(self.port, dry_run=self.testing)
-        if not self.testing:
-            time.sleep(5) # wait for arduino init
-        logger.debug(f'[setup] response was {listen(self.serial, dry_run=self.testing)}')
+        self.serial = connect(self.port, dry_run=self.testing, clock=self.clock)
+        boot_time = wait_until_ready(
+            self.serial, dry_run=self.testing, timeout=self.ready_timeout
+        )
+        logger.debug(f'[setup] Arduino ready after {boot_time:.3f} s')
+        self.capabilities = negotiate(
+            self.serial, dry_run=self.testing, binary=self.binary
+        )
+        logger.debug(f'[setup] firmware capabilities are {self.capabilities}')
+        # Position of the motors, in steps from the first tube of the run, when
+        # the setup commands zero the firmware's position
+        self.origin = np.zeros(3)
 
         # Send setup commands.
         logger.debug(f'[setup] sending setup commands')
-        talk(self.serial, SETUP_CMDS, dry_run=self.testing)
-        time.sleep(1)
+        talk(
+            self.serial,
+            SETUP_CMDS,
+            dry_run=self.testing,
+            window=len(SETUP_CMDS),
+        )
+        if not self.testing:
+            remember_port(self.port)
+            connect_latency = metrics.latency('connect')
+            connect_latency.record(time.perf_counter() - start)
+            logger.info(f'[setup] connected, {connect_latency}')
 
     @classmethod
     def calculate_collection_time(
@@ -53,41 +118,145 @@ class Colosseum:
         stoptime = size_value/flow_value*3600
         return stoptime
 
-    def run(
-        self, size_value, size_unit, flow_value, flow_unit, n_fractions
+    def make_schedule(
+        self, size_value, size_unit, flow_value, flow_unit, n_fractions,
+        flow_profile=None,
     ):
-        if self.done:
-            raise Exception('run already completed')
-        self.run_cache = locals().copy()
-        del self.run_cache['self']
-        self.running = True
+        """The schedule of a run collecting n_fractions + 1 fractions of
+        size_value, at a constant flow rate or following flow_profile (a
+        flow.FlowProfile)."""
+        if flow_profile is not None:
+            return flow_profile.schedule(size_value, size_unit, n_fractions + 1)
         stop_time = self.calculate_collection_time(
             size_value,
             size_unit,
             flow_value,
             flow_unit,
         )
+        return Schedule.constant(stop_time, n_fractions + 1)
+
+    def record(self, event, **fields):
+        """Record an event of the run in the journal, if there is one."""
+        if self.journal is not None:
+            self.journal.record(event, **fields)
+
+    def run(
+        self, size_value=None, size_unit=None, flow_value=None, flow_unit=None,
+        n_fractions=None, schedule=None, flow_profile=None, elapsed=0.0,
+    ):
+        """Run the fractions of a schedule (by default, n_fractions + 1
+        fractions of size_value at a constant flow rate). 'elapsed' is the
+        number of seconds the current fraction was already collected for."""
+        if self.done:
+            raise Exception('run already completed')
+        self.run_cache = locals().copy()
+        del self.run_cache['self']
+        del self.run_cache['elapsed']
+        self.running = True
+        self.interrupt.clear()
+        if schedule is None:
+            schedule = self.make_schedule(
+                size_value, size_unit, flow_value, flow_unit, n_fractions,
+                flow_profile=flow_profile,
+            )
+        self.schedule = schedule
         if self.start_time is None:
-            self.start_time = time.time()
+            self.start_time = self.clock.time()
+            self.run_start = self.clock.monotonic()
+            self.record(
+                'start',
+                port=self.port,
+                params={
+                    'size_value': size_value,
+                    'size_unit': size_unit,
+                    'flow_value': flow_value,
+                    'flow_unit': flow_unit,
+                    'n_fractions': n_fractions,
+                },
+                dwell=schedule.dwell.tolist(),
+                commands=[command.text for command in schedule.commands],
+            )
+        else:
+            self.record('resume', position=self.position)
+        # Tube changes are scheduled from now, which is the start of the run or
+        # the moment it was resumed.
+        first = self.position
+        travel = self.motion.travel_times(schedule)[first:]
+        now = self.clock.monotonic()
+        scheduler = DeadlineScheduler(
+            changes=schedule.offsets(first) - elapsed,
+            start=now,
+            offset=now - self.run_start,
+            clock=self.clock.monotonic,
+            sleep=self.clock.sleep,
+            wait_event=self.clock.wait,
+            lead=travel if self.compensate_travel else None,
+        )
+        if len(travel):
+            self.run_end = scheduler.deadline(len(travel))
+            if not self.compensate_travel:
+                self.run_end += travel[-1]
+        # Moves to absolute positions don't accumulate lost steps, and resume
+        # at any tube in a single move.
+        if self.absolute:
+            commands = schedule.absolute(self.origin)
+        else:
+            commands = schedule.relative()
         # Note: we assume the run starts at the 0th tube
-        for i in range(self.position, n_fractions+1):
-            command = COMMANDS[i]
+        for i in range(first, len(schedule)):
+            command = commands[i]
             # TODO: add priming time instead of stoptime
-            time.sleep(stop_time)
-            logger.debug(f'[run] sending command {command}')
-            talk(self.serial, [command], dry_run=self.testing)
+            if not scheduler.wait(i - first + 1, interrupt=self.interrupt):
+                logger.info(f'[run] pausing')
+                return
+            with self.io_lock:
+                if not self.running:
+                    logger.info(f'[run] pausing')
+                    return
+                logger.debug(f'[run] sending command {command}')
+                sent = self.clock.monotonic()
+                talk(self.serial, [command], dry_run=self.testing)
+                done = self.clock.monotonic()
+            fraction = scheduler.record(i, i - first + 1, sent, done)
+            self.fractions.append(fraction)
+            self.record(
+                'advance',
+                index=i,
+                position=i + 1,
+                planned=fraction.planned,
+                actual=fraction.actual,
+            )
+            logger.debug(
+                f'[run] tube change {i} at {fraction.actual:.3f} s '
+                f'({fraction.error * 1000:+.1f} ms from plan)'
+            )
             self.position = i + 1
 
             if not self.running:
                 logger.info(f'[run] pausing')
                 return
 
-        logger.info('[run] done')
-        self.stop()
+        if self.fractions:
+            worst = max(abs(fraction.error) for fraction in self.fractions)
+            logger.info(f'[run] done, tube changes within {worst * 1000:.1f} ms of plan')
+        else:
+            logger.info('[run] done')
+        # Any command interrupts the move in progress, so let the last tube
+        # change complete before stopping.
+        if self.position > first:
+            self.clock.wait(self.interrupt, sent + travel[-1] - self.clock.monotonic())
+        if self.keep_open:
+            self.running = False
+            self.done = True
+            self.record('stop', position=self.position)
+        else:
+            self.stop()
 
     def pause(self):
         logger.info(f'[pause] pausing run at position {self.position}')
         self.running = False
+        self.interrupt.set()
+        self.record('pause', position=self.position)
 
     def resume(self):
         if self.run_cache is None:
@@ -98,8 +267,191 @@ class Colosseum:
     def stop(self):
         logger.debug('[stop] stopping')
         self.running = False
-        self.done = True
-        logger.debug('[stop] sending stop command')
-        talk(self.serial, [STOP_CMD], dry_run=self.testing)
+        self.interrupt.set()
+        # Wait for any command in flight before sending STOP.
+        with self.io_lock:
+            if self.done:
+                return
+            self.done = True
+            logger.debug('[stop] sending stop command')
+            talk(self.serial, [STOP_CMD], dry_run=self.testing)
+            self.record('stop', position=self.position)
+            if not self.keep_open:
+                self._close()
+
+    def _close(self):
         logger.debug(f'[stop] closing serial port {self.port}')
+        self.closed = True
         self.serial.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def close(self):
+        """Stop any run and close the port."""
+        self.stop()
+        with self.io_lock:
+            if not self.closed:
+                self._close()
+
+    @property
+    def eta(self):
+        """Seconds until the last tube move of the run is done, None before
+        the run. While the run is paused, counted from the start of the
+        current fraction."""
+        if self.done:
+            return 0.0
+        if self.schedule is None:
+            return None
+        if self.running and self.run_end is not None:
+            return max(self.run_end - self.clock.monotonic(), 0.0)
+        offsets = self.schedule.offsets(self.position)
+        if not len(offsets):
+            return 0.0
+        return float(offsets[-1]) + self.motion.travel_times(self.schedule)[-1]
+
+    @property
+    def absolute(self):
+        """Whether the firmware moves to absolute positions (MOVE_TO)."""
+        return bool(self.capabilities & CAP_MOVE_TO)
+
+    @property
+    def motor_position(self):
+        """Position of the motors, in steps from the first tube of the run.
+        Without a schedule, that of tube 'position' (see move_to)."""
+        if self.schedule is None:
+            return np.full(3, constants.TUBE_POSITIONS[self.position], dtype=float)
+        if not self.position:
+            return np.zeros(3)
+        return self.schedule.targets()[self.position - 1]
+
+    def _move(self, target, motors=ALL_MOTORS):
+        # Move to 'target' (steps from the first tube of the run) and wait for
+        # the motors to get there.
+        target = np.asarray(target, dtype=float)
+        distance = target - self.motor_position
+        if self.absolute:
+            args = target - self.origin
+            command = Command(Mode.MOVE_TO, motors, tuple(float(arg) for arg in args))
+        else:
+            command = Command(Mode.RUN, motors, tuple(float(arg) for arg in distance))
+        with self.io_lock:
+            talk(self.serial, [command], dry_run=self.testing)
+        self.clock.sleep(max(self.motion.estimate(d) for d in distance))
+
+    def home(self):
+        """Move back to the first tube of the run, and wait for the motors to
+        get there."""
+        if not self.position:
+            return
+        logger.info(f'[home] moving back {self.position} tubes')
+        motors = ALL_MOTORS
+        if self.schedule is not None:
+            motors = int(np.bitwise_or.reduce([
+                command.motors for command in self.schedule.commands[:self.position]
+            ]))
+        self._move(np.zeros(3), motors)
+        self.record('home', position=0)
+        self.position = 0
+
+    def move_to(self, tube):
+        """Move straight to a tube (see constants.TUBE_POSITIONS) in a single
+        move, e.g. to collect into it again or to resume a run from it, and
+        wait for the motors to get there. The next run continues from there.
+        """
+        if self.running:
+            raise Exception('cannot move during a run')
+        logger.info(f'[move] moving from tube {self.position} to tube {tube}')
+        self._move(np.full(3, constants.TUBE_POSITIONS[tube], dtype=float))
+        self.record('move', position=tube)
+        self.schedule = None
+        self.position = tube
+
+    def reset(self, home=True):
+        """Get ready for a new run on the same port, after a run of a
+        Colosseum created with keep_open.
+
+        Parameters
+        ----------
+        home : bool (optional)
+            Whether to move back to the first tube of the previous run. The
+            default is True.
+        """
+        if self.running:
+            raise Exception('cannot reset during a run')
+        if self.closed:
+            raise Exception(f'serial port {self.port} is closed')
+        if home:
+            self.home()
+        self.done = False
+        self.position = 0
+        self.run_cache = None
+        self.start_time = None
+        self.run_start = None
+        self.fractions = []
+        self.schedule = None
+        self.run_end = None
+        self.interrupt.clear()
+
+    @classmethod
+    def recover(cls, journal, port=None, start=True, **kwargs):
+        """Reconnect to the Arduino of an interrupted run and resume the run
+        where its journal left off: at the same tube, for the remaining dwell
+        time of the current fraction.
+
+        Parameters
+        ----------
+        journal : str
+            The journal of the run. New events are appended to it.
+        port : str (optional)
+            Location of the serial port. By default, the port of the run.
+        start : bool (optional)
+            Whether to resume the run (blocking, like resume()). Otherwise,
+            call resume() on the returned Colosseum to do so. The default is
+            True.
+        **kwargs
+            Other arguments of Colosseum.
+
+        Returns
+        -------
+        Colosseum
+            The recovered Colosseum.
+        """
+        state = replay(journal)
+        if state['state'] == 'stop':
+            raise Exception('run already completed')
+        schedule = Schedule(
+            state['dwell'],
+            commands=[Command.parse(text) for text in state['commands']],
+        )
+        colosseum = cls(port or state['port'], journal=journal, **kwargs)
+        clock = colosseum.clock
+        position = state['position']
+        colosseum.position = position
+        colosseum.schedule = schedule
+        # Connecting zeroed the firmware's position at the current tube.
+        colosseum.origin = colosseum.motor_position.copy()
+        colosseum.start_time = state['start']
+        colosseum.run_start = clock.monotonic() - (clock.time() - state['start'])
+
+        # The current fraction kept collecting while the run was interrupted,
+        # so move on as soon as it is full.
+        elapsed = 0.0
+        if state['since'] is not None and position < len(schedule):
+            elapsed = min(clock.time() - state['since'], schedule.dwell[position])
+        colosseum.run_cache = {'schedule': schedule, 'elapsed': elapsed}
+        logger.info(
+            f'[recover] run at position {position}, fraction collected for '
+            f'{elapsed:.1f} s'
+        )
+        if start:
+            colosseum.resume()
+        return colosseum
+
+
+def __getattr__(name):
+    # AsyncColosseum needs asyncio, which is slow to import, so it lives in its
+    # own module and is only imported when used.
+    if name == 'AsyncColosseum':
+        from .async_colosseum import AsyncColosseum
+        return AsyncColosseum
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
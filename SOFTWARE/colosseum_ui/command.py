@@ -0,0 +1,211 @@
+"""Typed representation of the commands understood by the firmware.
+
+A command is sent to the Arduino as "<mode,motorID,arg_m1,arg_m2,arg_m3>".
+Command validates its fields once, when it is created, and keeps the encoded
+bytes around, so sending the same command again costs nothing. Replies from
+the firmware are parsed back into a Command, so they can be compared with what
+was sent without string manipulation.
+"""
+from enum import IntEnum
+from numbers import Real
+
+class Mode(IntEnum):
+    """Command modes, numbered like the firmware's function table."""
+    RUN = 0
+    STOP = 1
+    RESUME = 2
+    PAUSE = 3
+    SET_SPEED = 4
+    SET_ACCEL = 5
+    HELLO = 6
+    FRAMING = 7
+    MOVE_TO = 8
+
+# Motor masks are written as three binary digits, motor 1 first ("100" is
+# motor 1 only), which is exactly the mask formatted in base 2.
+ALL_MOTORS = 0b111
+
+def _parse_arg(text):
+    # Keep integers as integers so that commands re-encode exactly as written.
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+class Command:
+    """A single, validated command.
+
+    Parameters
+    ----------
+    mode : Mode, int or str
+        The command mode, e.g. Mode.RUN, 0 or 'RUN'.
+    motors : int or str
+        Mask of the motors the command applies to, either as an int between 0
+        and 7 or as a string of three binary digits, e.g. '110'.
+    args : sequence
+        The three (numeric) arguments, one per motor.
+
+    Raises
+    ------
+    ValueError
+        If any of the fields is invalid.
+    """
+    __slots__ = ('mode', 'motors', 'args', 'text', 'encoded')
+
+    def __init__(self, mode, motors, args):
+        try:
+            mode = Mode[mode] if isinstance(mode, str) else Mode(mode)
+        except (KeyError, ValueError):
+            raise ValueError(f'invalid mode {mode!r}') from None
+
+        if isinstance(motors, str):
+            if len(motors) != 3 or motors.strip('01'):
+                raise ValueError(f'invalid motor mask {motors!r}')
+            motors = int(motors, 2)
+        if not isinstance(motors, int) or not 0 <= motors <= ALL_MOTORS:
+            raise ValueError(f'invalid motor mask {motors!r}')
+
+        args = tuple(args)
+        if len(args) != 3 or not all(isinstance(arg, Real) for arg in args):
+            raise ValueError(f'expected three numeric arguments, got {args!r}')
+
+        self.mode = mode
+        self.motors = motors
+        self.args = args
+        self.text = f'<{mode.name},{motors:03b},{args[0]},{args[1]},{args[2]}>'
+        self.encoded = self.text.encode()
+
+    @classmethod
+    def parse(cls, data):
+        """Parse a command or a reply from the firmware.
+
+        Parameters
+        ----------
+        data : str, bytes or memoryview
+            The command, with or without the start and end markers. A trailing
+            sequence number (see serial_comm.negotiate) is ignored.
+
+        Returns
+        -------
+        Command
+            The parsed command.
+
+        Raises
+        ------
+        ValueError
+            If the data is not a valid command.
+        """
+        return parse_reply(data)[0]
+
+    def tagged(self, seq):
+        """Encode the command with a sequence number as its last field.
+
+        Parameters
+        ----------
+        seq : int
+            The sequence number, between 0 and 255.
+
+        Returns
+        -------
+        bytes
+            The encoded command.
+        """
+        return b'%s,%d>' % (self.encoded[:-1], seq)
+
+    def matches(self, other, ndigits=2):
+        """Whether another command (typically the firmware's echo) has the same
+        fields. The firmware prints arguments with two decimals, so arguments
+        are compared after rounding to 'ndigits'.
+
+        Parameters
+        ----------
+        other : Command
+            The command to compare with.
+
+        Returns
+        -------
+        bool
+            True if the commands match.
+        """
+        return (
+            self.mode == other.mode
+            and self.motors == other.motors
+            and all(
+                round(a, ndigits) == round(b, ndigits)
+                for a, b in zip(self.args, other.args)
+            )
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, Command):
+            return NotImplemented
+        return (self.mode, self.motors, self.args) == (other.mode, other.motors, other.args)
+
+    def __hash__(self):
+        return hash((self.mode, self.motors, self.args))
+
+    def __len__(self):
+        return len(self.encoded)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'Command({self.mode.name}, {self.motors:03b}, {self.args!r})'
+
+def parse_reply(data):
+    """Parse a reply from the firmware into the echoed command and its sequence
+    number.
+
+    Parameters
+    ----------
+    data : str, bytes or memoryview
+        The reply, with or without the start and end markers.
+
+    Returns
+    -------
+    tuple
+        The echoed Command, and the sequence number (None if the reply does not
+        have one).
+
+    Raises
+    ------
+    ValueError
+        If the data is not a valid command.
+    """
+    if not isinstance(data, str):
+        data = str(data, 'utf-8')
+    if data[:1] == '<':
+        if data[-1:] != '>':
+            raise ValueError(f'unterminated command {data!r}')
+        data = data[1:-1]
+    fields = data.split(',')
+    if len(fields) not in (5, 6):
+        raise ValueError(f'expected 5 or 6 fields, got {data!r}')
+    seq = int(fields[5]) if len(fields) == 6 else None
+    return Command(fields[0], fields[1], map(_parse_arg, fields[2:5])), seq
+
+def as_command(cmd):
+    """Convert a command string to a Command. Commands are returned as they
+    are.
+
+    Parameters
+    ----------
+    cmd : Command or str
+        The command.
+
+    Returns
+    -------
+    Command
+        The command, or None if the string is not a valid command.
+    """
+    if isinstance(cmd, Command):
+        return cmd
+    if not (cmd[:1] == '<' and cmd[-1:] == '>'):
+        return None
+    try:
+        command, seq = parse_reply(cmd)
+    except ValueError:
+        return None
+    return command if seq is None else None
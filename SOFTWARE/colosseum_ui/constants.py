@@ -1,6 +1,12 @@
+"""Constants of the host software.
+
+The tables built from angles.txt (ANGLES, COMMANDS and TUBE_POSITIONS) are
+only read when first used, to keep importing the package fast.
+"""
 import os
 from collections import namedtuple
 
+from .command import ALL_MOTORS, Command, Mode
 from .utils import (
     read_angles,
     make_commands,
@@ -13,6 +19,14 @@ ANGLES_PATH = os.path.join(DATA_DIR, 'angles.txt')
 
 PORT = namedtuple('Port', ['description', 'device'])
 TEST_PORT = PORT('test port', 'test device')
+EMULATOR_PORT = PORT('Firmware emulator', 'emulator://')
+
+# USB vendor ID of genuine Arduino boards
+ARDUINO_VID = 0x2341
+# Last port that each Arduino (by USB serial number) was successfully used on
+PORT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.colosseum', 'ports.json')
+# Tube bed geometries computed before (see geometry.tube_bed)
+GEOMETRY_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.colosseum', 'geometry')
 
 # params table mapping of setting to valid units
 SETTING_TO_UNITS_MAPPING = {
@@ -55,10 +69,27 @@ FRACSIZE_TO_UL = {
     'mL' : 1000,
 }
 
-ANGLES = read_angles(ANGLES_PATH)
-COMMANDS = make_commands(ANGLES)
-SETUP_CMDS = [
-    "<SET_ACCEL,111,1000.0,1000.0,1000.0>",
-    "<SET_SPEED,111,1000.0,1000.0,1000.0>",
-]
-STOP_CMD = "<STOP,111,0.0,0.0,0.0>"
+SETUP_CMDS = (
+    Command(Mode.SET_ACCEL, ALL_MOTORS, (1000.0, 1000.0, 1000.0)),
+    Command(Mode.SET_SPEED, ALL_MOTORS, (1000.0, 1000.0, 1000.0)),
+)
+STOP_CMD = Command(Mode.STOP, ALL_MOTORS, (0.0, 0.0, 0.0))
+
+def _tube_positions():
+    # Position of every tube, in steps from the first one
+    import numpy as np
+    return np.concatenate(([0], np.cumsum(__getattr__('ANGLES')))).astype(int)
+
+_LAZY = {
+    'ANGLES': lambda: read_angles(ANGLES_PATH),
+    'COMMANDS': lambda: make_commands(__getattr__('ANGLES')),
+    'TUBE_POSITIONS': _tube_positions,
+}
+
+def __getattr__(name):
+    # Build the table on first use and keep it as a module global, so later
+    # lookups don't come back here.
+    if name in _LAZY:
+        value = globals()[name] = _LAZY[name]()
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
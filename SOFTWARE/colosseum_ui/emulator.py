@@ -0,0 +1,657 @@
+"""Host-side emulator of the Arduino firmware (motor_serial_com.ino).
+
+The emulator answers commands exactly like the firmware does, in ASCII or
+binary framing, and keeps track of the motors like AccelStepper does, so the
+host side can be exercised and benchmarked without a board. It can be reached
+in two ways:
+
+In-process, through EmulatorTransport, which serial_comm.connect returns for
+"emulator://" ports:
+
+    s = serial_comm.connect('emulator://?turnaround=0.002')
+
+Or served on the master side of a pseudo-terminal, in which case the slave
+side behaves like the Arduino's serial port:
+
+    emulator = FirmwareEmulator()
+    port = emulator.open_pty()
+    s = serial_comm.connect(port)
+"""
+import math
+import os
+import select
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qsl, urlsplit
+
+from .command import Command, Mode
+from .serial_comm import (
+    CAP_BINARY,
+    CAP_MOVE_TO,
+    CAP_SEQ,
+    PACKET_DELIMITER,
+    Transport,
+    decode_packet,
+    encode_packet,
+)
+from .utils import move_time
+
+BANNER = b'<Arduino is ready>\r\n'
+# Seconds between checks of whether the host has opened the pseudo-terminal
+PTY_POLL_INTERVAL = 0.001
+# Seconds the banner waits for the host to flush the pseudo-terminal after
+# opening it
+PTY_OPEN_FLUSH_TIMEOUT = 0.05
+BUFFER_SIZE = 64
+# Power-on settings of the steppers, see setup()
+DEFAULT_SPEED = 1000.0  # steps per second
+DEFAULT_ACCEL = 5000.0  # steps per second per second
+
+def _atof(text):
+    # Like C's atof: parse the longest numeric prefix, 0 if there is none.
+    text = text.strip()
+    for end in range(len(text), 0, -1):
+        try:
+            return float(text[:end])
+        except ValueError:
+            pass
+    return 0.0
+
+class Stepper:
+    """Motion of a single AccelStepper. Moves follow a trapezoidal speed
+    profile: the motor accelerates at 'accel' up to 'max_speed', cruises, and
+    decelerates to stop exactly on its target. Positions are in steps."""
+
+    def __init__(self):
+        self.max_speed = DEFAULT_SPEED
+        self.accel = DEFAULT_ACCEL
+        self.position = 0.0
+        self.target = 0.0
+        # Position and time at which the current move started (None if the
+        # motor is not being run).
+        self.origin = 0.0
+        self.start = None
+
+    def move_time(self, distance):
+        """Seconds a move of 'distance' steps takes from standstill."""
+        return move_time(distance, self.max_speed, self.accel)
+
+    def travelled(self, distance, t):
+        """Number of steps covered 't' seconds into a move of 'distance'
+        steps."""
+        d = abs(distance)
+        T = self.move_time(d)
+        if t >= T:
+            return d
+        v, a = self.max_speed, self.accel
+        if v <= 0 or a <= 0:
+            return 0.0
+        t_a = min(v / a, T / 2)
+        if t < t_a:
+            return a * t * t / 2
+        if t < T - t_a:
+            return a * t_a * t_a / 2 + a * t_a * (t - t_a)
+        return d - a * (T - t) ** 2 / 2
+
+    def move(self, distance, now):
+        """Start moving 'distance' steps relative to the current position."""
+        self.update(now)
+        self.origin = self.position
+        self.target = self.position + distance
+        self.start = now
+
+    def update(self, now):
+        """Advance the motor to time 'now'."""
+        if self.start is None:
+            return
+        distance = self.target - self.origin
+        covered = self.travelled(distance, now - self.start)
+        if covered >= abs(distance):
+            self.position = self.target
+            self.start = None
+        else:
+            self.position = self.origin + math.copysign(covered, distance)
+
+    def halt(self, now):
+        """Stop running the motor, leaving the rest of the move to go."""
+        self.update(now)
+        self.start = None
+
+    @property
+    def moving(self):
+        return self.start is not None
+
+    @property
+    def distance_to_go(self):
+        return self.target - self.position
+
+    @property
+    def end(self):
+        """Time at which the current move ends, or None."""
+        if self.start is None:
+            return None
+        return self.start + self.move_time(self.target - self.origin)
+
+class FirmwareEmulator:
+    """Protocol model of motor_serial_com.ino.
+
+    Parameters
+    ----------
+    capabilities : int (optional)
+        Capability bits reported in reply to HELLO. Use 0 to emulate firmware
+        that predates the optional protocol features. The default is
+        CAP_SEQ | CAP_BINARY | CAP_MOVE_TO.
+    turnaround : float (optional)
+        Seconds the emulated firmware takes to reply to a command. The default
+        is 0.
+    boot_time : float (optional)
+        Seconds between the port being opened (or DTR being pulsed) and the
+        banner. The default is 0.
+    clock : callable (optional)
+        Time source for the motion of the motors. The default is
+        time.monotonic.
+
+    Like the firmware, RUN and RESUME start moving the selected motors and any
+    command received before they are done interrupts the move. Interrupted
+    moves are recorded in 'aborted'.
+    """
+
+    def __init__(
+        self, capabilities=CAP_SEQ | CAP_BINARY | CAP_MOVE_TO, turnaround=0.0,
+        boot_time=0.0, clock=time.monotonic,
+    ):
+        self.capabilities = capabilities
+        self.turnaround = turnaround
+        self.boot_time = boot_time
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        """Put the emulator back in its power-on state."""
+        self.binary = False
+        self.input = bytearray()
+        self.read_in_progress = False
+        self.now = self.clock()
+
+        self.steppers = [Stepper() for _ in range(3)]
+        self.remainder = [0.0, 0.0, 0.0]
+        # The RUN or RESUME command being executed.
+        self.running = None
+
+        # Every command executed, in order.
+        self.executed = []
+        # (command, steps left to go per motor) of every interrupted move
+        self.aborted = []
+
+    @property
+    def positions(self):
+        """Current position of each motor, in steps."""
+        now = self.clock()
+        for stepper in self.steppers:
+            stepper.update(now)
+        return tuple(stepper.position for stepper in self.steppers)
+
+    @property
+    def moving(self):
+        """Whether a move is in progress."""
+        end = self.motion_end
+        return end is not None and end > self.clock()
+
+    @property
+    def motion_end(self):
+        """Time at which the current move ends, or None."""
+        ends = [stepper.end for stepper in self.steppers if stepper.moving]
+        return max(ends) if ends else None
+
+    def receive(self, data, now=None):
+        """Process bytes sent by the host.
+
+        Parameters
+        ----------
+        data : bytes
+            Bytes written to the serial port by the host.
+        now : float (optional)
+            Time at which the bytes are processed. The default is the current
+            time of the clock.
+
+        Returns
+        -------
+        bytes
+            The replies of the firmware.
+        """
+        self.now = self.clock() if now is None else now
+        out = bytearray()
+        for x in data:
+            x = bytes((x,))
+            if self.binary:
+                if x == PACKET_DELIMITER:
+                    out += self._packet_received(bytes(self.input))
+                    self.input.clear()
+                elif len(self.input) < BUFFER_SIZE:
+                    self.input += x
+                continue
+
+            # Same order as getDataFromPC().
+            if x == b'>':
+                self.read_in_progress = False
+                out += self._ascii_received(bytes(self.input))
+                # parseData(), then bytesRecvd = 0. The input is only cleared
+                # where the firmware resets bytesRecvd, so that a stale index
+                # shows up here as it would on the Arduino.
+                self.input.clear()
+                continue
+            if self.read_in_progress and len(self.input) < BUFFER_SIZE - 1:
+                # The firmware keeps overwriting its last slot once the buffer
+                # is full, and that slot ends up holding the terminator.
+                self.input += x
+            if x == b'<':
+                self.input.clear()
+                self.read_in_progress = True
+        return bytes(out)
+
+    def _ascii_received(self, data):
+        fields = data.decode(errors='replace').split(',')
+        fields += [''] * (5 - len(fields))
+        mode = fields[0]
+        motors = ''.join(
+            c if c in '01' else '0' for c in (fields[1] + '000')[:3]
+        )
+        args = [_atof(field) for field in fields[2:5]]
+        seq = None
+        if len(fields) > 5:
+            try:
+                seq = int(_atof(fields[5]))
+            except OverflowError:
+                seq = 0
+        if mode == Mode.HELLO.name:
+            args[0] = self.capabilities
+        self._interrupt()
+
+        reply = f'<{mode},{motors},{args[0]:.2f},{args[1]:.2f},{args[2]:.2f}'
+        if seq is not None and self.capabilities & CAP_SEQ:
+            reply += f',{seq}'
+        # Like the firmware, no line ending after the FRAMING reply.
+        reply += '>' if mode == Mode.FRAMING.name else '>\r\n'
+        reply = reply.encode()
+
+        try:
+            command = Command(mode, motors, args)
+        except ValueError:
+            # Unknown modes are echoed but not executed.
+            return reply
+        self.execute(command)
+        return reply
+
+    def _packet_received(self, frame):
+        try:
+            command, seq = decode_packet(frame)
+        except ValueError:
+            # Corrupted packets are dropped.
+            return b''
+        self._interrupt()
+        if command.mode == Mode.HELLO:
+            command = Command(Mode.HELLO, command.motors, (self.capabilities,) + command.args[1:])
+        reply = encode_packet(command, seq)
+        self.execute(command)
+        return reply
+
+    def _interrupt(self):
+        # A command received while the motors are running ends the move.
+        if self.running is None:
+            return
+        for stepper in self.steppers:
+            stepper.halt(self.now)
+        left = tuple(stepper.distance_to_go for stepper in self.steppers)
+        if any(left):
+            self.aborted.append((self.running, left))
+        self.running = None
+
+    def _run(self, command, distances):
+        for i, stepper in enumerate(self.steppers):
+            if command.motors & (0b100 >> i):
+                stepper.move(distances[i], self.now)
+        self.running = command
+
+    def execute(self, command):
+        """Execute a command after it was acknowledged."""
+        self.executed.append(command)
+        mode = command.mode
+        selected = [
+            stepper for i, stepper in enumerate(self.steppers)
+            if command.motors & (0b100 >> i)
+        ]
+        if mode == Mode.RUN:
+            self._run(command, command.args)
+        elif mode == Mode.PAUSE:
+            self.remainder = [stepper.distance_to_go for stepper in self.steppers]
+            for stepper in self.steppers:
+                stepper.target = stepper.position
+        elif mode == Mode.STOP:
+            for stepper in self.steppers:
+                stepper.target = stepper.position
+        elif mode == Mode.RESUME:
+            self._run(command, self.remainder)
+        elif mode == Mode.MOVE_TO and self.capabilities & CAP_MOVE_TO:
+            for stepper in self.steppers:
+                stepper.update(self.now)
+            self._run(command, [
+                target - stepper.position
+                for target, stepper in zip(command.args, self.steppers)
+            ])
+        elif mode == Mode.SET_SPEED:
+            for stepper, speed in zip(self.steppers, command.args):
+                if stepper in selected:
+                    stepper.position = stepper.target = 0.0
+                    stepper.max_speed = speed
+        elif mode == Mode.SET_ACCEL:
+            for stepper, accel in zip(self.steppers, command.args):
+                if stepper in selected:
+                    stepper.accel = accel
+        elif mode == Mode.FRAMING:
+            self.binary = bool(command.args[0]) and bool(self.capabilities & CAP_BINARY)
+            # _framing() starts the next frame at the beginning of the buffer.
+            self.input.clear()
+            self.read_in_progress = False
+
+    def serve(self, fd, stop=None):
+        """Play the Arduino on the master side of a pseudo-terminal until
+        'stop' becomes readable or fd is closed.
+
+        Like the Arduino, which is reset when the port is opened, the emulator
+        is reset whenever the slave side is opened, and prints its banner
+        boot_time seconds later. pyserial flushes the input right after opening
+        the port, which would drop a banner that was already sent, so the
+        banner also waits for that flush (or PTY_OPEN_FLUSH_TIMEOUT, for hosts
+        that do not flush). A port that is closed and opened again right away
+        may not be seen closed, in which case the emulator does not reboot.
+
+        Parameters
+        ----------
+        fd : int
+            The master side of a pseudo-terminal, in packet mode (see
+            open_pty).
+        stop : int (optional)
+            File descriptor that becomes readable when the emulator should stop
+            serving, before fd is closed.
+        """
+        import termios
+
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        if stop is not None:
+            poller.register(stop, select.POLLIN)
+        connected = False
+        # Times at which the boot is done and the host has flushed, while the
+        # banner is due
+        booted_at = flushed_at = None
+
+        while True:
+            timeout = None
+            if not connected:
+                timeout = 0
+            elif booted_at is not None:
+                timeout = max(max(booted_at, flushed_at) - time.monotonic(), 0) * 1000
+            events = dict(poller.poll(timeout))
+            if stop in events:
+                return
+            events = events.get(fd, 0)
+            if events & select.POLLNVAL:
+                return
+            if events & select.POLLHUP:
+                # Nobody has the slave side open.
+                connected, booted_at = False, None
+                time.sleep(PTY_POLL_INTERVAL)
+                continue
+            if not connected:
+                connected = True
+                self.reset()
+                now = time.monotonic()
+                booted_at = now + self.boot_time
+                flushed_at = now + PTY_OPEN_FLUSH_TIMEOUT
+
+            if events & select.POLLIN:
+                try:
+                    packet = os.read(fd, 1025)
+                except OSError:
+                    return
+                if not packet:
+                    return
+                control, data = packet[0], packet[1:]
+                if control & termios.TIOCPKT_FLUSHREAD and booted_at is not None:
+                    flushed_at = time.monotonic()
+                elif data and booted_at is None:
+                    # (bytes that arrive while booting are lost)
+                    reply = self.receive(data)
+                    if reply:
+                        if self.turnaround:
+                            time.sleep(self.turnaround)
+                        os.write(fd, reply)
+            elif booted_at is not None and time.monotonic() >= max(booted_at, flushed_at):
+                os.write(fd, BANNER)
+                booted_at = None
+
+    def open_pty(self):
+        """Serve the emulator on a new pseudo-terminal (POSIX only).
+
+        Returns
+        -------
+        str
+            The path of the slave side, which can be passed to
+            serial_comm.connect like a real port.
+        """
+        import fcntl
+        import termios
+
+        master, slave = os.openpty()
+        # In packet mode, every read starts with a control byte that reports
+        # the flushes done on the slave side.
+        fcntl.ioctl(master, termios.TIOCPKT, struct.pack('i', 1))
+        port = os.ttyname(slave)
+        # Only the host keeps the slave side open, so that serve sees it being
+        # opened and closed.
+        os.close(slave)
+        self.pty = master
+        self._stop = os.pipe()
+        self._server = threading.Thread(
+            target=self.serve, args=(master, self._stop[0]), daemon=True
+        )
+        self._server.start()
+        return port
+
+    def close_pty(self):
+        """Close the pseudo-terminal opened by open_pty."""
+        # Stop serving first, so that the file descriptors are not served
+        # once they are reused.
+        os.write(self._stop[1], b'\0')
+        self._server.join()
+        for fd in (self.pty, *self._stop):
+            os.close(fd)
+
+class EmulatorTransport(Transport):
+    """In-process serial port connected to a FirmwareEmulator.
+
+    Bytes written are processed by the emulated firmware in order. While the
+    firmware is busy replying to a command (see FirmwareEmulator.turnaround),
+    further bytes wait in a 64-byte receive buffer, like the Arduino's, and
+    bytes that do not fit are dropped and counted in 'overruns'. Replies become
+    readable once the firmware is done with the command.
+
+    Parameters
+    ----------
+    emulator : FirmwareEmulator (optional)
+        The emulated firmware. By default, a new FirmwareEmulator.
+    port : str (optional)
+        Name of the port. The default is 'emulator://'.
+    sleep : callable (optional)
+        Function that advances the emulator's clock, when it is a virtual clock
+        (see clock.VirtualClock). Reads then skip ahead to the next reply
+        instead of waiting for it. By default, reads wait in real time.
+    """
+
+    def __init__(self, emulator=None, port='emulator://', sleep=None):
+        self.emulator = FirmwareEmulator() if emulator is None else emulator
+        self.port = port
+        self.timeout = 1
+        self.is_open = True
+        self.overruns = 0
+
+        self._clock = self.emulator.clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        # (arrival time, byte) not read by the firmware yet
+        self._rx = deque()
+        # (time readable, bytes) sent by the firmware
+        self._tx = deque()
+        # Time at which the firmware is done with the last command
+        self._free_at = self._clock()
+        self._dtr = True
+        self._boot()
+
+    @classmethod
+    def from_url(cls, url, clock=None):
+        """Create a transport from an "emulator://" URL. The query sets the
+        FirmwareEmulator parameters, e.g.
+        "emulator://?capabilities=0&turnaround=0.002&boot_time=1.5".
+        The emulator runs on 'clock' (a clock.Clock), by default the real
+        clock.
+        """
+        options = dict(parse_qsl(urlsplit(url).query))
+        emulator = FirmwareEmulator(
+            capabilities=int(
+                options.get('capabilities', CAP_SEQ | CAP_BINARY | CAP_MOVE_TO)
+            ),
+            turnaround=float(options.get('turnaround', 0.0)),
+            boot_time=float(options.get('boot_time', 0.0)),
+            clock=time.monotonic if clock is None else clock.monotonic,
+        )
+        sleep = clock.sleep if getattr(clock, 'virtual', False) else None
+        return cls(emulator, port=url, sleep=sleep)
+
+    def _boot(self):
+        self.emulator.reset()
+        self._rx.clear()
+        self._free_at = self._clock() + self.emulator.boot_time
+        self._tx.append((self._free_at, BANNER))
+
+    def _advance(self, now):
+        # Let the firmware read every byte it could have read by 'now'.
+        rx, emulator = self._rx, self.emulator
+        while rx:
+            arrival, byte = rx[0]
+            start = max(arrival, self._free_at)
+            if start > now:
+                break
+            rx.popleft()
+            reply = emulator.receive(byte, now=start)
+            if reply:
+                self._free_at = start + emulator.turnaround
+                self._tx.append((self._free_at, reply))
+
+    def _next_event(self):
+        times = []
+        if self._tx:
+            times.append(self._tx[0][0])
+        if self._rx:
+            times.append(max(self._rx[0][0], self._free_at))
+        return min(times) if times else None
+
+    def _readable(self, now):
+        return sum(len(data) for ready, data in self._tx if ready <= now)
+
+    @property
+    def in_waiting(self):
+        with self._cond:
+            now = self._clock()
+            self._advance(now)
+            return self._readable(now)
+
+    def read(self, size=1):
+        if self._sleep is not None:
+            return self._read_virtual(size)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        out = bytearray()
+        with self._cond:
+            while True:
+                now = self._clock()
+                self._advance(now)
+                tx = self._tx
+                while tx and tx[0][0] <= now and len(out) < size:
+                    ready, data = tx.popleft()
+                    take = size - len(out)
+                    out += data[:take]
+                    if len(data) > take:
+                        tx.appendleft((ready, data[take:]))
+                if out:
+                    return bytes(out)
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    return b''
+                event = self._next_event()
+                if event is not None:
+                    wait = event - now if wait is None else min(wait, event - now)
+                self._cond.wait(wait)
+
+    def _read_virtual(self, size):
+        # Nothing else moves a virtual clock, so skip ahead to the next reply
+        # or to the timeout.
+        deadline = None if self.timeout is None else self._clock() + self.timeout
+        out = bytearray()
+        with self._cond:
+            while True:
+                now = self._clock()
+                self._advance(now)
+                tx = self._tx
+                while tx and tx[0][0] <= now and len(out) < size:
+                    ready, data = tx.popleft()
+                    take = size - len(out)
+                    out += data[:take]
+                    if len(data) > take:
+                        tx.appendleft((ready, data[take:]))
+                if out:
+                    return bytes(out)
+                event = self._next_event()
+                if event is None or (deadline is not None and event > deadline):
+                    if deadline is not None:
+                        self._sleep(deadline - now)
+                    return b''
+                self._sleep(event - now)
+
+    def write(self, data):
+        data = bytes(data)
+        with self._cond:
+            now = self._clock()
+            self._advance(now)
+            for byte in data:
+                if len(self._rx) >= BUFFER_SIZE:
+                    self.overruns += 1
+                else:
+                    self._rx.append((now, bytes((byte,))))
+            self._advance(now)
+            self._cond.notify_all()
+        return len(data)
+
+    def reset_input_buffer(self):
+        with self._cond:
+            now = self._clock()
+            self._advance(now)
+            while self._tx and self._tx[0][0] <= now:
+                self._tx.popleft()
+
+    @property
+    def dtr(self):
+        return self._dtr
+
+    @dtr.setter
+    def dtr(self, value):
+        # Like the auto-reset circuit, releasing DTR reboots the firmware.
+        with self._cond:
+            if value and not self._dtr:
+                self._tx.clear()
+                self._boot()
+                self._cond.notify_all()
+            self._dtr = bool(value)
+
+    def close(self):
+        self.is_open = False
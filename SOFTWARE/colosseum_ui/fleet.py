@@ -0,0 +1,296 @@
+"""Drive several fraction collectors as one.
+
+With k collectors, each fed by its own line at the same flow rate, an
+experiment of N fractions takes N*v/(k*f) instead of N*v/f (see
+analysis/scalability.ipynb). ColosseumFleet connects to all of them
+concurrently, splits the fractions of the experiment across them, and runs
+every tube change of every collector from a single deadline scheduler:
+
+    fleet = ColosseumFleet(['/dev/ttyACM0', '/dev/ttyACM1'])
+    fleet.run(1, 'mL', 1, 'mL/min', 171)
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .clock import SYSTEM_CLOCK
+from .colosseum import Colosseum
+from .schedule import Schedule
+from .scheduler import DeadlineScheduler
+from .serial_comm import talk
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS = ('round-robin', 'contiguous')
+
+def partition(n_fractions, k, method='round-robin'):
+    """Assign fractions to collectors.
+
+    Parameters
+    ----------
+    n_fractions : int
+        Number of fractions of the experiment.
+    k : int
+        Number of collectors.
+    method : str (optional)
+        'round-robin' gives fraction i to collector i % k, 'contiguous' gives
+        every collector a block of consecutive fractions, the first blocks one
+        fraction longer if they can't all be the same length. The default is
+        'round-robin'.
+
+    Returns
+    -------
+    tuple
+        The collector of every fraction, and the index of every fraction on
+        its collector, as arrays.
+
+    Raises
+    ------
+    ValueError
+        If the method is unknown, or there are fewer fractions than
+        collectors, which would leave a collector without fractions.
+    """
+    if method not in PARTITIONS:
+        raise ValueError(f'unknown partition {method!r}, expected one of {PARTITIONS}')
+    if n_fractions < k:
+        raise ValueError(
+            f'{n_fractions} fractions can\'t be split across {k} collectors, '
+            'every collector needs at least one'
+        )
+    fractions = np.arange(n_fractions)
+    if method == 'round-robin':
+        return fractions % k, fractions // k
+    # Blocks like np.array_split: the first n_fractions % k have one more.
+    sizes = np.full(k, n_fractions // k)
+    sizes[:n_fractions % k] += 1
+    owners = np.repeat(np.arange(k), sizes)
+    starts = np.cumsum(sizes) - sizes
+    return owners, fractions - starts[owners]
+
+class ColosseumFleet:
+    """Several Colosseums running one experiment.
+
+    Parameters
+    ----------
+    ports : list
+        Locations of the serial ports of the collectors.
+    testing : bool (optional)
+        See Colosseum. The default is False.
+    clock : clock.Clock (optional)
+        Time source of the run, shared by all collectors. The default is the
+        real clock.
+    """
+
+    def __init__(self, ports, testing=False, clock=SYSTEM_CLOCK, **kwargs):
+        logger.info(f'[setup] initializing fleet of {len(ports)} collectors')
+        self.ports = list(ports)
+        self.testing = testing
+        self.clock = clock
+        self.devices = self._connect(kwargs)
+        self.running = False
+        self.done = False
+        # Set by pause() and stop() to wake up the run loop
+        self.interrupt = threading.Event()
+
+        self.run_cache = None
+        self.start_time = None
+        self.run_start = None
+        # Tube changes of all collectors, in time order: collector, fraction
+        # index on the collector and time since the start of the run.
+        self.events = None
+        self.event = 0
+        # Schedule of every collector, and the travel time of its tube changes
+        self.schedules = None
+        self.travel = None
+        self.fractions = []
+
+    def _connect(self, kwargs):
+        # Connecting mostly waits for the Arduinos to boot, so it is done for
+        # all ports at once.
+        with ThreadPoolExecutor(max_workers=len(self.ports)) as pool:
+            futures = [
+                pool.submit(
+                    Colosseum, port, testing=self.testing, clock=self.clock, **kwargs
+                )
+                for port in self.ports
+            ]
+        devices, errors = [], []
+        for future in futures:
+            try:
+                devices.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            for device in devices:
+                device.serial.close()
+            raise errors[0]
+        return devices
+
+    def __len__(self):
+        return len(self.devices)
+
+    @property
+    def positions(self):
+        """Tube position of every collector."""
+        return [device.position for device in self.devices]
+
+    @property
+    def position(self):
+        """Number of fractions collected by the whole fleet."""
+        return sum(self.positions)
+
+    @property
+    def progress(self):
+        """Fraction of the tube changes of the run that are done, 0 to 1."""
+        if not self.events:
+            return 0.0
+        return self.event / len(self.events[0])
+
+    calculate_collection_time = Colosseum.calculate_collection_time
+
+    def make_schedules(
+        self, size_value, size_unit, flow_value, flow_unit, n_fractions,
+        flow_profile=None, method='round-robin',
+    ):
+        """The Schedule of every collector for an experiment of n_fractions + 1
+        fractions of size_value (see Colosseum.make_schedule), which may have
+        more fractions than a single collector has tubes. Every collector has
+        its own line, so with a flow_profile, each collector's fractions
+        follow the profile from the start of the run."""
+        owners, _ = partition(n_fractions + 1, len(self.devices), method)
+        counts = np.bincount(owners, minlength=len(self.devices))
+        return [
+            device.make_schedule(
+                size_value, size_unit, flow_value, flow_unit, int(count) - 1,
+                flow_profile=flow_profile,
+            )
+            for device, count in zip(self.devices, counts)
+        ]
+
+    def plan(self, schedule, method='round-robin'):
+        """Split a schedule across the collectors.
+
+        Parameters
+        ----------
+        schedule : Schedule or array_like
+            The fractions of the whole experiment, or their dwell times. Only
+            the dwell times are used, every collector starts at its own first
+            tube.
+        method : str (optional)
+            See partition. The default is 'round-robin'.
+
+        Returns
+        -------
+        list
+            The Schedule of every collector.
+        """
+        dwell = np.asarray(getattr(schedule, 'dwell', schedule), dtype=float)
+        owners, _ = partition(len(dwell), len(self.devices), method)
+        return [Schedule(dwell[owners == k]) for k in range(len(self.devices))]
+
+    def run(
+        self, size_value=None, size_unit=None, flow_value=None, flow_unit=None,
+        n_fractions=None, schedule=None, flow_profile=None, method='round-robin',
+    ):
+        if self.done:
+            raise Exception('run already completed')
+        self.run_cache = locals().copy()
+        del self.run_cache['self']
+        if self.events is None:
+            # Plan before anything moves, so that invalid parameters fail here.
+            if schedule is None:
+                schedules = self.make_schedules(
+                    size_value, size_unit, flow_value, flow_unit, n_fractions,
+                    flow_profile=flow_profile, method=method,
+                )
+            else:
+                schedules = self.plan(schedule, method)
+            owners = np.concatenate([
+                np.full(len(s), k) for k, s in enumerate(schedules)
+            ])
+            indices = np.concatenate([np.arange(len(s)) for s in schedules])
+            times = np.concatenate([s.changes for s in schedules])
+            order = np.argsort(times, kind='stable')
+            self.events = (owners[order], indices[order], times[order])
+            self.schedules = schedules
+            self.travel = [
+                device.motion.travel_times(s)
+                for device, s in zip(self.devices, schedules)
+            ]
+        self.running = True
+        self.interrupt.clear()
+        if self.start_time is None:
+            self.start_time = self.clock.time()
+            self.run_start = self.clock.monotonic()
+            for device in self.devices:
+                device.start_time = self.start_time
+                device.run_start = self.run_start
+
+        owners, indices, times = self.events
+        first = self.event
+        changes = times[first:] - (times[first - 1] if first else 0.0)
+        now = self.clock.monotonic()
+        scheduler = DeadlineScheduler(
+            changes=changes,
+            start=now,
+            offset=now - self.run_start,
+            clock=self.clock.monotonic,
+            sleep=self.clock.sleep,
+            wait_event=self.clock.wait,
+        )
+        # Monotonic time at which the last move sent to each collector ends
+        move_end = {}
+        for e in range(first, len(times)):
+            k, i = int(owners[e]), int(indices[e])
+            device = self.devices[k]
+            command = self.schedules[k].commands[i]
+            if not scheduler.wait(e - first + 1, interrupt=self.interrupt):
+                logger.info(f'[run] pausing fleet')
+                return
+            with device.io_lock:
+                if not self.running:
+                    logger.info(f'[run] pausing fleet')
+                    return
+                logger.debug(f'[run] sending command {command} to {device.port}')
+                sent = self.clock.monotonic()
+                talk(device.serial, [command], dry_run=self.testing)
+                done = self.clock.monotonic()
+            move_end[k] = sent + self.travel[k][i]
+            fraction = scheduler.record(i, e - first + 1, sent, done)
+            device.fractions.append(fraction)
+            self.fractions.append(fraction)
+            device.position = i + 1
+            self.event = e + 1
+
+            if not self.running:
+                logger.info(f'[run] pausing fleet')
+                return
+
+        logger.info(f'[run] done, {self.position} fractions on {len(self)} collectors')
+        # Any command interrupts the move in progress, so let the last tube
+        # change of every collector complete before stopping.
+        if move_end:
+            self.clock.wait(self.interrupt, max(move_end.values()) - self.clock.monotonic())
+        self.stop()
+
+    def pause(self):
+        logger.info(f'[pause] pausing fleet at positions {self.positions}')
+        self.running = False
+        self.interrupt.set()
+
+    def resume(self):
+        if self.run_cache is None:
+            raise Exception('run was never started')
+        logger.info(f'[resume] resuming fleet at positions {self.positions}')
+        self.run(**self.run_cache)
+
+    def stop(self):
+        logger.debug('[stop] stopping fleet')
+        self.running = False
+        self.interrupt.set()
+        self.done = True
+        with ThreadPoolExecutor(max_workers=len(self.devices)) as pool:
+            for future in [pool.submit(device.stop) for device in self.devices]:
+                future.result()
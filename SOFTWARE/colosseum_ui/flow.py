@@ -0,0 +1,126 @@
+"""Flow-rate profiles.
+
+A FlowProfile describes how the pump's flow rate changes over a run, either
+piecewise-linearly between points or as a table of rates held constant until
+the next point. The volume delivered over time is integrated once, when the
+profile is created, so finding the times at which every fraction holds the
+same volume is a vectorized lookup:
+
+    profile = FlowProfile([0, 600, 1200], [1, 5, 5], 'uL/sec')
+    schedule = profile.schedule(100, 'uL', 87)
+"""
+import numpy as np
+
+from .constants import FRACSIZE_TO_UL, FRUNIT_TO_UL_HR
+from .schedule import Schedule
+
+class FlowProfile:
+    """Flow rate as a function of time since the start of the run.
+
+    Parameters
+    ----------
+    times : array_like
+        Strictly increasing times of the profile points, in seconds. If the
+        first one is after 0, the first rate also applies before it.
+    rates : array_like
+        The flow rate at each point, in 'flow_unit'. After the last point, the
+        last rate applies.
+    flow_unit : str (optional)
+        Unit of the rates, a key of FRUNIT_TO_UL_HR. The default is 'uL/sec'.
+    step : bool (optional)
+        If True, every rate is held until the next point (a tabulated profile).
+        Otherwise the rate changes linearly between points. The default is
+        False.
+
+    Raises
+    ------
+    ValueError
+        If the points are invalid.
+    """
+
+    def __init__(self, times, rates, flow_unit='uL/sec', step=False):
+        times = np.array(times, dtype=float)
+        rates = np.array(rates, dtype=float) * (FRUNIT_TO_UL_HR[flow_unit] / 3600)
+        if times.ndim != 1 or times.shape != rates.shape or len(times) == 0:
+            raise ValueError('times and rates must be 1-D arrays of the same length')
+        if not (np.all(np.isfinite(times)) and np.all(np.isfinite(rates))):
+            raise ValueError('times and rates must be finite')
+        if np.any(np.diff(times) <= 0):
+            raise ValueError('times must be strictly increasing')
+        if np.any(rates < 0):
+            raise ValueError('rates must be non-negative')
+        if times[0] > 0:
+            times = np.concatenate(([0.0], times))
+            rates = np.concatenate((rates[:1], rates))
+
+        self.step = step
+        # Profile points, in seconds and uL/s
+        self.times = times
+        self.rates = rates
+        durations = np.diff(times)
+        if step:
+            self.slopes = np.zeros_like(durations)
+            delivered = rates[:-1] * durations
+        else:
+            self.slopes = np.diff(rates) / durations
+            delivered = (rates[:-1] + rates[1:]) / 2 * durations
+        # Volume (uL) delivered from time 0 to every point
+        self.volumes = np.concatenate(([0.0], np.cumsum(delivered)))
+
+    @classmethod
+    def constant(cls, rate, flow_unit='uL/sec'):
+        """A profile with a constant flow rate."""
+        return cls([0.0], [rate], flow_unit)
+
+    def _segments(self, t):
+        # Index of the point at or before every time.
+        return np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, None)
+
+    def rate(self, t):
+        """Flow rate (uL/s) at time(s) 't' (seconds)."""
+        t = np.asarray(t, dtype=float)
+        i = self._segments(t)
+        slopes = np.append(self.slopes, 0.0)
+        return self.rates[i] + slopes[i] * (t - self.times[i])
+
+    def volume(self, t):
+        """Volume (uL) delivered from time 0 to time(s) 't' (seconds)."""
+        t = np.asarray(t, dtype=float)
+        i = self._segments(t)
+        slopes = np.append(self.slopes, 0.0)
+        dt = t - self.times[i]
+        return self.volumes[i] + self.rates[i] * dt + slopes[i] * dt * dt / 2
+
+    def time_at_volume(self, volume):
+        """Time(s) (seconds) at which 'volume' (uL) has been delivered. Volumes
+        that are never reached give inf."""
+        volume = np.asarray(volume, dtype=float)
+        i = np.clip(np.searchsorted(self.volumes, volume, side='right') - 1, 0, None)
+        slopes = np.append(self.slopes, 0.0)
+        r, s = self.rates[i], slopes[i]
+        dv = volume - self.volumes[i]
+        # Solve dv = r * dt + s * dt**2 / 2 for dt, in a form that is stable
+        # when s is 0.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dt = 2 * dv / (r + np.sqrt(np.maximum(r * r + 2 * s * dv, 0)))
+        dt = np.where(dv == 0, 0.0, np.where(np.isnan(dt), np.inf, dt))
+        return self.times[i] + dt
+
+    def change_times(self, size_value, size_unit, n_fractions):
+        """Times (seconds) at which to change tubes so that each of the
+        'n_fractions' fractions holds 'size_value' ('size_unit')."""
+        size = size_value * FRACSIZE_TO_UL[size_unit]
+        return self.time_at_volume(size * np.arange(1, n_fractions + 1))
+
+    def schedule(self, size_value, size_unit, n_fractions, commands=None):
+        """A Schedule collecting 'n_fractions' fractions of equal volume.
+
+        Raises
+        ------
+        ValueError
+            If the profile never delivers that much volume.
+        """
+        changes = self.change_times(size_value, size_unit, n_fractions)
+        if not np.all(np.isfinite(changes)):
+            raise ValueError('the flow profile never delivers the requested volume')
+        return Schedule(np.diff(changes, prepend=0.0), commands=commands)
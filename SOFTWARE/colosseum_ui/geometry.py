@@ -0,0 +1,220 @@
+"""Geometry of the tube bed.
+
+The tubes sit on an Archimedean spiral, r = b * phi with b = separation / 2pi,
+starting 'init_d' mm from the center and 'arc' mm apart along the spiral (see
+analysis/archimedian_spiral.ipynb). The bed turns under the outlet, so moving
+to the next tube is a rotation by the difference of their polar angles, which
+the stepper makes in steps_per_rev * microsteps steps per turn. TubeBed
+computes the tube positions and that step table for any bed, and tube_bed()
+caches them on disk, keyed by the parameters:
+
+    bed = tube_bed(n_tubes=120, radius=120)
+    write_angles('angles.txt', bed.angles)
+
+The default parameters are those of the 88-tube bed. Its angles.txt holds
+measured steps, which differ from the model by at most a few quarter steps.
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+
+import numpy as np
+
+from .constants import GEOMETRY_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('iterative', 'exact')
+ANGLES_HEADER = '# Number of quarter steps to take in order to move to the next tube'
+
+def spiral_angles(n_tubes, arc, separation, init_d, method='iterative'):
+    """Polar angle (radians) of every tube on the spiral.
+
+    Parameters
+    ----------
+    n_tubes : int
+        Number of tubes.
+    arc : float
+        Distance between consecutive tubes along the spiral, in mm.
+    separation : float
+        Distance between consecutive turns of the spiral, in mm.
+    init_d : float
+        Distance of the first tube from the center, in mm.
+    method : str (optional)
+        'iterative' approximates the arc between tubes by a circle arc at the
+        radius of the previous tube, like the notebook the bed was designed
+        with. 'exact' spaces the tubes by the exact arc length of the spiral.
+        The default is 'iterative'.
+
+    Returns
+    -------
+    ndarray
+        The angles, increasing from the first tube.
+    """
+    b = separation / (2 * np.pi)
+    phi0 = init_d / b
+    if method == 'iterative':
+        # phi[k + 1] = phi[k] + arc / (b * phi[k]) is sequential, so it is
+        # computed one tube at a time.
+        phi = np.empty(n_tubes)
+        p = phi0
+        for k in range(n_tubes):
+            phi[k] = p
+            p += arc / (b * p)
+        return phi
+    if method == 'exact':
+        def length(p):
+            # Arc length of the spiral from the center to angle p.
+            return b / 2 * (p * np.sqrt(1 + p * p) + np.arcsinh(p))
+        target = length(phi0) + arc * np.arange(n_tubes)
+        # Newton's method for every tube at once, from s ~ b * phi**2 / 2.
+        phi = np.maximum(np.sqrt(2 * target / b), phi0)
+        for _ in range(50):
+            step = (length(phi) - target) / (b * np.sqrt(1 + phi * phi))
+            phi -= step
+            if np.max(np.abs(step)) < 1e-12:
+                break
+        return phi
+    raise ValueError(f'unknown method {method!r}, expected one of {METHODS}')
+
+class TubeBed:
+    """Tubes on an Archimedean spiral, and the steps between them.
+
+    Parameters
+    ----------
+    n_tubes : int (optional)
+        Number of tubes. The default is 88.
+    arc : float (optional)
+        Distance between consecutive tubes along the spiral, in mm. The
+        default is 13.
+    separation : float (optional)
+        Distance between consecutive turns of the spiral, in mm. The default
+        is 17.39.
+    init_d : float (optional)
+        Distance of the first tube from the center, in mm. The default is
+        18.595.
+    radius : float (optional)
+        Radius of the bed, in mm. The default is 100.
+    margin : float (optional)
+        Width of the rim of the bed that holds no tubes, in mm. The default is
+        10.
+    steps_per_rev : int (optional)
+        Full steps per turn of the stepper. The default is 200.
+    microsteps : int (optional)
+        Microsteps per full step the firmware counts in. The default is 4
+        (quarter steps).
+    method : str (optional)
+        See spiral_angles. The default is 'iterative'.
+    phi : array_like (optional)
+        Precomputed angles of the tubes (see tube_bed). By default, they are
+        computed from the other parameters.
+    """
+
+    def __init__(
+        self, n_tubes=88, arc=13.0, separation=17.39, init_d=18.595,
+        radius=100.0, margin=10.0, steps_per_rev=200, microsteps=4,
+        method='iterative', phi=None,
+    ):
+        self.params = {
+            'n_tubes': int(n_tubes),
+            'arc': float(arc),
+            'separation': float(separation),
+            'init_d': float(init_d),
+            'radius': float(radius),
+            'margin': float(margin),
+            'steps_per_rev': int(steps_per_rev),
+            'microsteps': int(microsteps),
+            'method': method,
+        }
+        if phi is None:
+            phi = spiral_angles(n_tubes, arc, separation, init_d, method)
+        self.phi = np.asarray(phi, dtype=float)
+        # Distance of every tube from the center, and its position, in mm
+        self.r = separation / (2 * np.pi) * self.phi
+        self.x = self.r * np.cos(self.phi)
+        self.y = self.r * np.sin(self.phi)
+
+        # Position of every tube in steps from the first one. Rounding the
+        # cumulative rotation, rather than every move, keeps the rounding
+        # errors from adding up along the bed.
+        steps_per_radian = steps_per_rev * microsteps / (2 * np.pi)
+        self.positions = np.rint((self.phi - self.phi[0]) * steps_per_radian).astype(int)
+        # Steps of every move to the next tube, like angles.txt
+        self.angles = np.diff(self.positions)
+
+    def __len__(self):
+        return len(self.phi)
+
+    @property
+    def fits(self):
+        """Whether every tube is within the usable area of the bed."""
+        return bool(self.r[-1] <= self.params['radius'] - self.params['margin'])
+
+def _cache_path(params, cache_dir):
+    # Key the cache by every parameter, defaults included.
+    signature = inspect.signature(TubeBed).parameters
+    key = {name: p.default for name, p in signature.items() if name != 'phi'}
+    key.update(params)
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_dir, digest[:16] + '.npz')
+
+def tube_bed(cache_dir=GEOMETRY_CACHE_DIR, **params):
+    """The TubeBed of the given parameters, from the cache in 'cache_dir' if
+    it was computed before. Takes the parameters of TubeBed, and
+    cache_dir=None disables the cache."""
+    bed = None
+    path = None
+    if cache_dir is not None:
+        path = _cache_path(params, cache_dir)
+        try:
+            with np.load(path) as data:
+                bed = TubeBed(phi=data['phi'], **params)
+        except (OSError, ValueError, KeyError):
+            bed = None
+    if bed is None:
+        bed = TubeBed(**params)
+        if path is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = path + '.tmp.npz'
+                np.savez(tmp, phi=bed.phi)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f'could not write geometry cache {path}: {e}')
+    return bed
+
+def write_angles(path, angles, header=ANGLES_HEADER):
+    """Write a step table in the format of angles.txt (see
+    utils.read_angles)."""
+    with open(path, 'w') as f:
+        f.write(header + '\n')
+        f.writelines(f'{int(angle)}\n' for angle in angles)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write the step table (angles.txt) of a tube bed.'
+    )
+    parser.add_argument('output', help='file to write the step table to')
+    parser.add_argument('--tubes', type=int, default=88)
+    parser.add_argument('--arc', type=float, default=13.0)
+    parser.add_argument('--separation', type=float, default=17.39)
+    parser.add_argument('--init-d', type=float, default=18.595)
+    parser.add_argument('--radius', type=float, default=100.0)
+    parser.add_argument('--microsteps', type=int, default=4)
+    parser.add_argument('--method', choices=METHODS, default='iterative')
+    args = parser.parse_args()
+
+    bed = tube_bed(
+        n_tubes=args.tubes, arc=args.arc, separation=args.separation,
+        init_d=args.init_d, radius=args.radius, microsteps=args.microsteps,
+        method=args.method,
+    )
+    if not bed.fits:
+        logger.warning(f'the outermost tube is {bed.r[-1]:.1f} mm from the center')
+    write_angles(args.output, bed.angles)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Durable journal of a run.
+
+Every run can be recorded in an append-only file with one JSON object per
+line: the run's schedule when it starts, then every tube change, pause,
+resume and stop, each with its wall-clock and monotonic time. Lines are
+written and fsync'd by a background thread, so recording an event costs the
+run loop only a queue put. After a crash, replay() reads the journal back into
+the state needed to resume the run (see Colosseum.recover).
+"""
+import json
+import os
+import queue
+import threading
+
+from .clock import SYSTEM_CLOCK
+
+def _ends_with_newline(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+class Journal:
+    """Append-only, fsync'd journal file.
+
+    Parameters
+    ----------
+    path : str
+        The journal file. Events are appended if it already exists.
+    clock : clock.Clock (optional)
+        Clock of the timestamps. The default is the real clock.
+    """
+
+    def __init__(self, path, clock=SYSTEM_CLOCK):
+        self.path = path
+        self.clock = clock
+        self._file = open(path, 'a', encoding='utf-8')
+        # End a line cut short by a crash, so that it does not swallow the
+        # first new event.
+        if self._file.tell() and not _ends_with_newline(path):
+            self._file.write('\n')
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write, daemon=True)
+        self._thread.start()
+
+    def record(self, event, **fields):
+        """Queue an event to be written.
+
+        Parameters
+        ----------
+        event : str
+            The kind of event, e.g. 'start' or 'advance'.
+        **fields
+            JSON-serializable details of the event.
+        """
+        fields['event'] = event
+        fields['wall'] = self.clock.time()
+        fields['mono'] = self.clock.monotonic()
+        self._append(fields)
+
+    def _append(self, fields):
+        self._queue.put(json.dumps(fields, separators=(',', ':')))
+
+    def _write(self):
+        while True:
+            lines = [self._queue.get()]
+            # Write everything that is queued with a single fsync.
+            while True:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = lines[-1] is None
+            lines = [line for line in lines if line is not None]
+            if lines:
+                self._file.write('\n'.join(lines) + '\n')
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            if closing:
+                return
+
+    def close(self):
+        """Write the queued events and close the file."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._file.close()
+
+class MemoryJournal(Journal):
+    """Journal kept in memory, in 'events', e.g. to trace simulated runs."""
+
+    def __init__(self, clock=SYSTEM_CLOCK):
+        self.path = None
+        self.clock = clock
+        self.events = []
+
+    def _append(self, fields):
+        self.events.append(fields)
+
+    def close(self):
+        pass
+
+def read_journal(path):
+    """Read the events of a journal. A line cut short by a crash is
+    ignored.
+
+    Returns
+    -------
+    list
+        The events, as dicts.
+    """
+    events = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+def replay(path):
+    """Reconstruct the state of a run from its journal.
+
+    Returns
+    -------
+    dict
+        'port', 'params', 'dwell' and 'commands' of the run (from its start
+        event), 'position' (the next tube change), 'start' (wall time of the
+        start of the run), 'since' (wall time from which the current fraction
+        has been collecting, None if the run was paused) and 'state' (the
+        last event).
+
+    Raises
+    ------
+    ValueError
+        If the journal does not contain the start of a run.
+    """
+    events = read_journal(path)
+    starts = [i for i, event in enumerate(events) if event['event'] == 'start']
+    if not starts:
+        raise ValueError(f'{path} does not contain the start of a run')
+    start = events[starts[-1]]
+
+    position = 0
+    since = start['wall']
+    for event in events[starts[-1] + 1:]:
+        kind = event['event']
+        if kind == 'advance':
+            position = event['position']
+            since = event['wall']
+        elif kind == 'pause':
+            since = None
+        elif kind == 'resume':
+            since = event['wall']
+    return {
+        'port': start['port'],
+        'params': start['params'],
+        'dwell': start['dwell'],
+        'commands': start['commands'],
+        'position': position,
+        'start': start['wall'],
+        'since': since,
+        'state': events[-1]['event'],
+    }
@@ -0,0 +1,100 @@
+"""Lightweight latency metrics.
+
+Durations are recorded into named recorders, which keep the most recent
+samples and report their percentiles:
+
+    with metrics.latency('connect').time():
+        ...
+    metrics.latency('connect').summary()
+"""
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Number of samples kept per recorder.
+MAX_SAMPLES = 1000
+
+class LatencyRecorder:
+    """Rolling window of durations (in seconds).
+
+    Parameters
+    ----------
+    name : str
+        Name of the measured operation.
+    maxlen : int (optional)
+        Number of samples kept. The default is MAX_SAMPLES.
+    """
+
+    def __init__(self, name, maxlen=MAX_SAMPLES):
+        self.name = name
+        self.samples = deque(maxlen=maxlen)
+
+    def record(self, seconds):
+        """Record a duration."""
+        self.samples.append(seconds)
+
+    @contextmanager
+    def time(self):
+        """Record how long the body of the with statement takes. Nothing is
+        recorded if it raises."""
+        start = time.perf_counter()
+        yield
+        self.record(time.perf_counter() - start)
+
+    def percentile(self, q):
+        """Nearest-rank percentile of the recorded durations.
+
+        Parameters
+        ----------
+        q : float
+            The percentile, between 0 and 100.
+
+        Returns
+        -------
+        float
+            The duration, or None if nothing was recorded.
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(math.ceil(q / 100 * len(ordered)), 1)
+        return ordered[rank - 1]
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    def summary(self):
+        """The number of samples and their p50, p99 and maximum."""
+        return {
+            'count': len(self.samples),
+            'p50': self.p50,
+            'p99': self.p99,
+            'max': max(self.samples) if self.samples else None,
+        }
+
+    def __str__(self):
+        if not self.samples:
+            return f'{self.name}: no samples'
+        return (
+            f'{self.name}: p50 {self.p50:.3f} s, p99 {self.p99:.3f} s '
+            f'({len(self.samples)} samples)'
+        )
+
+_recorders = {}
+
+def latency(name):
+    """Get the recorder called 'name', creating it on first use."""
+    recorder = _recorders.get(name)
+    if recorder is None:
+        recorder = _recorders[name] = LatencyRecorder(name)
+    return recorder
+
+def report():
+    """Summaries of all recorders, by name."""
+    return {name: recorder.summary() for name, recorder in _recorders.items()}
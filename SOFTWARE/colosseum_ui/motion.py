@@ -0,0 +1,67 @@
+"""How long tube moves take.
+
+The firmware echoes a command as soon as it is received, before the motors
+have moved, so the host has to know how long a move takes on its own. The
+AccelStepper speed profile is a trapezoid: the motor accelerates at the
+SET_ACCEL rate up to the SET_SPEED speed, cruises, and decelerates, so the
+travel time of a move follows from its number of steps (see utils.move_time).
+MotionModel is this fixed kinematic model, at one speed and acceleration. The
+firmware never reports when a move ends, so there is nothing to refine it
+with:
+
+    model = MotionModel()
+    model.travel_times(schedule)   # seconds for every tube change
+    model.estimate(84)             # seconds for a move of 84 steps
+"""
+import numpy as np
+
+from .constants import SETUP_CMDS
+from .utils import move_time
+
+class MotionModel:
+    """Travel time of moves at one speed and acceleration.
+
+    Parameters
+    ----------
+    speed : float (optional)
+        Maximum speed, in steps per second. The default is the speed set by
+        SETUP_CMDS.
+    accel : float (optional)
+        Acceleration, in steps per second per second. The default is the
+        acceleration set by SETUP_CMDS.
+    """
+
+    def __init__(self, speed=None, accel=None):
+        self.speed = SETUP_CMDS[1].args[0] if speed is None else speed
+        self.accel = SETUP_CMDS[0].args[0] if accel is None else accel
+        # Travel time per number of steps
+        self._estimated = {}
+
+    def estimate(self, steps):
+        """Travel time (seconds) of a move of 'steps'."""
+        steps = abs(float(steps))
+        try:
+            return self._estimated[steps]
+        except KeyError:
+            t = self._estimated[steps] = move_time(steps, self.speed, self.accel)
+            return t
+
+    def command_time(self, command):
+        """Travel time (seconds) of a RUN command: the motors move at the same
+        time, so the longest move of the selected motors. See travel_times
+        for MOVE_TO commands, whose travel depends on the previous one."""
+        return max(
+            (self.estimate(arg) for i, arg in enumerate(command.args)
+             if command.motors & (0b100 >> i)),
+            default=0.0,
+        )
+
+    def travel_times(self, schedule):
+        """Travel time (seconds) of every tube change of a schedule.Schedule,
+        as an array."""
+        targets = schedule.targets()
+        moves = np.abs(np.diff(targets, axis=0, prepend=np.zeros((1, 3))))
+        # Schedules repeat the same few moves, so estimate each once.
+        steps, inverse = np.unique(moves, return_inverse=True)
+        times = np.array([self.estimate(d) for d in steps])[inverse]
+        return times.reshape(moves.shape).max(axis=1)
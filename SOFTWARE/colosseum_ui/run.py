@@ -3,15 +3,24 @@ import sys
 
 from PyQt5.QtWidgets import QApplication
 
+from .clock import SYSTEM_CLOCK, VirtualClock
 from .ui import MainWindow
 
 def run():
     parser = argparse.ArgumentParser()
     parser.add_argument('--testing', action='store_true')
+    parser.add_argument('--emulator', action='store_true',
+                        help='offer an emulated Arduino in the port list')
+    parser.add_argument('--fast-forward', action='store_true',
+                        help='run on a virtual clock that skips every wait '
+                        '(use with --emulator)')
     args = parser.parse_args()
 
     app = QApplication(sys.argv)
-    main_window = MainWindow(testing=args.testing)
+    clock = VirtualClock() if args.fast_forward else SYSTEM_CLOCK
+    main_window = MainWindow(
+        testing=args.testing, emulator=args.emulator, clock=clock
+    )
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+"""Per-fraction schedules of a run.
+
+A Schedule holds how long each fraction is collected for, and the command
+that moves to the next tube at the end of it. Everything is computed up front
+into NumPy arrays, so running the schedule only indexes arrays and sleeps:
+
+    schedule = Schedule.linear(12, 12, 20)
+    colosseum.run(schedule=schedule)
+"""
+import numpy as np
+
+from .command import Command, Mode
+from . import constants
+from .constants import FRACSIZE_TO_UL, FRUNIT_TO_UL_HR
+from .utils import make_targets
+
+class Schedule:
+    """Dwell times of the fractions of a run.
+
+    Parameters
+    ----------
+    dwell_times : array_like
+        Seconds each fraction is collected for, i.e. between the start of the
+        run (or the previous tube change) and each tube change.
+    commands : sequence (optional)
+        The Command of each tube change, RUN (relative) or MOVE_TO (absolute,
+        in steps from the first tube). By default, constants.COMMANDS (all
+        motors, tube positions from angles.txt).
+
+    Raises
+    ------
+    ValueError
+        If the dwell times are not finite and non-negative, or there are more
+        fractions than commands.
+    """
+
+    def __init__(self, dwell_times, commands=None):
+        dwell = np.array(dwell_times, dtype=float)
+        if dwell.ndim != 1 or len(dwell) == 0:
+            raise ValueError('dwell times must be a non-empty 1-D array')
+        if not np.all(np.isfinite(dwell)) or np.any(dwell < 0):
+            raise ValueError('dwell times must be finite and non-negative')
+        if commands is None:
+            commands = constants.COMMANDS
+        if len(commands) < len(dwell):
+            raise ValueError(
+                f'{len(dwell)} fractions but only {len(commands)} tube positions'
+            )
+
+        self.dwell = dwell
+        # Seconds from the start of the run to each tube change
+        self.changes = np.cumsum(dwell)
+        self.commands = np.empty(len(dwell), dtype=object)
+        for i in range(len(dwell)):
+            self.commands[i] = commands[i]
+        self._targets = None
+
+    def __len__(self):
+        return len(self.dwell)
+
+    @property
+    def total_time(self):
+        """Seconds from the start of the run to the last tube change."""
+        return float(self.changes[-1])
+
+    def offsets(self, first=0):
+        """Seconds from the start of fraction 'first' to each following tube
+        change, e.g. to resume a run at fraction 'first'."""
+        if first == 0:
+            return self.changes
+        return self.changes[first:] - self.changes[first - 1]
+
+    def targets(self):
+        """Position of each motor after every tube change, in steps from the
+        first tube, as an (n, 3) array."""
+        if self._targets is not None:
+            return self._targets
+        commands = self.commands
+        args = np.array([command.args for command in commands], dtype=float)
+        masks = np.array([command.motors for command in commands])
+        modes = np.array([command.mode for command in commands])
+        # Motor i is selected by bit 0b100 >> i, like in the firmware.
+        selected = (masks[:, None] & (0b100 >> np.arange(3))) != 0
+        absolute = modes == Mode.MOVE_TO
+        moves = np.where(selected & (modes == Mode.RUN)[:, None], args, 0.0)
+        if not absolute.any():
+            targets = np.cumsum(moves, axis=0)
+        else:
+            targets = np.empty_like(args)
+            position = np.zeros(3)
+            for i in range(len(commands)):
+                if absolute[i]:
+                    position = np.where(selected[i], args[i], position)
+                else:
+                    position = position + moves[i]
+                targets[i] = position
+        self._targets = targets
+        return targets
+
+    def absolute(self, origin=0.0):
+        """MOVE_TO commands of every tube change.
+
+        Parameters
+        ----------
+        origin : array_like (optional)
+            Position of the motors, in steps from the first tube, when the
+            firmware's position was zeroed (i.e. when it was set up). The
+            default is 0, the first tube.
+
+        Returns
+        -------
+        list
+            One Command per tube change.
+        """
+        targets = self.targets() - origin
+        return [
+            Command(Mode.MOVE_TO, command.motors, tuple(
+                int(t) if t.is_integer() else float(t) for t in target
+            ))
+            for command, target in zip(self.commands, targets)
+        ]
+
+    def relative(self):
+        """RUN commands of every tube change, e.g. for firmware without
+        MOVE_TO.
+
+        Returns
+        -------
+        list
+            One Command per tube change.
+        """
+        if all(command.mode == Mode.RUN for command in self.commands):
+            return list(self.commands)
+        moves = np.diff(self.targets(), axis=0, prepend=np.zeros((1, 3)))
+        return [
+            Command(Mode.RUN, command.motors, tuple(
+                int(d) if d.is_integer() else float(d) for d in move
+            ))
+            for command, move in zip(self.commands, moves)
+        ]
+
+    @classmethod
+    def constant(cls, dwell_time, n, commands=None):
+        """Every fraction is collected for 'dwell_time' seconds."""
+        return cls(np.full(n, dwell_time, dtype=float), commands=commands)
+
+    @classmethod
+    def linear(cls, start, step, n, commands=None):
+        """Fraction i is collected for start + i * step seconds."""
+        return cls(start + step * np.arange(n), commands=commands)
+
+    @classmethod
+    def geometric(cls, start, ratio, n, commands=None):
+        """Fraction i is collected for start * ratio**i seconds."""
+        return cls(start * ratio ** np.arange(n, dtype=float), commands=commands)
+
+    @classmethod
+    def from_function(cls, func, n, commands=None):
+        """Fraction i is collected for func(i) seconds."""
+        return cls(np.fromiter((func(i) for i in range(n)), float, n), commands=commands)
+
+    @classmethod
+    def for_tubes(cls, dwell_times, tubes):
+        """The tube change at the end of fraction i moves to tube tubes[i], in
+        any order, e.g. to skip tubes or collect into a tube again. The run
+        starts at tube 0, and the default schedules move to tubes 1, 2, 3...
+        (see constants.TUBE_POSITIONS)."""
+        return cls(dwell_times, commands=make_targets(constants.TUBE_POSITIONS[list(tubes)].tolist()))
+
+    @classmethod
+    def from_volumes(cls, volumes, size_unit, flow_value, flow_unit, commands=None):
+        """Collect the given volume in every fraction at a constant flow rate.
+
+        Parameters
+        ----------
+        volumes : array_like
+            Volume of each fraction, in 'size_unit' (a key of FRACSIZE_TO_UL).
+        flow_value : float
+            The flow rate, in 'flow_unit' (a key of FRUNIT_TO_UL_HR).
+        """
+        volumes = np.asarray(volumes, dtype=float) * FRACSIZE_TO_UL[size_unit]
+        flow = flow_value * FRUNIT_TO_UL_HR[flow_unit]
+        return cls(volumes / flow * 3600, commands=commands)
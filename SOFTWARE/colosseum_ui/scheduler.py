@@ -0,0 +1,151 @@
+"""Drift-free timing of the tube changes of a run.
+
+Every tube change has an absolute deadline, computed from the start of the
+run, so the time spent talking to the Arduino never accumulates across
+fractions. The command for a tube change is sent early by the measured
+command overhead, so the change happens on time, and the planned and actual
+time of every change is recorded.
+"""
+import time
+from collections import namedtuple
+
+class FractionRecord(namedtuple(
+    'FractionRecord', ['index', 'planned', 'actual', 'overhead']
+)):
+    """Timing of one tube change. 'planned' and 'actual' are in seconds since
+    the start of the run, 'overhead' is the time the command took."""
+    __slots__ = ()
+
+    @property
+    def error(self):
+        return self.actual - self.planned
+
+class DeadlineScheduler:
+    """Deadlines of the tube changes of a run.
+
+    Parameters
+    ----------
+    interval : float (optional)
+        Seconds between tube changes.
+    changes : array_like (optional)
+        Seconds from 'start' to each tube change, for tube changes that are
+        not evenly spaced (see schedule.Schedule.offsets). Either 'interval'
+        or 'changes' is required.
+    start : float (optional)
+        Start of the run, on 'clock'. By default, now.
+    offset : float (optional)
+        Seconds between the start of the run and 'start', e.g. when resuming a
+        paused run. The default is 0.
+    overhead : float (optional)
+        Initial estimate of the seconds between sending a command and the tube
+        change, e.g. the motor travel time. The default is 0.
+    clock : callable (optional)
+        Monotonic time source. The default is time.monotonic.
+    sleep : callable (optional)
+        Function used to wait. The default is time.sleep.
+    wait_event : callable (optional)
+        Function used to wait for an interrupt, called with the event and the
+        timeout (see clock.Clock.wait). By default, the event's wait method.
+    lead : array_like (optional)
+        Seconds each command is sent ahead of its deadline on top of the
+        overhead, e.g. the travel time of each tube move (see
+        motion.MotionModel.travel_times), so the tube is in place on time.
+        By default, none.
+    """
+    # Weight of the latest measurement in the overhead estimate.
+    SMOOTHING = 0.5
+
+    def __init__(
+        self, interval=None, start=None, offset=0.0, overhead=0.0,
+        clock=time.monotonic, sleep=time.sleep, changes=None, wait_event=None,
+        lead=None,
+    ):
+        if interval is None and changes is None:
+            raise ValueError('either interval or changes is required')
+        self.interval = interval
+        self.changes = changes
+        self.clock = clock
+        self.sleep = sleep
+        self.wait_event = wait_event
+        self.lead = lead
+        self.start = clock() if start is None else start
+        self.offset = offset
+        self.overhead = overhead
+        self.records = []
+
+    def deadline(self, n):
+        """Time (on 'clock') at which the n-th tube change since 'start' is
+        due."""
+        if self.changes is not None:
+            return self.start + float(self.changes[n - 1])
+        return self.start + n * self.interval
+
+    def remaining(self, n):
+        """Seconds to wait before sending the command of the n-th tube
+        change."""
+        remaining = self.deadline(n) - self.overhead - self.clock()
+        if self.lead is not None:
+            remaining -= float(self.lead[n - 1])
+        return remaining
+
+    def wait(self, n, interrupt=None):
+        """Sleep until it is time to send the command of the n-th tube
+        change, or until 'interrupt' (a threading.Event) is set.
+
+        Returns
+        -------
+        bool
+            False if the wait was interrupted.
+        """
+        remaining = self.remaining(n)
+        while remaining > 0:
+            if interrupt is None:
+                self.sleep(remaining)
+            elif self.wait_event is not None:
+                if self.wait_event(interrupt, remaining):
+                    return False
+            elif interrupt.wait(remaining):
+                return False
+            remaining = self.remaining(n)
+        return True
+
+    async def wait_async(self, n, interrupt=None):
+        """Like wait, on the event loop. 'interrupt' is an asyncio.Event."""
+        # asyncio is slow to import and only needed here.
+        import asyncio
+        remaining = self.remaining(n)
+        while remaining > 0:
+            if interrupt is None:
+                await asyncio.sleep(remaining)
+            else:
+                try:
+                    await asyncio.wait_for(interrupt.wait(), remaining)
+                    return False
+                except asyncio.TimeoutError:
+                    pass
+            remaining = self.remaining(n)
+        return True
+
+    def record(self, index, n, sent, done):
+        """Record the n-th tube change, whose command was sent at 'sent' and
+        completed at 'done' (on 'clock'), and update the overhead estimate.
+        With a 'lead', the tube change happens when the move is expected to
+        be done.
+
+        Returns
+        -------
+        FractionRecord
+            The timing of the tube change.
+        """
+        overhead = done - sent
+        self.overhead += self.SMOOTHING * (overhead - self.overhead)
+        if self.lead is not None:
+            done += float(self.lead[n - 1])
+        record = FractionRecord(
+            index,
+            self.deadline(n) - self.start + self.offset,
+            done - self.start + self.offset,
+            overhead,
+        )
+        self.records.append(record)
+        return record
@@ -8,32 +8,122 @@ port. The device is programmed to receive commands of the form:
 
 "<mode,motorID,arg_m1,arg_m2,arg_m3>" # no spaces! the command is a string!
 
+Commands are usually built as command.Command objects, which are validated and
+encoded once, but plain strings are accepted too.
+
+Firmware that reports the CAP_SEQ capability (see negotiate) also accepts an
+optional sequence number, "<mode,motorID,arg_m1,arg_m2,arg_m3,seq>", which it
+echoes back. That lets talk() keep several commands in flight and match each
+reply to its command.
+
+Firmware that reports CAP_BINARY can also switch to a compact binary framing
+(see set_framing). Every command is then sent as a fixed-size packet,
+
+    opcode (uint8), motor mask (uint8), seq (uint8), 3 x arg (float32 LE)
+
+followed by its CRC16 (CCITT, little-endian). The packet is COBS encoded and
+terminated by a zero byte. Replies use the same format. ASCII framing remains
+the default and the fallback.
+
+Firmware that reports CAP_MOVE_TO also accepts MOVE_TO commands, which move
+the selected motors to absolute positions (in steps from where the motors
+were when SET_SPEED was last sent) instead of relative to where they are.
+
 This file can also be imported as a module and contains the following
 functions:
 
     * populate_ports - return a list of available serial ports
+    * get_arduino_ports - return the ports that have an Arduino, best first
+    * probe_port - check whether an Arduino running the firmware is on a port
+    * remember_port - remember the port an Arduino was last used on
+    * Transport - interface of the serial ports talked to
     * connect - returns a serial object with the computer connect to the object
+    * wait_until_ready - wait until the Arduino has booted
     * write_to_serial - write a string to the serial port
     * listen - listen for information from the serial port
+    * FrameReader - buffered, incremental reader of framed messages
+    * negotiate - ask the Arduino which protocol features it supports
+    * set_framing - switch between ASCII and binary framing
+    * encode_packet - encode a command as a binary packet
+    * decode_packet - decode a binary packet
     * talk - send multiple commands to the serial port
     * cmd_valid - check if the command you are going to send is valid
 """
 
+import abc
+import binascii
 import glob
+import json
+import logging
+import os
+import struct
 import sys
 import time
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import serial
 import serial.tools.list_ports
 
-from .constants import TEST_PORT
+from .command import Command, Mode, as_command, parse_reply
+from .constants import ARDUINO_VID, EMULATOR_PORT, PORT_CACHE_PATH, TEST_PORT
+
+logger = logging.getLogger(__name__)
 
 startMarker = 60 # <
 endMarker = 62 # >
 midMarker = 44 # ,
 
+# Seconds to wait for the Arduino to echo a command before giving up.
+REPLY_TIMEOUT = 10
+
+# Maximum number of seconds to wait for the Arduino to boot after the port is
+# opened (which resets most boards). Boot normally takes under 2 seconds.
+READY_TIMEOUT = 5
+READY_BANNER = b'Arduino is ready'
+
+# Size of the Arduino's serial receive buffer. Commands in flight must fit in
+# it, or bytes are dropped while the firmware is busy.
+RX_BUFFER_SIZE = 64
+
+# Capability bits reported by the firmware in reply to HELLO_CMD.
+CAP_SEQ = 1
+CAP_BINARY = 2
+CAP_MOVE_TO = 4
+HELLO_CMD = Command(Mode.HELLO, 0, (0, 0, 0))
+
+START_MARKER = b'<'
+END_MARKER = b'>'
+
+# Ports starting with this are served by the in-process firmware emulator.
+EMULATOR_SCHEME = 'emulator://'
+
+# Maximum number of ports opened at once while discovering ports.
+PROBE_WORKERS = 16
+
+# Binary framing
+PACKET = struct.Struct('<BBBfff')
+CRC = struct.Struct('<H')
+PACKET_SIZE = PACKET.size + CRC.size
+PACKET_DELIMITER = b'\x00'
+
+# One FrameReader and Protocol per open port, so partial frames and the
+# negotiated features survive between calls.
+_readers = weakref.WeakKeyDictionary()
+_protocols = weakref.WeakKeyDictionary()
+
+def _can_open(port):
+    try:
+        s = serial.Serial(port)
+        s.close()
+        return True
+    except (OSError, serial.SerialException):
+        return False
+
 def populate_ports():
-    """Gets and prints the serial ports available to connect to.
+    """Gets the serial ports available to connect to. The candidates are
+    opened concurrently.
 
     Parameters
     ----------
@@ -54,22 +144,113 @@ def populate_ports():
     else:
         raise EnvironmentError('Unsupported platform')
 
-    result = []
-    for port in ports:
-        try:
-            s = serial.Serial(port)
-            s.close()
-            result.append(port)
-        except (OSError, serial.SerialException):
-            pass
-    return result[-1]
-
-def get_arduino_ports(dry_run=False):
+    if not ports:
+        return []
+    with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(ports))) as pool:
+        available = pool.map(_can_open, ports)
+    return [port for port, ok in zip(ports, available) if ok]
+
+def load_port_cache(path=PORT_CACHE_PATH):
+    """Read the ports Arduinos were last successfully used on.
+
+    Returns
+    -------
+    dict
+        Mapping of USB serial number to port device.
+    """
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def remember_port(device, path=PORT_CACHE_PATH):
+    """Remember that the Arduino at 'device' was successfully used, so that it
+    is listed first the next time ports are discovered.
+
+    Parameters
+    ----------
+    device : str
+        The port the Arduino is connected to.
+
+    Returns
+    -------
+    """
+    for port in serial.tools.list_ports.comports():
+        if port.device == device and port.serial_number:
+            break
+    else:
+        return
+
+    cache = load_port_cache(path)
+    if cache.get(port.serial_number) == device:
+        return
+    cache[port.serial_number] = device
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f'could not write port cache {path}: {e}')
+
+def probe_port(device, timeout=3):
+    """Check whether an Arduino running the colosseum firmware is connected
+    to a port. Opening the port resets the Arduino, which then prints its
+    "<Arduino is ready>" banner.
+
+    Parameters
+    ----------
+    device : str
+        The port to probe.
+    timeout : float (optional)
+        Maximum number of seconds to wait for the banner. The default is 3.
+
+    Returns
+    -------
+    bool
+        True if the banner was received.
+    """
+    try:
+        s = connect(device)
+    except (OSError, serial.SerialException):
+        return False
+    try:
+        reader = FrameReader()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                frame = reader.read_frame(s, timeout=deadline - time.monotonic())
+            except TimeoutError:
+                return False
+            if bytes(frame).startswith(b'Arduino is ready'):
+                return True
+        return False
+    except (OSError, serial.SerialException):
+        return False
+    finally:
+        s.close()
+
+def get_arduino_ports(dry_run=False, probe=False, timeout=3, emulator=False):
     """Detect which serial ports are connected to an Arduino.
 
+    Only USB devices with the Arduino vendor ID (ARDUINO_VID) are listed; if
+    there are none (e.g. clone boards), all ports are listed. Ports that an
+    Arduino was last successfully used on (see remember_port) come first.
+
     Parameters
     ----------
-    None
+    probe : bool (optional)
+        Whether to also open every candidate (concurrently) and rank the ones
+        that reply with the firmware's banner before the others. The default
+        is False.
+    timeout : float (optional)
+        Maximum number of seconds to wait for the banner when probing. The
+        default is 3.
+    emulator : bool (optional)
+        Whether to also list the in-process firmware emulator (EMULATOR_PORT),
+        last. The default is False.
 
     Returns
     -------
@@ -78,20 +259,84 @@ def get_arduino_ports(dry_run=False):
     """
     if dry_run:
         return [TEST_PORT]
+    extra = [EMULATOR_PORT] if emulator else []
+
+    ports = serial.tools.list_ports.comports()
+    arduinos = [port for port in ports if port.vid == ARDUINO_VID]
+    if arduinos:
+        ports = arduinos
+    else:
+        logger.debug('no ports with the Arduino vendor ID, listing all ports')
+
+    cache = load_port_cache()
+    replied = dict.fromkeys((port.device for port in ports), True)
+    if probe and ports:
+        with ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(ports))) as pool:
+            ready = pool.map(
+                lambda port: probe_port(port.device, timeout=timeout), ports
+            )
+        replied = {port.device: ok for port, ok in zip(ports, ready)}
+    # Ports that replied to the probe first, and among those the port the
+    # Arduino was last used on
+    return sorted(ports, key=lambda port: (
+        not replied[port.device],
+        cache.get(port.serial_number) != port.device,
+    )) + extra
+
+class Transport(abc.ABC):
+    """Interface of the serial ports the functions of this module talk to.
+
+    serial.Serial implements it, and so do other transports such as
+    emulator.EmulatorTransport. Reads block for up to 'timeout' seconds
+    (forever if None), like pyserial's.
+    """
+    port = None
+    timeout = None
+    is_open = False
+    dtr = True
+
+    @property
+    @abc.abstractmethod
+    def in_waiting(self):
+        """Number of bytes that can be read without blocking."""
+
+    @abc.abstractmethod
+    def read(self, size=1):
+        """Read up to 'size' bytes, waiting for at least one."""
+
+    @abc.abstractmethod
+    def write(self, data):
+        """Write bytes, and return how many were written."""
+
+    @abc.abstractmethod
+    def reset_input_buffer(self):
+        """Discard the bytes received but not read yet."""
 
-    return serial.tools.list_ports.comports()
+    def flushInput(self):
+        self.reset_input_buffer()
 
-def connect(port, baudrate=2000000, dry_run=False):
+    @abc.abstractmethod
+    def close(self):
+        """Close the port."""
+
+def connect(port, baudrate=2000000, dry_run=False, clock=None):
     """Connects to the specified serial port
 
     Parameters
     ----------
+    port : str
+        Location of the serial port. Ports starting with EMULATOR_SCHEME
+        ("emulator://") connect to an in-process emulator of the firmware (see
+        emulator.EmulatorTransport.from_url).
     baudrate : int (optional)
         The baud rate specifies how fast data is sent over a serial line.
         It's usually expressed in units of bits-per-second (bps). The possible
         baudrates for an Arduino Uno are 1,200, 2,400, 4,800, 19,200, 38,400,
         57,600, 115,200, and 2,000,000 (I've tested up to this speed). The
         default is 2000000.
+    clock : clock.Clock (optional)
+        Clock the emulator runs on, for emulator ports. The default is the
+        real clock.
 
     Returns
     -------
@@ -102,6 +347,9 @@ def connect(port, baudrate=2000000, dry_run=False):
     """
     if dry_run:
         return serial.Serial()
+    if port.startswith(EMULATOR_SCHEME):
+        from .emulator import EmulatorTransport
+        return EmulatorTransport.from_url(port, clock=clock)
     s = serial.Serial()
     s.port = port
     s.baudrate = baudrate
@@ -112,15 +360,92 @@ def connect(port, baudrate=2000000, dry_run=False):
     s.open()
     return s
 
-def write_to_serial(s, string, dry_run=False):
+def _wait_for_banner(s, timeout):
+    reader = get_reader(s)
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        try:
+            frame = reader.read_frame(s, timeout=remaining)
+        except TimeoutError:
+            return False
+        if bytes(frame).startswith(READY_BANNER):
+            return True
+
+def _reset(s):
+    # Toggling DTR resets the Arduino through the auto-reset capacitor.
+    try:
+        s.dtr = False
+        time.sleep(0.1)
+        s.dtr = True
+    except (OSError, serial.SerialException):
+        pass
+
+def wait_until_ready(s, dry_run=False, timeout=READY_TIMEOUT):
+    """Wait until the Arduino has booted and is ready to receive commands.
+
+    Opening the port resets the Arduino, which prints "<Arduino is ready>" as
+    soon as setup() is done. If that banner does not arrive (e.g. the board was
+    not reset by opening the port), the Arduino is asked for its capabilities;
+    any reply means it is ready. Otherwise it is reset by pulsing DTR and the
+    banner is waited for once more.
+
+    Parameters
+    ----------
+    s : Serial
+        The Serial object instance that your Arduino is interfacing.
+    timeout : float (optional)
+        Maximum number of seconds to wait for the banner, each time it is
+        waited for. The default is READY_TIMEOUT.
+
+    Returns
+    -------
+    float
+        The number of seconds it took until the Arduino was ready.
+
+    Raises
+    ------
+    TimeoutError
+        If the Arduino never became ready.
+    """
+    if dry_run:
+        return 0.0
+
+    start = time.monotonic()
+    if _wait_for_banner(s, timeout):
+        return time.monotonic() - start
+
+    logger.debug(f'no banner within {timeout} seconds, sending HELLO')
+    write_to_serial(s, HELLO_CMD.encoded)
+    try:
+        listen(s, timeout=1)
+        return time.monotonic() - start
+    except TimeoutError:
+        pass
+
+    logger.debug('no reply to HELLO, resetting the Arduino')
+    get_reader(s).clear()
+    _reset(s)
+    if _wait_for_banner(s, timeout):
+        return time.monotonic() - start
+    raise TimeoutError(f'Arduino at {s.port} is not responding')
+
+def write_to_serial(s, string, dry_run=False, flush=True):
     """Write a string to the arduino connected to serial port 's'.
 
     Parameters
     ----------
     s : Serial
         The Serial object instance that your Arduino is interfacing.
-    string : str
-        The string that will be sent to the arduino.
+    string : str or bytes
+        The string that will be sent to the arduino. Bytes (such as
+        Command.encoded) are written as they are.
+    flush : bool (optional)
+        Whether to discard any unread input before writing. This must be False
+        while replies to earlier commands are still expected. The default is
+        True.
 
     Returns
     -------
@@ -128,12 +453,176 @@ def write_to_serial(s, string, dry_run=False):
     if dry_run:
         return
 
-    s.write(string.encode())
-    s.flushInput()
+    # Stale input is dropped before writing, so that a fast reply to this
+    # command cannot be discarded along with it.
+    if flush:
+        s.flushInput()
+        get_reader(s).clear()
+    s.write(string.encode() if isinstance(string, str) else string)
     return
 
-def listen(s, dry_run=False):
-    """Listen to strings being sent from the Serial Object at the port.
+class FrameReader:
+    """Buffered reader that splits the byte stream from the Arduino into
+    frames delimited by the start and end markers (or, with binary framing,
+    terminated by zero bytes).
+
+    Every read pulls all of the bytes that are currently waiting on the port
+    into a reusable buffer, and complete frames are handed out as memoryview
+    slices (without the markers). Bytes belonging to an incomplete frame are
+    kept until the rest of the frame arrives. Like the firmware, a start marker
+    restarts the frame, so a truncated frame is dropped rather than merged with
+    the following one.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.pending = deque()
+        self.binary = False
+
+    def clear(self):
+        """Drop any buffered bytes and frames that were not read yet."""
+        self.buffer.clear()
+        self.pending.clear()
+
+    def feed(self, data):
+        """Add raw bytes to the buffer and split off any complete frames.
+
+        Parameters
+        ----------
+        data : bytes
+            Bytes read from the serial port.
+
+        Returns
+        -------
+        int
+            The number of frames that are ready to be read.
+        """
+        buffer = self.buffer
+        buffer += data
+        if self.binary:
+            return self._split_packets()
+        if END_MARKER not in data:
+            return len(self.pending)
+
+        # Scan a single immutable snapshot so that the frames handed out stay
+        # valid after the buffer is compacted.
+        snapshot = bytes(buffer)
+        view = memoryview(snapshot)
+        pos = 0
+        while True:
+            end = snapshot.find(END_MARKER, pos)
+            if end < 0:
+                break
+            start = snapshot.rfind(START_MARKER, pos, end)
+            if start >= 0:
+                self.pending.append(view[start + 1:end])
+            pos = end + 1
+        del buffer[:pos]
+        return len(self.pending)
+
+    def _split_packets(self):
+        buffer = self.buffer
+        if PACKET_DELIMITER not in buffer:
+            return len(self.pending)
+
+        snapshot = bytes(buffer)
+        view = memoryview(snapshot)
+        pos = 0
+        while True:
+            end = snapshot.find(PACKET_DELIMITER, pos)
+            if end < 0:
+                break
+            if end > pos:
+                self.pending.append(view[pos:end])
+            pos = end + 1
+        del buffer[:pos]
+        return len(self.pending)
+
+    def fill(self, s):
+        """Read everything that is waiting on the port in one call. If nothing
+        is waiting, block for a single byte (up to the port timeout).
+
+        Parameters
+        ----------
+        s : Serial
+            The Serial object instance that your Arduino is interfacing.
+
+        Returns
+        -------
+        int
+            The number of bytes that were read.
+        """
+        data = s.read(s.in_waiting or 1)
+        if data:
+            self.feed(data)
+        return len(data)
+
+    def frames(self, s):
+        """Yield complete frames from the port as they arrive.
+
+        Parameters
+        ----------
+        s : Serial
+            The Serial object instance that your Arduino is interfacing.
+
+        Yields
+        ------
+        memoryview
+            The contents of a single frame, without the markers.
+        """
+        while True:
+            yield self.read_frame(s)
+
+    def read_frame(self, s, timeout=None):
+        """Block until a complete frame is available and return it.
+
+        The wait is made of blocking reads on the port (each lasting at most
+        the port timeout, or the time left before 'timeout'), so no CPU is
+        used while the Arduino is silent.
+
+        Parameters
+        ----------
+        s : Serial
+            The Serial object instance that your Arduino is interfacing.
+        timeout : float (optional)
+            Maximum number of seconds to wait for a frame. By default, wait
+            forever.
+
+        Returns
+        -------
+        memoryview
+            The contents of the frame, without the markers.
+
+        Raises
+        ------
+        TimeoutError
+            If no complete frame arrived before the timeout.
+        """
+        pending = self.pending
+        if timeout is None:
+            while not pending:
+                self.fill(s)
+            return pending.popleft()
+
+        deadline = time.monotonic() + timeout
+        port_timeout = s.timeout
+        try:
+            while not pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f'no reply within {timeout} seconds')
+                # Don't let a read outlast the deadline.
+                if port_timeout is None or remaining < port_timeout:
+                    s.timeout = remaining
+                self.fill(s)
+        finally:
+            if s.timeout != port_timeout:
+                s.timeout = port_timeout
+        return pending.popleft()
+
+def get_reader(s):
+    """Get the FrameReader associated with the serial port 's', creating it if
+    this is the first time the port is read from.
 
     Parameters
     ----------
@@ -142,34 +631,247 @@ def listen(s, dry_run=False):
 
     Returns
     -------
-    msg: str
-        The string that was sent from the Serial object to the computer.
+    FrameReader
+        The reader holding the buffered data of this port.
+    """
+    reader = _readers.get(s)
+    if reader is None:
+        reader = _readers[s] = FrameReader()
+    return reader
+
+class Protocol:
+    """Protocol features negotiated with the firmware on one port."""
+
+    def __init__(self):
+        self.capabilities = 0
+        self.seq = 0
+        self.binary = False
+
+    @property
+    def sequenced(self):
+        return self.binary or bool(self.capabilities & CAP_SEQ)
+
+    def next_seq(self):
+        self.seq = (self.seq + 1) % 256
+        return self.seq
+
+    def encode(self, command, seq):
+        """Encode a command with a sequence number in the current framing."""
+        if self.binary:
+            return encode_packet(command, seq)
+        return command.tagged(seq)
+
+    def decode(self, frame):
+        """Decode a reply frame into the echoed Command and its sequence
+        number. Raises ValueError if the frame is invalid."""
+        if self.binary:
+            return decode_packet(frame)
+        return parse_reply(frame)
+
+def get_protocol(s):
+    """Get the Protocol state associated with the serial port 's'. Until
+    negotiate() is called, no optional features are used.
+
+    Parameters
+    ----------
+    s : Serial
+        The Serial object instance that your Arduino is interfacing.
+
+    Returns
+    -------
+    Protocol
+        The protocol state of this port.
     """
+    protocol = _protocols.get(s)
+    if protocol is None:
+        protocol = _protocols[s] = Protocol()
+    return protocol
+
+def negotiate(s, dry_run=False, timeout=REPLY_TIMEOUT, binary=False):
+    """Ask the Arduino which optional protocol features it supports.
+
+    Firmware with optional features replies to HELLO_CMD with its capability
+    bits in arg_m1. Older firmware simply echoes the command back, which reads
+    as no capabilities, so talk() keeps using plain echo matching.
+
+    Parameters
+    ----------
+    s : Serial
+        The Serial object instance that your Arduino is interfacing.
+    binary : bool (optional)
+        Whether to switch to binary framing if the firmware supports it. The
+        default is False.
+
+    Returns
+    -------
+    int
+        The capability bits of the firmware.
+    """
+    protocol = get_protocol(s)
     if dry_run:
-        return ""
+        return protocol.capabilities
 
-    msg = ""
-    x = "z" # any value that is not an end- or startMarker
+    write_to_serial(s, HELLO_CMD.encoded)
+    reply = listen(s, timeout=timeout)
+    try:
+        echo = Command.parse(reply)
+    except ValueError:
+        echo = None
+    if echo is not None and echo.mode == Mode.HELLO:
+        protocol.capabilities = int(echo.args[0])
+    else:
+        protocol.capabilities = 0
+    logger.debug("Firmware capabilities -- " + str(protocol.capabilities))
 
-    # wait for the start character
-    while  True:
-        x = s.read()
-        try:
-            if ord(x) == startMarker:
-                break
-        except:
-            pass
+    if binary and protocol.capabilities & CAP_BINARY:
+        set_framing(s, binary=True, timeout=timeout)
+    return protocol.capabilities
+
+def set_framing(s, binary, timeout=REPLY_TIMEOUT):
+    """Switch the Arduino and the host between ASCII and binary framing. The
+    request is sent (and acknowledged) in the current framing, and both sides
+    switch right after the acknowledgement.
+
+    Parameters
+    ----------
+    s : Serial
+        The Serial object instance that your Arduino is interfacing.
+    binary : bool
+        True to use binary framing, False to go back to ASCII.
+
+    Returns
+    -------
+    """
+    protocol = get_protocol(s)
+    if binary and not protocol.capabilities & CAP_BINARY:
+        raise ValueError('the firmware does not support binary framing')
+    if protocol.binary == binary:
+        return
+
+    talk(s, [Command(Mode.FRAMING, 0, (int(binary), 0, 0))], timeout=timeout)
+    protocol.binary = binary
+    get_reader(s).binary = binary
+    logger.debug('framing -- ' + ('binary' if binary else 'ASCII'))
+
+def cobs_encode(data):
+    """Consistent Overhead Byte Stuffing: encode 'data' so that it contains no
+    zero bytes (the packet delimiter).
+
+    Parameters
+    ----------
+    data : bytes
+        The data to encode (at most 254 bytes).
+
+    Returns
+    -------
+    bytes
+        The encoded data, one byte longer than 'data'.
+    """
+    out = bytearray()
+    for block in bytes(data).split(b'\x00'):
+        out.append(len(block) + 1)
+        out += block
+    return bytes(out)
+
+def cobs_decode(data):
+    """Decode data encoded with cobs_encode.
+
+    Parameters
+    ----------
+    data : bytes
+        The encoded data, without the delimiter.
+
+    Returns
+    -------
+    bytes
+        The decoded data.
+
+    Raises
+    ------
+    ValueError
+        If the data is not validly encoded.
+    """
+    data = bytes(data)
+    out = bytearray()
+    pos = 0
+    while pos < len(data):
+        code = data[pos]
+        end = pos + code
+        if code == 0 or end > len(data):
+            raise ValueError('invalid COBS data')
+        out += data[pos + 1:end]
+        pos = end
+        if pos < len(data):
+            out.append(0)
+    return bytes(out)
+
+def encode_packet(command, seq=0):
+    """Encode a command as a binary packet (see the module docstring).
+
+    Parameters
+    ----------
+    command : Command
+        The command to encode.
+    seq : int (optional)
+        The sequence number, between 0 and 255. The default is 0.
 
-    # save data until the end marker is found
-    while ord(x) != endMarker:
-        if ord(x) != startMarker:
-            msg = msg + x.decode()
+    Returns
+    -------
+    bytes
+        The COBS encoded packet, including the delimiter.
+    """
+    payload = PACKET.pack(command.mode, command.motors, seq, *command.args)
+    return cobs_encode(payload + CRC.pack(binascii.crc_hqx(payload, 0xFFFF))) + PACKET_DELIMITER
 
-        x = s.read()
+def decode_packet(frame):
+    """Decode a binary packet.
 
-    return(msg)
+    Parameters
+    ----------
+    frame : bytes or memoryview
+        The COBS encoded packet, without the delimiter.
 
-def talk(s, commands, dry_run=False):
+    Returns
+    -------
+    tuple
+        The Command, and its sequence number.
+
+    Raises
+    ------
+    ValueError
+        If the packet is malformed or its CRC does not match.
+    """
+    data = cobs_decode(frame)
+    if len(data) != PACKET_SIZE:
+        raise ValueError(f'expected a {PACKET_SIZE} byte packet, got {len(data)}')
+    payload = data[:PACKET.size]
+    if CRC.unpack_from(data, PACKET.size)[0] != binascii.crc_hqx(payload, 0xFFFF):
+        raise ValueError('packet CRC mismatch')
+    mode, motors, seq, *args = PACKET.unpack(payload)
+    return Command(mode, motors, args), seq
+
+def listen(s, dry_run=False, timeout=None):
+    """Listen to strings being sent from the Serial Object at the port.
+
+    Parameters
+    ----------
+    s : Serial
+        The Serial object instance that your Arduino is interfacing.
+    timeout : float (optional)
+        Maximum number of seconds to wait for a message. By default, wait
+        forever.
+
+    Returns
+    -------
+    msg: str
+        The string that was sent from the Serial object to the computer.
+    """
+    if dry_run:
+        return ""
+
+    return str(get_reader(s).read_frame(s, timeout=timeout), 'utf-8')
+
+def talk(s, commands, dry_run=False, timeout=REPLY_TIMEOUT, window=1):
     """Send a list of commands to the Arduino connected at the Serial port.
 
     Parameters
@@ -177,37 +879,150 @@ def talk(s, commands, dry_run=False):
     s : Serial
         The Serial object instance that your Arduino is interfacing.
     commands : list
-        A list of properly formatted string commands to send to the Arduino.
-        Command is structured as "<mode, motorID, arg_m1, arg_m2, arg_m3>",
-        where mode is one of [RUN, STOP, RESUME, PAUSE, SET_SPEED, SET_ACCEL],
+        A list of Command objects or properly formatted string commands to send
+        to the Arduino. Command is structured as
+        "<mode, motorID, arg_m1, arg_m2, arg_m3>", where mode is one of
+        [RUN, STOP, RESUME, PAUSE, SET_SPEED, SET_ACCEL, HELLO, MOVE_TO],
         and motorID is [1, 1, 1] (can be combo of numbers i.e. 100 or 101 or
-        001 (binary indicator), and arg_m* is any floating number.
+        001 (binary indicator), and arg_m* is any floating number. Invalid
+        strings are skipped.
+    timeout : float (optional)
+        Maximum number of seconds to wait for the reply to each command. The
+        default is REPLY_TIMEOUT.
+    window : int (optional)
+        Maximum number of commands in flight at once. Only used when the
+        firmware supports sequence numbers (see negotiate). Note that the
+        firmware aborts a move when it receives another command, so RUN
+        commands should only be pipelined if that is intended. The default is
+        1.
 
     Returns
     -------
+
+    Raises
+    ------
+    TimeoutError
+        If the Arduino did not reply to a command in time.
     """
+    if not dry_run and get_protocol(s).sequenced:
+        return talk_sequenced(s, commands, timeout=timeout, window=window)
 
     waitingForReply = False
 
-    for teststr in commands: # could use a while loop + numloops iterator?
-        if not cmd_valid(teststr):
+    for command in commands: # could use a while loop + numloops iterator?
+        command = as_command(command)
+        if command is None:
             continue # returns to beginning of for loop and grabs next string
         if waitingForReply == False:
-            write_to_serial(s, teststr, dry_run=dry_run)
-            print("Sent from PC -- " + teststr) # Prints out what was sent to the Arduino
+            write_to_serial(s, command.encoded, dry_run=dry_run)
+            logger.debug("Sent from PC -- " + command.text) # Logs what was sent to the Arduino
             waitingForReply = True
 
         if waitingForReply == True:
-            while not dry_run and s.inWaiting() == 0:
-                pass
-
-            dataRecvd = listen(s, dry_run=dry_run)
-            print("Reply Received -- " + dataRecvd) # Prints out what was received by the Arduino
+            dataRecvd = listen(s, dry_run=dry_run, timeout=timeout)
+            logger.debug("Reply Received -- " + dataRecvd) # Logs what was received by the Arduino
+            if not dry_run:
+                check_echo(command, dataRecvd)
             waitingForReply = False
 
+        logger.debug("Send and receive complete")
 
-        time.sleep(0.1)
-        print("Send and receive complete")
+def talk_sequenced(s, commands, timeout=REPLY_TIMEOUT, window=1):
+    """Send a list of commands tagged with sequence numbers, keeping up to
+    'window' of them in flight, and wait until every one has been echoed.
+    Replies are matched to commands by their sequence number, so there is no
+    need to pause between commands. The commands in flight are also kept
+    within the Arduino's receive buffer (RX_BUFFER_SIZE bytes).
+
+    Parameters
+    ----------
+    s : Serial
+        The Serial object instance that your Arduino is interfacing.
+    commands : list
+        A list of Command objects or properly formatted string commands to
+        send to the Arduino.
+    timeout : float (optional)
+        Maximum number of seconds to wait for each reply. The default is
+        REPLY_TIMEOUT.
+    window : int (optional)
+        Maximum number of commands in flight at once. The default is 1.
+
+    Returns
+    -------
+
+    Raises
+    ------
+    TimeoutError
+        If the Arduino did not reply to a command in time.
+    """
+    protocol = get_protocol(s)
+    reader = get_reader(s)
+    inflight = {}
+    inflight_bytes = 0
+
+    def wait_for_reply():
+        nonlocal inflight_bytes
+        frame = reader.read_frame(s, timeout=timeout)
+        try:
+            echo, seq = protocol.decode(frame)
+        except ValueError as e:
+            logger.warning(f'invalid reply -- {bytes(frame)!r} ({e})')
+            return
+        sent = inflight.pop(seq, None)
+        if sent is None:
+            logger.warning(f'unexpected reply -- {echo} (#{seq})')
+            return
+        command, size = sent
+        inflight_bytes -= size
+        logger.debug(f'Reply Received -- {echo} (#{seq})')
+        if not command.matches(echo):
+            logger.warning(f'reply does not match -- {command.text}')
+
+    s.flushInput()
+    reader.clear()
+    for command in commands:
+        command = as_command(command)
+        if command is None:
+            continue
+        seq = protocol.next_seq()
+        tagged = protocol.encode(command, seq)
+        while inflight and (
+            len(inflight) >= window or inflight_bytes + len(tagged) > RX_BUFFER_SIZE
+        ):
+            wait_for_reply()
+
+        write_to_serial(s, tagged, flush=False)
+        logger.debug(f'Sent from PC -- {command.text} (#{seq})')
+        inflight[seq] = (command, len(tagged))
+        inflight_bytes += len(tagged)
+
+    while inflight:
+        wait_for_reply()
+    logger.debug('Send and receive complete')
+
+def check_echo(command, reply):
+    """Compare the reply of the Arduino with the command that was sent.
+
+    Parameters
+    ----------
+    command : Command
+        The command that was sent.
+    reply : str
+        The reply as returned by listen().
+
+    Returns
+    -------
+    bool
+        True if the reply echoes the command.
+    """
+    try:
+        echo = Command.parse(reply)
+    except ValueError:
+        echo = None
+    if echo is None or not command.matches(echo):
+        logger.warning("Reply does not match -- " + command.text)
+        return False
+    return True
 
 
 def cmd_valid(cmd):
@@ -216,8 +1031,9 @@ def cmd_valid(cmd):
 
     Parameters
     ----------
-    cmd : str
-        The command string to be sent. Command is structured as
+    cmd : Command or str
+        The command to be sent. Command objects are always valid. A command
+        string is structured as
         "<mode, motorID, arg_m1, arg_m2, arg_m3>", where mode is one of
         [RUN, STOP, RESUME, PAUSE, SET_SPEED, SET_ACCEL],
         and motorID is [1, 1, 1] (can be combo of numbers i.e. 100 or 101 or 001
@@ -231,16 +1047,7 @@ def cmd_valid(cmd):
         A boolean indicating whether the command is valid (True) or not (False).
     """
 
-    cmds = ["RUN", "STOP", "RESUME", "PAUSE", "SET_SPEED", "SET_ACCEL"]
-    inds = ["000", "100", "010", "001", "110", "101", "011", "111"]
-    valid = False
-    if "," in cmd and cmd[0] == '<' and cmd[-1]=='>':
-        testcmd = cmd[1:].split(",")[0]
-        ind = cmd[1:].split(",")[1]
-        if testcmd in cmds and ind in inds:
-            valid = True
-            return valid
-    return valid
+    return as_command(cmd) is not None
 
 
 ## Set Accel to be blah
@@ -0,0 +1,105 @@
+"""Back-to-back runs on a single connection.
+
+Connecting to an Arduino means waiting for it to boot and setting up the
+motors, and a Colosseum closes its port at the end of its run. A
+ColosseumSession keeps one connection open and runs a queue of runs, each
+with its own parameters or schedule, moving back to the first tube between
+runs:
+
+    session = ColosseumSession('/dev/ttyACM0')
+    session.submit(0.5, 'mL', 1, 'mL/min', 40)
+    session.submit(schedule=Schedule.linear(12, 12, 20))
+    session.run()
+    session.close()
+"""
+import logging
+from collections import deque
+
+from .colosseum import Colosseum
+
+logger = logging.getLogger(__name__)
+
+class ColosseumSession:
+    """A queue of runs on one Colosseum.
+
+    Parameters
+    ----------
+    port : str
+        Location of the serial port.
+    home : bool (optional)
+        Whether to move back to the first tube between runs. The default is
+        True.
+    **kwargs
+        Other arguments of Colosseum.
+    """
+
+    def __init__(self, port, home=True, **kwargs):
+        self.colosseum = Colosseum(port, keep_open=True, **kwargs)
+        self.home = home
+        # Arguments of Colosseum.run of every run that has not started yet
+        self.queue = deque()
+        # FractionRecords of every completed run
+        self.completed = []
+        self.stopped = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def position(self):
+        return self.colosseum.position
+
+    def submit(self, *args, **kwargs):
+        """Queue a run. Takes the arguments of Colosseum.run.
+
+        Returns
+        -------
+        int
+            The number of runs in the queue.
+        """
+        if self.stopped:
+            raise Exception('session is stopped')
+        self.queue.append((args, kwargs))
+        return len(self.queue)
+
+    def run(self):
+        """Run every queued run, back to back. Returns early if a run is
+        paused, resume() picks up from there."""
+        colosseum = self.colosseum
+        while not self.stopped:
+            if colosseum.run_cache is not None and not colosseum.done:
+                colosseum.resume()
+            else:
+                if not self.queue:
+                    break
+                if colosseum.done:
+                    colosseum.reset(home=self.home)
+                args, kwargs = self.queue.popleft()
+                logger.info(f'[session] starting run {len(self.completed) + 1}, {len(self.queue)} queued')
+                colosseum.run(*args, **kwargs)
+            if not colosseum.done:
+                # Paused
+                return
+            if not self.stopped:
+                self.completed.append(colosseum.fractions)
+        logger.info(f'[session] done, {len(self.completed)} runs')
+
+    def pause(self):
+        self.colosseum.pause()
+
+    def resume(self):
+        self.run()
+
+    def stop(self):
+        """Stop the current run and drop the queued ones."""
+        self.stopped = True
+        self.queue.clear()
+        self.colosseum.stop()
+
+    def close(self):
+        """Stop and close the port."""
+        self.stop()
+        self.colosseum.close()
@@ -0,0 +1,63 @@
+"""Fast-forward simulation of runs.
+
+simulate() runs a protocol against the firmware emulator on a virtual clock,
+so a run that takes hours on the bench completes in milliseconds, and returns
+everything it did: the timing of every tube change, the commands the firmware
+executed, the final positions of the motors and the journal of the run. It
+needs no Arduino, which makes it suitable for CI and batch checks of
+protocols:
+
+    result = simulate(1, 'mL', 1, 'mL/min', 86)
+    print(result.duration / 3600, result.positions)
+"""
+import time
+from collections import namedtuple
+
+from .clock import VirtualClock
+from .colosseum import Colosseum
+from .constants import EMULATOR_PORT
+from .journal import MemoryJournal
+
+class Simulation(namedtuple(
+    'Simulation', ['fractions', 'commands', 'positions', 'duration', 'trace', 'wall']
+)):
+    """Result of a simulated run. 'fractions' are the FractionRecords of the
+    tube changes, 'commands' every Command the firmware executed, 'positions'
+    the final position of each motor (steps), 'duration' the simulated
+    seconds, 'trace' the journal events and 'wall' the real seconds the
+    simulation took."""
+    __slots__ = ()
+
+def simulate(*args, port=EMULATOR_PORT.device, clock=None, **kwargs):
+    """Simulate a run on a virtual clock.
+
+    Parameters
+    ----------
+    *args, **kwargs
+        Arguments of Colosseum.run, e.g. a 'schedule'.
+    port : str (optional)
+        Emulator port, to set the emulator's parameters (see
+        emulator.EmulatorTransport.from_url). The default is 'emulator://'.
+    clock : clock.VirtualClock (optional)
+        The clock to simulate on. By default, a new VirtualClock.
+
+    Returns
+    -------
+    Simulation
+        What the run did.
+    """
+    start = time.perf_counter()
+    clock = VirtualClock() if clock is None else clock
+    journal = MemoryJournal(clock=clock)
+    colosseum = Colosseum(port, journal=journal, clock=clock)
+    begin = clock.monotonic()
+    colosseum.run(*args, **kwargs)
+    emulator = colosseum.serial.emulator
+    return Simulation(
+        colosseum.fractions,
+        list(emulator.executed),
+        emulator.positions,
+        clock.monotonic() - begin,
+        journal.events,
+        time.perf_counter() - start,
+    )
@@ -3,9 +3,10 @@ import os
 import sys
 import time
 import threading
-from functools import partial
+from datetime import timedelta
+from functools import lru_cache, partial
 
-from PyQt5 import QtCore, QtWidgets, uic
+from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtCore import pyqtSignal, QThread
 from PyQt5.QtGui import QDoubleValidator, QIntValidator
 from PyQt5.QtWidgets import (
@@ -17,6 +18,7 @@ from PyQt5.QtWidgets import (
     QMessageBox,
 )
 
+from .clock import SYSTEM_CLOCK
 from .colosseum import Colosseum
 from .constants import (
     ANGLES,
@@ -26,21 +28,19 @@ from .constants import (
     SETTING_TO_UNITS_MAPPING,
     TEST_PORT,
     TIMEUNIT_TO_HR,
-    UI_PATH,
     VOLUNIT_TO_UL,
 )
 from .utils import is_float, is_int, make_row_dict
-from .unit_conversion import (
-    get_fracsize,
-    get_numfrac,
-    time_from_vol,
-    vol_from_time,
-)
+from .unit_conversion import RunSolver, SETTING_TO_PARAMETER
 from .serial_comm import get_arduino_ports
+from .ui_compile import load_ui_class
 
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Milliseconds without edits before the parameter table is recomputed
+PARAMS_DEBOUNCE_MS = 100
+
 def set_units_of_combo(setting_combo, unit_combo):
     chosen = setting_combo.currentText()
     unit_combo.clear()
@@ -58,6 +58,47 @@ def set_child_combo(parent_combo, child_combo):
     logger.info('{} selected, setting child combo index {}'.format(chosen, index))
     child_combo.setCurrentIndex(index)
 
+@lru_cache(maxsize=64)
+def solve_params_table(flow_rate, flow_unit, rows):
+    """
+    Values of rows 3 and 4 of the parameter table, or None for those that
+    can't be computed.
+
+    Parameters
+    ----------
+    flow_rate : float
+        Flow rate, or None if it is not a number.
+    flow_unit : str
+        Unit of the flow rate.
+    rows : tuple
+        (setting, value, unit) of rows 1 to 4. The values of rows 1 and 2 are
+        floats, or None if they are not numbers, and those of rows 3 and 4 are
+        None.
+
+    Returns
+    -------
+    tuple
+        The values of rows 3 and 4.
+    """
+    if flow_rate is None or rows[0][1] is None:
+        return None, None
+    units = {'flow_unit': flow_unit}
+    values = {}
+    for setting, value, unit in rows:
+        parameter, unit_name = SETTING_TO_PARAMETER[setting]
+        if unit_name is not None:
+            units[unit_name] = unit
+        if value is not None:
+            values[parameter] = value
+    try:
+        params = RunSolver(**units).solve(flow_rate, **values)
+    except ValueError:
+        # A unit combo is being refilled.
+        return None, None
+    return tuple(
+        getattr(params, SETTING_TO_PARAMETER[setting][0]) for setting, _, _ in rows[2:]
+    )
+
 class UiThread(QThread):
     success = pyqtSignal()
     error = pyqtSignal()
@@ -90,6 +131,8 @@ class PortSelectionPopup(QDialog):
         self.port_selection.move(10, 10)
         for port in ports:
             self.port_selection.addItem(port.description)
+        # Ports are ordered best first.
+        self.port_selection.setCurrentRow(0)
         self.port_selection.adjustSize()
         description_to_port = {port.description: port.device for port in ports}
 
@@ -119,11 +162,17 @@ class PortSelectionPopup(QDialog):
         ))
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, testing=False):
+    def __init__(self, testing=False, emulator=False, clock=SYSTEM_CLOCK):
         super(MainWindow, self).__init__()
-        uic.loadUi(UI_PATH, self)
+        # Widgets of the .ui file, compiled to Python (see ui_compile)
+        self.ui = load_ui_class()()
+        self.ui.setupUi(self)
 
         self.testing = testing
+        # Offer the firmware emulator as a port
+        self.emulator = emulator
+        # Time source of the run (see clock.VirtualClock)
+        self.clock = clock
         self.colosseum = None
         self.monitor_thread = None
 
@@ -141,7 +190,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def show_port_selection_popup(self):
         # Note that these are port objects.
-        ports = get_arduino_ports(dry_run=self.testing)
+        ports = get_arduino_ports(dry_run=self.testing, emulator=self.emulator)
 
         # If there are no ports, display error message and exit.
         if not ports:
@@ -153,7 +202,7 @@ class MainWindow(QtWidgets.QMainWindow):
         return port_popup
 
     def initialize(self, port):
-        self.colosseum = Colosseum(port, testing=self.testing)
+        self.colosseum = Colosseum(port, testing=self.testing, clock=self.clock)
         self.monitor_thread = threading.Thread(
             target=self.monitor, daemon=True
         )
@@ -163,7 +212,7 @@ class MainWindow(QtWidgets.QMainWindow):
         while True:
             self.tube_number.display(self.colosseum.position)
             if self.colosseum.start_time is not None and not self.colosseum.done:
-                elapsed = time.time() - self.colosseum.start_time
+                elapsed = self.clock.time() - self.colosseum.start_time
                 fr_dict = self.get_flowrate_text()
                 flow_value = float(fr_dict['value']) * FRUNIT_TO_UL_HR[fr_dict['unit']] / 3600
 
@@ -171,6 +220,9 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.time_elapsed_unit.setText(self.time_unit)
                 self.time_elapsed.display((elapsed * 3600) / TIMEUNIT_TO_HR[self.time_unit])
                 self.vol_dispensed.display((elapsed * flow_value) / VOLUNIT_TO_UL[self.volume_unit])
+                eta = self.colosseum.eta
+                if eta is not None:
+                    self.statusbar.showMessage(f'Time remaining: {timedelta(seconds=round(eta))}')
 
             # Do some stuff if the run is finished.
             if self.colosseum.done:
@@ -200,43 +252,45 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         Function to set up hooks from the .ui file into this class.
         """
+        self.statusbar = self.ui.statusbar
+
         # Tube count
-        self.tube_count_label = self.findChild(QtWidgets.QLabel, 'tube_count_label')
-        self.tube_count_line = self.findChild(QtWidgets.QLineEdit, 'tube_count_line')
+        self.tube_count_label = self.ui.tube_count_label
+        self.tube_count_line = self.ui.tube_count_line
 
         # Flowrate
-        self.flowrate_label = self.findChild(QtWidgets.QLabel, 'flowrate_label')
-        self.flowrate_line = self.findChild(QtWidgets.QLineEdit, 'flowrate_line')
-        self.flowunit_combo = self.findChild(QtWidgets.QComboBox, 'flowunit_combo')
-        self.tubeunit_combo = self.findChild(QtWidgets.QComboBox, 'tubeunit_combo')
+        self.flowrate_label = self.ui.flowrate_label
+        self.flowrate_line = self.ui.flowrate_line
+        self.flowunit_combo = self.ui.flowunit_combo
+        self.tubeunit_combo = self.ui.tubeunit_combo
 
         # Settings
-        self.setting1_combo = self.findChild(QtWidgets.QComboBox, 'setting1_combo')
-        self.unit1_combo = self.findChild(QtWidgets.QComboBox, 'unit1_combo')
-        self.setting2_combo = self.findChild(QtWidgets.QComboBox, 'setting2_combo')
-        self.unit2_combo = self.findChild(QtWidgets.QComboBox, 'unit2_combo')
-        self.setting3_combo = self.findChild(QtWidgets.QComboBox, 'setting3_combo')
-        self.unit3_combo = self.findChild(QtWidgets.QComboBox, 'unit3_combo')
-        self.setting4_combo = self.findChild(QtWidgets.QComboBox, 'setting4_combo')
-        self.unit4_combo = self.findChild(QtWidgets.QComboBox, 'unit4_combo')
-        self.value1_line = self.findChild(QtWidgets.QLineEdit, 'value1_line')
-        self.value2_line = self.findChild(QtWidgets.QLineEdit, 'value2_line')
-        self.value3_line = self.findChild(QtWidgets.QLineEdit, 'value3_line')
-        self.value4_line = self.findChild(QtWidgets.QLineEdit, 'value4_line')
+        self.setting1_combo = self.ui.setting1_combo
+        self.unit1_combo = self.ui.unit1_combo
+        self.setting2_combo = self.ui.setting2_combo
+        self.unit2_combo = self.ui.unit2_combo
+        self.setting3_combo = self.ui.setting3_combo
+        self.unit3_combo = self.ui.unit3_combo
+        self.setting4_combo = self.ui.setting4_combo
+        self.unit4_combo = self.ui.unit4_combo
+        self.value1_line = self.ui.value1_line
+        self.value2_line = self.ui.value2_line
+        self.value3_line = self.ui.value3_line
+        self.value4_line = self.ui.value4_line
 
         # Buttons
-        self.run_button = self.findChild(QtWidgets.QPushButton, 'runButton')
-        self.pause_button = self.findChild(QtWidgets.QPushButton, 'pauseButton')
-        self.resume_button = self.findChild(QtWidgets.QPushButton, 'resumeButton')
-        self.stop_button = self.findChild(QtWidgets.QPushButton, 'stopButton')
+        self.run_button = self.ui.runButton
+        self.pause_button = self.ui.pauseButton
+        self.resume_button = self.ui.resumeButton
+        self.stop_button = self.ui.stopButton
 
         # Status
-        self.status_label = self.findChild(QtWidgets.QLabel, 'status_label')
-        self.vol_dispensed = self.findChild(QtWidgets.QLCDNumber, 'voldispensed_disp')
-        self.tube_number = self.findChild(QtWidgets.QLCDNumber, 'tubeIteration_disp')
-        self.time_elapsed = self.findChild(QtWidgets.QLCDNumber, 'timeElapsed_disp')
-        self.vol_dispensed_unit = self.findChild(QtWidgets.QLabel, 'voldispensed_unit')
-        self.time_elapsed_unit = self.findChild(QtWidgets.QLabel, 'timeElapsed_unit')
+        self.status_label = self.ui.status_label
+        self.vol_dispensed = self.ui.voldispensed_disp
+        self.tube_number = self.ui.tubeIteration_disp
+        self.time_elapsed = self.ui.timeElapsed_disp
+        self.vol_dispensed_unit = self.ui.voldispensed_unit
+        self.time_elapsed_unit = self.ui.timeElapsed_unit
 
     def setup_validators(self):
         int_validator = QIntValidator()
@@ -264,20 +318,26 @@ class MainWindow(QtWidgets.QMainWindow):
         for row in list(self.rows.values()):
             self.setup_setting_to_units_listener(row['setting'], row['unit'])
 
-        self.flowrate_line.textChanged.connect(self.update_row3)
-        self.flowrate_line.textChanged.connect(self.update_row4)
-        self.flowunit_combo.currentIndexChanged.connect(self.update_row3)
-        self.flowunit_combo.currentIndexChanged.connect(self.update_row4)
-        self.value1_line.textChanged.connect(self.update_row3)
-        self.unit1_combo.currentIndexChanged.connect(self.update_row3)
-        self.value1_line.textChanged.connect(self.update_row4)
-        self.unit1_combo.currentIndexChanged.connect(self.update_row4)
-        self.value2_line.textChanged.connect(self.update_row4)
-        self.unit2_combo.currentIndexChanged.connect(self.update_row4)
-        self.unit3_combo.currentIndexChanged.connect(self.update_row3)
-        self.unit4_combo.currentIndexChanged.connect(self.update_row3)
-        self.unit3_combo.currentIndexChanged.connect(self.update_row4)
-        self.unit4_combo.currentIndexChanged.connect(self.update_row4)
+        # Every edit restarts the timer, so a burst of edits (e.g. a unit combo
+        # being refilled) recomputes the table once.
+        self.params_timer = QtCore.QTimer(self)
+        self.params_timer.setSingleShot(True)
+        self.params_timer.setInterval(PARAMS_DEBOUNCE_MS)
+        self.params_timer.timeout.connect(self.update_params)
+        # Edits and recomputes so far, to check that edits are coalesced
+        self.params_edits = 0
+        self.params_recomputes = 0
+        for signal in (
+            self.flowrate_line.textChanged,
+            self.flowunit_combo.currentIndexChanged,
+            self.value1_line.textChanged,
+            self.unit1_combo.currentIndexChanged,
+            self.value2_line.textChanged,
+            self.unit2_combo.currentIndexChanged,
+            self.unit3_combo.currentIndexChanged,
+            self.unit4_combo.currentIndexChanged,
+        ):
+            signal.connect(self.params_edited)
 
         # Disable setting dropdown if there is a value present
         def disable(target, text, *args, **kwargs):
@@ -307,56 +367,39 @@ class MainWindow(QtWidgets.QMainWindow):
         for input in inputs:
             input.setEnabled(False)
 
-    def update_row3(self, *args, **kwargs):
-        logger.info('updating row 3')
-        flowrate = self.get_flowrate_text()
-        row1 = self.get_row_contents_text(self.rows[1])
-        #row2 = self.get_row_contents_text(self.rows[2])
-
-        # Check if flowrate and row1 values are valid.
-        if not (is_float(flowrate['value']) and is_float(row1['value'])):
-            self.rows[3]['value'].setText('')
-            return
-
-        # Otherwise, calculate value from flowrate and row1 values
-        row3 = self.get_row_contents_text(self.rows[3])
-        # Need to check what row 1 value is
-        if row1['setting'] == 'Total time':
-            row3value = vol_from_time(flowrate, row1, row3)
-        else:
-            row3value = time_from_vol(flowrate, row1, row3)
+    def params_edited(self, *args, **kwargs):
+        self.params_edits += 1
+        self.params_timer.start()
 
-        self.rows[3]['value'].setText(str(row3value))
-
-    def update_row4(self, *args, **kwargs):
-        logger.info('updating row 4')
+    def params_snapshot(self):
+        """
+        Inputs of the parameter table, as the arguments of solve_params_table.
+        """
         flowrate = self.get_flowrate_text()
-        row1 = self.get_row_contents_text(self.rows[1])
-        row2 = self.get_row_contents_text(self.rows[2])
-        row3 = self.get_row_contents_text(self.rows[3])
-
-        # Check if flowrate and row1 values are valid.
-        if not (is_float(flowrate['value']) and is_float(row1['value']) and is_float(row2['value'])):
-            self.rows[4]['value'].setText('')
-            return
-
-        # Otherwise, calculate value from flowrate and row1 values
-        # self.rows[4]['value'].setText(str(row2['value']))
-
-        # Need to check what row 2 value is
-        if row2['setting'] == 'Volume per fraction':
-            if row1['setting'] == 'Total volume':
-                row4value = get_numfrac(flowrate, row2, row1)
-            else: #row3 is volume
-                row4value = get_numfrac(flowrate, row2, row3)
-        else:
-            fsunit = self.unit4_combo.currentText()
-            if row1['setting'] == 'Total volume':#row1 is volume
-                row4value = get_fracsize(flowrate, row2, row1, fsunit)
-            else:
-                row4value = get_fracsize(flowrate, row2, row3, fsunit)
-
-        self.rows[4]['value'].setText(str(row4value))
+        flow_rate = float(flowrate['value']) if is_float(flowrate['value']) else None
+        rows = []
+        for i, row_dict in self.rows.items():
+            row = self.get_row_contents_text(row_dict)
+            value = float(row['value']) if i <= 2 and is_float(row['value']) else None
+            rows.append((row['setting'], value, row['unit']))
+        return flow_rate, flowrate['unit'], tuple(rows)
+
+    def update_params(self):
+        """
+        Recompute rows 3 and 4 of the parameter table, and update those whose
+        value changed.
+        """
+        self.params_timer.stop()
+        self.params_recomputes += 1
+        values = solve_params_table(*self.params_snapshot())
+        for i, value in zip((3, 4), values):
+            text = '' if value is None else str(value)
+            if self.rows[i]['value'].text() != text:
+                self.rows[i]['value'].setText(text)
+        logger.debug(
+            f'parameter table recomputed {self.params_recomputes} times for '
+            f'{self.params_edits} edits ({solve_params_table.cache_info()})'
+        )
 
     def get_flowrate_text(self):
         return {
@@ -391,6 +434,9 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def run_pressed(self):
         logging.info('run button pressed')
+        # Apply edits that are still being debounced.
+        if self.params_timer.isActive():
+            self.update_params()
         tube_count = self.tube_count_line.text()
         input1 = self.value1_line.text()
         input2 = self.value2_line.text()
@@ -444,9 +490,12 @@ class MainWindow(QtWidgets.QMainWindow):
             if result != QMessageBox.Cancel:
                 return
         n_fractions = int(n_fractions)
-        if n_fractions > len(ANGLES) or n_fractions < 1:
+        # The run changes tubes n_fractions + 1 times, once per step of
+        # angles.txt.
+        max_fractions = len(ANGLES) - 1
+        if n_fractions > max_fractions or n_fractions < 1:
             self.show_error_popup(
-                f'Number of fractions ({n_fractions}) is not within the allowed range [1, {len(ANGLES)}].',
+                f'Number of fractions ({n_fractions}) is not within the allowed range [1, {max_fractions}].',
                 title='Input error'
             )
             return
@@ -0,0 +1,79 @@
+"""Compiled Qt Designer UI.
+
+Parsing fractioncollector.ui with uic.loadUi on every launch is slow on small
+machines, so the .ui file is compiled to a Python module (as pyuic5 does)
+when the package is built, or on the first launch otherwise. The module
+starts with the SHA-256 of the .ui file it was compiled from, and is compiled
+again whenever the .ui file changes:
+
+    python -m colosseum_ui.ui_compile
+"""
+import hashlib
+import importlib
+import io
+import logging
+import os
+
+from .constants import BASE_DIR, UI_PATH
+
+logger = logging.getLogger(__name__)
+
+UI_MODULE = 'ui_fractioncollector'
+UI_MODULE_PATH = os.path.join(BASE_DIR, f'{UI_MODULE}.py')
+# Class generated for the <class> of the .ui file
+UI_CLASS = 'Ui_colosseum'
+HASH_PREFIX = '# ui-sha256: '
+
+def ui_hash(ui_path=UI_PATH):
+    """SHA-256 (hex) of a .ui file."""
+    with open(ui_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def is_current(ui_path=UI_PATH, module_path=UI_MODULE_PATH):
+    """Whether 'module_path' was compiled from the current 'ui_path'."""
+    try:
+        with open(module_path, 'r', encoding='utf-8') as f:
+            first = f.readline()
+    except OSError:
+        return False
+    return first.strip() == HASH_PREFIX + ui_hash(ui_path)
+
+def compile_ui(ui_path=UI_PATH, module_path=UI_MODULE_PATH):
+    """Compile a .ui file to a Python module, tagged with the hash of the .ui
+    file. Requires PyQt5.
+
+    Raises
+    ------
+    OSError
+        If the module can't be written.
+    """
+    from PyQt5 import uic
+    code = io.StringIO()
+    with open(ui_path, 'r', encoding='utf-8') as f:
+        uic.compileUi(f, code)
+    tmp = module_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(HASH_PREFIX + ui_hash(ui_path) + '\n')
+        f.write(code.getvalue())
+    os.replace(tmp, module_path)
+    logger.debug(f'compiled {ui_path} to {module_path}')
+
+def load_ui_class():
+    """The generated UI class, whose setupUi(window) builds the widgets as
+    attributes of the instance. The module is compiled first if it is missing
+    or out of date, and if it can't be written (e.g. a read-only install), the
+    .ui file is compiled in memory instead."""
+    if not is_current():
+        try:
+            compile_ui()
+        except OSError as e:
+            logger.warning(f'could not write {UI_MODULE_PATH}, compiling in memory: {e}')
+            from PyQt5 import uic
+            return uic.loadUiType(UI_PATH)[0]
+        importlib.invalidate_caches()
+    module = importlib.import_module(f'{__package__}.{UI_MODULE}')
+    return getattr(module, UI_CLASS)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.DEBUG)
+    compile_ui()
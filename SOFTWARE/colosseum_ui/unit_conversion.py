@@ -1,61 +1,168 @@
-# Need to import constants table
+"""Run parameters of the parameter table.
+
+A run is described by its total time, total volume, volume per fraction and
+number of fractions, which are linked by the flow rate:
+
+    total volume = flow rate * total time
+    total volume = volume per fraction * number of fractions
+
+RunSolver computes the other parameters from any two independent ones. The
+unit factors are looked up once, when the solver is made, and the values can
+be numbers or NumPy arrays, so a sweep over many runs is a single call:
+
+    solver = RunSolver(flow_unit='mL/min', time_unit='min', volume_unit='mL')
+    solver.solve(1.0, total_time=60, n_fractions=np.arange(1, 88))
+"""
+import math
+import numbers
+from collections import namedtuple
+
+import numpy as np
+
 from .constants import FRUNIT_TO_UL_HR, TIMEUNIT_TO_HR, VOLUNIT_TO_UL, FRACSIZE_TO_UL
-# from utils import is_float, make_row_dict
-
-# calculating volume if the user inputs time
-def vol_from_time(flowrate, row1, row3):
-    frunit = flowrate['unit']
-    fr = float(flowrate['value'])
-    fr *= FRUNIT_TO_UL_HR[frunit]
-    time = float(row1['value'])
-    timeunit = row1['unit']
-    time /= TIMEUNIT_TO_HR[timeunit]
-    vol = time * fr
-    volunit = row3['unit']
-    vol /= VOLUNIT_TO_UL[volunit]
-    return vol
-
-# calcuating time if the user inputs volume
-def time_from_vol(flowrate, row1, row3):
-    frunit = flowrate['unit']
-    fr = float(flowrate['value'])
-    fr *= FRUNIT_TO_UL_HR[frunit]
-    vol = float(row1['value'])
-    volunit = row1['unit']
-    vol *= VOLUNIT_TO_UL[volunit]
-    time = vol / fr
-    timeunit = row3['unit']
-    time *= TIMEUNIT_TO_HR[timeunit]
-    return time
-
-# calculating number of fractions from volume per fraction
-def get_numfrac(flowrate, row2, volrow):
-    # get volume unit
-    # convert into uL
-    vol = float(volrow['value'])
-    volunit = volrow['unit']
-    vol *= VOLUNIT_TO_UL[volunit]
-    # get frac size unit
-    # convert into uL
-    fracsize = float(row2['value'])
-    fsunit = row2['unit']
-    fracsize *= FRACSIZE_TO_UL[fsunit]
-
-    numfrac = vol / fracsize
-    return numfrac
-
-# calculating volume per fraction from number of fractions
-def get_fracsize(flowrate, row2, volrow, fsunit):
-    # get volume unit
-    # convert into uL
-    vol = float(volrow['value'])
-    volunit = volrow['unit']
-    vol *= VOLUNIT_TO_UL[volunit]
-    numfrac = float(row2['value'])
-    fracsize = vol / numfrac
-    # get frac size unit
-    # multiply scalar
-    #fsunit = row4['unit']
-    fracsize /= FRACSIZE_TO_UL[fsunit]
-
-    return fracsize
+
+RunParameters = namedtuple(
+    'RunParameters', ['total_time', 'total_volume', 'fraction_volume', 'n_fractions']
+)
+
+# Keyword of RunSolver.solve, and of its unit in RunSolver, of every setting
+# of the parameter table
+SETTING_TO_PARAMETER = {
+    'Total time': ('total_time', 'time_unit'),
+    'Total volume': ('total_volume', 'volume_unit'),
+    'Volume per fraction': ('fraction_volume', 'fraction_unit'),
+    'Number of fractions': ('n_fractions', None),
+}
+
+def _value(x):
+    if isinstance(x, numbers.Real):
+        return float(x)
+    return np.asarray(x, dtype=float)
+
+def _divide(a, b):
+    # Division that gives inf (nan for 0 / 0) instead of raising, for numbers
+    # like for arrays.
+    if isinstance(a, float) and isinstance(b, float):
+        if b == 0:
+            return math.nan if a == 0 or math.isnan(a) else math.copysign(math.inf, a)
+        return a / b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.divide(a, b)
+
+def _number(x):
+    # 0-d arrays from numpy functions back to numbers
+    return float(x) if np.ndim(x) == 0 else x
+
+class RunSolver:
+    """Solver of the run parameters, in fixed units.
+
+    Parameters
+    ----------
+    flow_unit : str (optional)
+        Unit of the flow rate, a key of FRUNIT_TO_UL_HR. The default is
+        'uL/sec'.
+    time_unit : str (optional)
+        Unit of the total time, a key of TIMEUNIT_TO_HR. The default is 'sec'.
+    volume_unit : str (optional)
+        Unit of the total volume, a key of VOLUNIT_TO_UL. The default is 'uL'.
+    fraction_unit : str (optional)
+        Unit of the volume per fraction, a key of FRACSIZE_TO_UL. The default
+        is 'uL'.
+    profile : flow.FlowProfile (optional)
+        If given, the flow rate follows the profile, and the flow rate passed
+        to solve is ignored.
+
+    Raises
+    ------
+    ValueError
+        If a unit is unknown.
+    """
+
+    def __init__(
+        self, flow_unit='uL/sec', time_unit='sec', volume_unit='uL',
+        fraction_unit='uL', profile=None,
+    ):
+        try:
+            # uL/hr, units per hr, uL and uL per unit, in the same order of
+            # operations as the table always used, so round values stay round
+            self.flow_factor = FRUNIT_TO_UL_HR[flow_unit]
+            self.time_factor = TIMEUNIT_TO_HR[time_unit]
+            self.volume_factor = VOLUNIT_TO_UL[volume_unit]
+            self.fraction_factor = FRACSIZE_TO_UL[fraction_unit]
+        except KeyError as e:
+            raise ValueError(f'unknown unit {e.args[0]!r}') from None
+        self.profile = profile
+
+    def _volume(self, flow_rate, time):
+        if self.profile is not None:
+            return _number(self.profile.volume(time * 3600))
+        return flow_rate * self.flow_factor * time
+
+    def _time(self, flow_rate, volume):
+        if self.profile is not None:
+            return _number(self.profile.time_at_volume(volume)) / 3600
+        return _divide(volume, flow_rate * self.flow_factor)
+
+    def solve(
+        self, flow_rate, total_time=None, total_volume=None, fraction_volume=None,
+        n_fractions=None,
+    ):
+        """Compute the run parameters from the given ones.
+
+        Every value is a number or an array, and arrays broadcast against each
+        other. Parameters that the given ones do not determine are None, and
+        divisions by zero give inf (or nan for 0 / 0).
+
+        Parameters
+        ----------
+        flow_rate : float or array_like
+            Flow rate, in the solver's flow unit.
+        total_time, total_volume, fraction_volume, n_fractions : float or array_like (optional)
+            At most two given parameters, in the solver's units, other than
+            both the total time and the total volume.
+
+        Returns
+        -------
+        RunParameters
+            All four parameters, in the solver's units.
+
+        Raises
+        ------
+        ValueError
+            If the given parameters over-determine the run.
+        """
+        given = [
+            name for name, value in zip(
+                RunParameters._fields,
+                (total_time, total_volume, fraction_volume, n_fractions),
+            )
+            if value is not None
+        ]
+        if len(given) > 2 or (total_time is not None and total_volume is not None):
+            raise ValueError(f'{" and ".join(given)} over-determine the run')
+
+        # Solve in hr and uL.
+        flow = None if flow_rate is None else _value(flow_rate)
+        t = None if total_time is None else _value(total_time) / self.time_factor
+        v = None if total_volume is None else _value(total_volume) * self.volume_factor
+        f = None if fraction_volume is None else _value(fraction_volume) * self.fraction_factor
+        n = None if n_fractions is None else _value(n_fractions)
+
+        if v is None and t is not None:
+            v = self._volume(flow, t)
+        if v is None and f is not None and n is not None:
+            v = f * n
+        if v is not None:
+            if t is None:
+                t = self._time(flow, v)
+            if f is None and n is not None:
+                f = _divide(v, n)
+            if n is None and f is not None:
+                n = _divide(v, f)
+
+        return RunParameters(
+            None if t is None else t * self.time_factor,
+            None if v is None else v / self.volume_factor,
+            None if f is None else f / self.fraction_factor,
+            n,
+        )
@@ -1,3 +1,7 @@
+import math
+
+from .command import ALL_MOTORS, Command, Mode
+
 def is_int(s):
     try:
         int(s)
@@ -30,8 +34,28 @@ def read_angles(path):
             if not angle.startswith('#') and not angle.isspace()
         ]
 
-def make_commands(angles):
-    return [f"<RUN,111,{angle},{angle},{angle}>" for angle in angles]
+def make_commands(angles, motors=ALL_MOTORS):
+    return tuple(Command(Mode.RUN, motors, (angle, angle, angle)) for angle in angles)
+
+def make_targets(positions, motors=ALL_MOTORS):
+    """MOVE_TO commands to absolute positions (steps), one per position."""
+    return tuple(
+        Command(Mode.MOVE_TO, motors, (position, position, position))
+        for position in positions
+    )
+
+def move_time(steps, speed, accel):
+    """Seconds a stepper takes to move 'steps' from standstill to
+    standstill, like AccelStepper: it accelerates at 'accel' up to 'speed',
+    cruises, and decelerates to stop on its target."""
+    d = abs(steps)
+    if d == 0:
+        return 0.0
+    if speed <= 0 or accel <= 0:
+        return math.inf
+    if d >= speed * speed / accel:
+        return d / speed + speed / accel
+    return 2 * math.sqrt(d / accel)
 
 def dummy_function(*args, **kwargs):
     return
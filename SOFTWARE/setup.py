@@ -1,4 +1,7 @@
+import os
+
 from setuptools import find_packages, setup
+from setuptools.command.build_py import build_py
 
 
 def read(path):
@@ -6,6 +9,21 @@ def read(path):
         return f.read()
 
 
+class BuildPyWithUi(build_py):
+    """Also compile the Qt Designer file to a Python module (see
+    colosseum_ui/ui_compile.py), so the UI does not parse it on launch."""
+
+    def run(self):
+        super().run()
+        try:
+            from colosseum_ui.ui_compile import UI_MODULE, compile_ui
+            module_path = os.path.join(self.build_lib, 'colosseum_ui', f'{UI_MODULE}.py')
+            compile_ui(module_path=module_path)
+        except ImportError:
+            # Without PyQt5, the module is compiled on the first launch.
+            self.warn('PyQt5 not found, not compiling the .ui file')
+
+
 setup(
     name='colosseum_ui',
     version='0.0.6',
@@ -18,14 +36,18 @@ setup(
     long_description='https://github.com/sbooeshaghi/colosseum',
     long_description_content_type='text/markdown',
     keywords='',
-    python_requires='>=3.6',
+    python_requires='>=3.7',
     license='BSD',
     packages=find_packages(),
     zip_safe=False,
     include_package_data=True,
+    cmdclass={'build_py': BuildPyWithUi},
     install_requires=read('requirements.txt').strip().split('\n'),
     entry_points={
-        'console_scripts': ['colosseum=colosseum_ui.run:run'],
+        'console_scripts': [
+            'colosseum=colosseum_ui.run:run',
+            'colosseum-cli=colosseum_ui.cli:main',
+        ],
     },
     classifiers=[
         'Development Status :: 4 - Beta',
@@ -33,7 +55,6 @@ setup(
         'Intended Audience :: Science/Research',
         'License :: OSI Approved :: BSD License',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Topic :: Scientific/Engineering',
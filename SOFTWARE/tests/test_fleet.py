@@ -0,0 +1,49 @@
+"""Assignment of the fractions of an experiment to collectors.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+from colosseum_ui.fleet import PARTITIONS, partition
+
+@pytest.mark.parametrize('n_fractions, k, method, owners, indices', [
+    (1, 1, 'round-robin', [0], [0]),
+    (5, 1, 'round-robin', [0, 0, 0, 0, 0], [0, 1, 2, 3, 4]),
+    (6, 3, 'round-robin', [0, 1, 2, 0, 1, 2], [0, 0, 0, 1, 1, 1]),
+    (7, 3, 'round-robin', [0, 1, 2, 0, 1, 2, 0], [0, 0, 0, 1, 1, 1, 2]),
+    (3, 3, 'round-robin', [0, 1, 2], [0, 0, 0]),
+    (1, 1, 'contiguous', [0], [0]),
+    (5, 1, 'contiguous', [0, 0, 0, 0, 0], [0, 1, 2, 3, 4]),
+    (6, 3, 'contiguous', [0, 0, 1, 1, 2, 2], [0, 1, 0, 1, 0, 1]),
+    (7, 3, 'contiguous', [0, 0, 0, 1, 1, 2, 2], [0, 1, 2, 0, 1, 0, 1]),
+    (10, 4, 'contiguous', [0, 0, 0, 1, 1, 1, 2, 2, 3, 3], [0, 1, 2, 0, 1, 2, 0, 1, 0, 1]),
+    (3, 3, 'contiguous', [0, 1, 2], [0, 0, 0]),
+])
+def test_partition(n_fractions, k, method, owners, indices):
+    got_owners, got_indices = partition(n_fractions, k, method)
+    assert got_owners.tolist() == owners
+    assert got_indices.tolist() == indices
+
+@pytest.mark.parametrize('method', PARTITIONS)
+@pytest.mark.parametrize('n_fractions, k', [(87, 1), (87, 2), (174, 2), (171, 4), (261, 3)])
+def test_partition_balanced(method, n_fractions, k):
+    owners, indices = partition(n_fractions, k, method)
+    sizes = np.bincount(owners, minlength=k)
+    # Every collector gets fractions, at most one more than any other, and
+    # numbers them from 0.
+    assert sizes.min() >= 1
+    assert sizes.max() - sizes.min() <= 1
+    for collector in range(k):
+        assert sorted(indices[owners == collector]) == list(range(sizes[collector]))
+
+@pytest.mark.parametrize('n_fractions, k, method, match', [
+    (2, 3, 'round-robin', "can't be split across 3 collectors"),
+    (0, 1, 'contiguous', "can't be split across 1 collectors"),
+    (10, 2, 'random', 'unknown partition'),
+])
+def test_partition_invalid(n_fractions, k, method, match):
+    with pytest.raises(ValueError, match=match):
+        partition(n_fractions, k, method)
@@ -0,0 +1,108 @@
+"""Volume and tube-change times of flow-rate profiles.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+
+from colosseum_ui.flow import FlowProfile
+
+PROFILES = {
+    'constant': FlowProfile.constant(2.0),
+    # Ramp up, hold (a slope-0 segment), ramp down
+    'linear': FlowProfile([0, 100, 200, 300], [1, 5, 5, 2]),
+    'linear late start': FlowProfile([50, 150], [3, 1]),
+    'step': FlowProfile([0, 100, 200, 300], [1, 5, 5, 2], step=True),
+    'step with stop': FlowProfile([0, 100, 200], [4, 0, 2], step=True),
+}
+
+# Times before, at and between the profile points, and after the last one
+TIMES = np.array([0, 1, 50, 99.5, 100, 100.5, 150, 200, 250, 300, 301, 1000], dtype=float)
+
+@pytest.mark.parametrize('name', PROFILES)
+def test_volume_round_trip(name):
+    profile = PROFILES[name]
+    volumes = profile.volume(TIMES)
+    assert volumes[0] == 0
+    assert np.all(np.diff(volumes) >= 0)
+    # Every volume is first reached at the time it was delivered, except
+    # while the flow is stopped, during which the volume does not change.
+    assert profile.volume(profile.time_at_volume(volumes)) == pytest.approx(volumes)
+    flowing = profile.rate(TIMES) > 0
+    assert profile.time_at_volume(volumes[flowing]) == pytest.approx(TIMES[flowing])
+
+@pytest.mark.parametrize('name', PROFILES)
+def test_scalar_round_trip(name):
+    profile = PROFILES[name]
+    for t in (0.0, 42.0, 123.0):
+        volume = profile.volume(t)
+        assert np.ndim(volume) == 0
+        assert profile.volume(profile.time_at_volume(volume)) == pytest.approx(volume)
+
+def test_linear_volume():
+    profile = PROFILES['linear']
+    # Trapezoids: 300 uL up to 100 s, 500 uL held, 350 uL down to 300 s
+    assert profile.volume([100, 200, 300]) == pytest.approx([300, 800, 1150])
+    assert profile.volume(400) == pytest.approx(1150 + 2 * 100)
+    assert profile.volume(50) == pytest.approx(50 * (1 + 3) / 2)
+
+def test_step_volume():
+    profile = PROFILES['step']
+    assert profile.volume([100, 200, 300]) == pytest.approx([100, 600, 1100])
+    assert profile.volume(150) == pytest.approx(100 + 5 * 50)
+    assert profile.rate([0, 99.9, 100, 250]) == pytest.approx([1, 1, 5, 5])
+
+def test_first_rate_applies_before_first_point():
+    profile = PROFILES['linear late start']
+    assert profile.rate([0, 25, 50]) == pytest.approx([3, 3, 3])
+    assert profile.volume(50) == pytest.approx(150)
+
+def test_stopped_flow():
+    profile = PROFILES['step with stop']
+    # No volume is delivered while the flow is stopped, and the volume at
+    # which it stopped is reached when it stops.
+    assert profile.volume([100, 150, 200]) == pytest.approx([400, 400, 400])
+    assert profile.time_at_volume(401) == pytest.approx(200.5)
+    assert profile.volume(profile.time_at_volume(400)) == pytest.approx(400)
+
+def test_unreachable_volume():
+    profile = FlowProfile([0, 100], [2, 0])
+    assert profile.volume(1000) == pytest.approx(100)
+    assert profile.time_at_volume(101) == np.inf
+    with pytest.raises(ValueError, match='never delivers'):
+        profile.schedule(10, 'uL', 11)
+
+@pytest.mark.parametrize('name', PROFILES)
+@pytest.mark.parametrize('n_fractions', [1, 7, 87])
+def test_change_times_equal_volumes(name, n_fractions):
+    profile = PROFILES[name]
+    changes = profile.change_times(10, 'uL', n_fractions)
+    assert len(changes) == n_fractions
+    assert np.all(np.diff(changes) > 0)
+    volumes = np.diff(profile.volume(changes), prepend=0.0)
+    assert volumes == pytest.approx(np.full(n_fractions, 10.0))
+
+def test_change_times_units():
+    profile = FlowProfile.constant(60, 'uL/min')
+    assert profile.change_times(0.01, 'mL', 3) == pytest.approx([10, 20, 30])
+
+def test_schedule():
+    profile = PROFILES['linear']
+    schedule = profile.schedule(20, 'uL', 30)
+    changes = profile.change_times(20, 'uL', 30)
+    assert schedule.dwell == pytest.approx(np.diff(changes, prepend=0.0))
+    assert schedule.offsets() == pytest.approx(changes)
+
+@pytest.mark.parametrize('times, rates', [
+    ([], []),
+    ([0, 1], [1]),
+    ([0, 0], [1, 1]),
+    ([1, 0], [1, 1]),
+    ([0, 1], [1, -1]),
+    ([0, np.inf], [1, 1]),
+])
+def test_invalid_points(times, rates):
+    with pytest.raises(ValueError):
+        FlowProfile(times, rates)
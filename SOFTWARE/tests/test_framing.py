@@ -0,0 +1,181 @@
+"""ASCII and binary (COBS + CRC16) framing, against the firmware emulator.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m pytest tests
+"""
+import os
+import time
+
+import pytest
+
+from colosseum_ui.command import Command, Mode
+from colosseum_ui.emulator import FirmwareEmulator
+from colosseum_ui.serial_comm import (
+    CAP_BINARY,
+    CRC,
+    PACKET,
+    PACKET_DELIMITER,
+    cobs_decode,
+    cobs_encode,
+    connect,
+    decode_packet,
+    encode_packet,
+    get_protocol,
+    get_reader,
+    negotiate,
+    set_framing,
+    wait_until_ready,
+    write_to_serial,
+)
+
+# Zero arguments and motor masks put zero bytes in the packet payload.
+COMMANDS = [
+    Command(Mode.RUN, 0b111, (84.0, 84.0, 84.0)),
+    Command(Mode.RUN, 0b100, (0.0, 0.0, 0.0)),
+    Command(Mode.SET_SPEED, 0b010, (1000.0, -2.5, 0.0)),
+    Command(Mode.MOVE_TO, 0b001, (0.0, 0.0, 237.0)),
+]
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'\x00',
+    b'\x00\x00',
+    b'a\x00b\x00',
+    bytes(range(254)),
+])
+def test_cobs_round_trip(data):
+    encoded = cobs_encode(data)
+    assert PACKET_DELIMITER not in encoded
+    assert len(encoded) == len(data) + 1
+    assert cobs_decode(encoded) == data
+
+@pytest.mark.parametrize('data', [b'\x00\x01', b'\x05ab'])
+def test_cobs_decode_invalid(data):
+    with pytest.raises(ValueError):
+        cobs_decode(data)
+
+@pytest.mark.parametrize('command', COMMANDS)
+def test_packet_round_trip(command):
+    packet = encode_packet(command, seq=0)
+    assert packet.endswith(PACKET_DELIMITER)
+    assert PACKET_DELIMITER not in packet[:-1]
+    assert decode_packet(packet[:-1]) == (command, 0)
+
+def test_packet_crc_mismatch():
+    data = bytearray(cobs_decode(encode_packet(COMMANDS[0], seq=7)[:-1]))
+    data[PACKET.size] ^= 0xFF
+    with pytest.raises(ValueError, match='CRC'):
+        decode_packet(cobs_encode(bytes(data)))
+
+def test_packet_payload_corrupted():
+    data = bytearray(cobs_decode(encode_packet(COMMANDS[0], seq=7)[:-1]))
+    data[3] ^= 0x01
+    with pytest.raises(ValueError, match='CRC'):
+        decode_packet(cobs_encode(bytes(data)))
+
+@pytest.mark.parametrize('size', [PACKET.size, PACKET.size + CRC.size + 1])
+def test_packet_wrong_length(size):
+    data = cobs_decode(encode_packet(COMMANDS[0])[:-1])
+    data = (data + bytes(CRC.size + 1))[:size]
+    with pytest.raises(ValueError, match='byte packet'):
+        decode_packet(cobs_encode(data))
+
+def _connect(binary):
+    s = connect('emulator://')
+    wait_until_ready(s, timeout=1)
+    negotiate(s, binary=binary, timeout=1)
+    return s
+
+def _echo(s, command):
+    # Send a command in the negotiated framing and decode its reply.
+    protocol = get_protocol(s)
+    seq = protocol.next_seq()
+    write_to_serial(s, protocol.encode(command, seq))
+    return protocol.decode(get_reader(s).read_frame(s, timeout=1))
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_emulator_echoes(binary):
+    s = _connect(binary)
+    try:
+        protocol = get_protocol(s)
+        assert protocol.capabilities & CAP_BINARY
+        assert protocol.binary == binary
+        assert get_reader(s).binary == binary
+        for command in COMMANDS:
+            echo, seq = _echo(s, command)
+            assert seq == protocol.seq
+            assert echo == command
+        assert s.emulator.executed[-len(COMMANDS):] == COMMANDS
+    finally:
+        s.close()
+
+def test_emulator_drops_corrupted_packets():
+    s = _connect(binary=True)
+    try:
+        executed = len(s.emulator.executed)
+        data = bytearray(cobs_decode(encode_packet(COMMANDS[0], seq=1)[:-1]))
+        data[PACKET.size] ^= 0xFF
+        write_to_serial(s, cobs_encode(bytes(data)) + PACKET_DELIMITER)
+
+        # Only the valid packet that follows is echoed and executed.
+        echo, _ = _echo(s, COMMANDS[1])
+        assert echo == COMMANDS[1]
+        assert s.emulator.executed[executed:] == [COMMANDS[1]]
+    finally:
+        s.close()
+
+def test_emulator_framing_reply_has_no_line_ending():
+    emulator = FirmwareEmulator()
+    reply = emulator.receive(b'<FRAMING,000,1,0,0>')
+    assert reply.endswith(b'>')
+    assert emulator.binary
+    # The first packet after the switch starts at the beginning of the buffer.
+    command = COMMANDS[0]
+    assert decode_packet(emulator.receive(encode_packet(command, seq=1))[:-1]) == (command, 1)
+
+def test_first_packet_after_framing_switch():
+    s = _connect(binary=False)
+    try:
+        set_framing(s, binary=True, timeout=1)
+        # Nothing of the ASCII reply is left to be read as binary.
+        assert not get_reader(s).buffer
+        assert not s.in_waiting
+        echo, _ = _echo(s, COMMANDS[0])
+        assert echo == COMMANDS[0]
+    finally:
+        s.close()
+
+@pytest.mark.skipif(not hasattr(os, 'openpty'), reason='needs a pseudo-terminal')
+def test_pty_banner_on_open():
+    emulator = FirmwareEmulator()
+    port = emulator.open_pty()
+    try:
+        # Every time the port is opened, the emulator reboots and its banner
+        # survives pyserial's flush of the input.
+        for _ in range(5):
+            s = connect(port)
+            try:
+                assert wait_until_ready(s, timeout=1) < 1
+                assert not emulator.executed
+                negotiate(s, timeout=1)
+                assert emulator.executed
+            finally:
+                s.close()
+            # Give the emulator time to see the port closed.
+            time.sleep(0.05)
+    finally:
+        emulator.close_pty()
+
+def test_read_frame_timeout_shorter_than_port_timeout():
+    s = _connect(binary=False)
+    try:
+        assert s.timeout == 1
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            get_reader(s).read_frame(s, timeout=0.05)
+        assert time.monotonic() - start < 0.5
+        # The port timeout is restored.
+        assert s.timeout == 1
+    finally:
+        s.close()
@@ -0,0 +1,92 @@
+"""Recovering a run from a journal cut short by a crash.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m pytest tests
+"""
+import json
+
+import numpy as np
+import pytest
+
+from colosseum_ui.clock import VirtualClock
+from colosseum_ui.colosseum import Colosseum
+from colosseum_ui.command import Mode
+from colosseum_ui.journal import Journal, read_journal, replay
+from colosseum_ui.schedule import Schedule
+
+INTERVAL = 10.0
+N_FRACTIONS = 8
+
+def _run(path):
+    clock = VirtualClock(start=1000.0)
+    colosseum = Colosseum('emulator://', clock=clock, journal=Journal(path, clock=clock))
+    colosseum.run(schedule=Schedule.constant(INTERVAL, N_FRACTIONS))
+    assert colosseum.done
+    return colosseum.schedule
+
+def _truncate(path, position):
+    # Keep the journal up to the tube change to 'position', and half of the
+    # line after it, as if the run crashed while writing that line.
+    with open(path, encoding='utf-8') as f:
+        lines = f.readlines()
+    events = [json.loads(line) for line in lines]
+    i = next(
+        i for i, event in enumerate(events)
+        if event['event'] == 'advance' and event['position'] == position
+    )
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines[:i + 1])
+        f.write(lines[i + 1][:len(lines[i + 1]) // 2])
+    return events[i]
+
+def _move_tos(emulator):
+    return [command for command in emulator.executed if command.mode == Mode.MOVE_TO]
+
+@pytest.mark.parametrize('position', [1, 3, N_FRACTIONS - 1])
+def test_recover_truncated_journal(tmp_path, position):
+    path = str(tmp_path / 'run.jsonl')
+    schedule = _run(path)
+    advance = _truncate(path, position)
+
+    state = replay(path)
+    assert state['position'] == position
+    assert state['state'] == 'advance'
+
+    # Recover 3 s after the last tube change that made it to the journal.
+    collected = 3.0
+    clock = VirtualClock(start=advance['wall'] + collected)
+    colosseum = Colosseum.recover(path, port='emulator://', clock=clock, start=False)
+    emulator = colosseum.serial.emulator
+    targets = schedule.targets()
+    # Connecting zeroed the firmware at the tube the run was left at.
+    assert colosseum.origin == pytest.approx(targets[position - 1])
+    assert emulator.positions == (0, 0, 0)
+
+    colosseum.resume()
+    assert colosseum.done
+    assert colosseum.position == N_FRACTIONS
+    # The remaining tube changes move to the same tubes as the original run,
+    # relative to where the firmware was zeroed.
+    moves = _move_tos(emulator)
+    assert moves == schedule.absolute(colosseum.origin)[position:]
+    assert np.array(emulator.positions) == pytest.approx(
+        targets[-1] - targets[position - 1]
+    )
+    # The current fraction is only collected for the rest of its dwell time,
+    # so the run keeps to its original plan.
+    assert [fraction.index for fraction in colosseum.fractions] == list(
+        range(position, N_FRACTIONS)
+    )
+    planned = [fraction.planned for fraction in colosseum.fractions]
+    assert planned == pytest.approx(schedule.changes[position:], abs=0.1)
+    assert colosseum.fractions[0].planned - advance['planned'] == pytest.approx(
+        INTERVAL, abs=0.1
+    )
+
+    # The events of the recovered run are appended after the cut-off line.
+    kinds = [event['event'] for event in read_journal(path)]
+    resumed = kinds.index('resume')
+    assert kinds[:resumed].count('advance') == position
+    assert kinds[resumed:] == ['resume'] + ['advance'] * (N_FRACTIONS - position) + ['stop']
+    assert replay(path)['position'] == N_FRACTIONS
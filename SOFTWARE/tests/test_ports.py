@@ -0,0 +1,47 @@
+"""Discovery and ranking of the Arduino ports.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m pytest tests
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from colosseum_ui import serial_comm
+from colosseum_ui.constants import ARDUINO_VID, EMULATOR_PORT
+
+PORTS = [
+    SimpleNamespace(device=f'/dev/ttyACM{i}', vid=ARDUINO_VID, serial_number=f'SN{i}')
+    for i in range(4)
+]
+
+@pytest.fixture
+def ports(monkeypatch):
+    # ttyACM2 was used last; ttyACM1 and ttyACM3 reply to the probe.
+    monkeypatch.setattr(serial_comm.serial.tools.list_ports, 'comports', lambda: PORTS)
+    monkeypatch.setattr(serial_comm, 'load_port_cache', lambda: {'SN2': '/dev/ttyACM2'})
+    monkeypatch.setattr(
+        serial_comm, 'probe_port',
+        lambda device, timeout: device in ('/dev/ttyACM1', '/dev/ttyACM3'),
+    )
+
+@pytest.mark.parametrize('kwargs, expected', [
+    # The port used last first
+    (dict(), [2, 0, 1, 3]),
+    # Ports that reply first, whether or not they were used last
+    (dict(probe=True), [1, 3, 2, 0]),
+])
+def test_port_ranking(ports, kwargs, expected):
+    assert serial_comm.get_arduino_ports(**kwargs) == [PORTS[i] for i in expected]
+
+def test_port_ranking_emulator_last(ports):
+    ranked = serial_comm.get_arduino_ports(probe=True, emulator=True)
+    assert ranked[-1] is EMULATOR_PORT
+
+def test_port_ranking_cached_port_replies(ports, monkeypatch):
+    monkeypatch.setattr(serial_comm, 'probe_port', lambda device, timeout: True)
+    ranked = serial_comm.get_arduino_ports(probe=True)
+    assert [port.device for port in ranked] == [
+        '/dev/ttyACM2', '/dev/ttyACM0', '/dev/ttyACM1', '/dev/ttyACM3',
+    ]
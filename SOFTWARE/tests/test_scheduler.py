@@ -0,0 +1,123 @@
+"""Deadlines of the tube changes, on a virtual clock.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m pytest tests
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from colosseum_ui.clock import VirtualClock
+from colosseum_ui.colosseum import Colosseum
+from colosseum_ui.scheduler import DeadlineScheduler
+from colosseum_ui.schedule import Schedule
+
+INTERVAL = 10.0
+# Seconds every command takes, from being sent to being acknowledged
+COMMAND_TIME = 0.3
+
+def _scheduler(clock, **kwargs):
+    return DeadlineScheduler(
+        start=clock.monotonic(), clock=clock.monotonic, sleep=clock.sleep,
+        wait_event=clock.wait, **kwargs
+    )
+
+def _change(scheduler, clock, n):
+    # Wait for the n-th tube change and send its command.
+    assert scheduler.wait(n)
+    sent = clock.monotonic()
+    clock.sleep(COMMAND_TIME)
+    return scheduler.record(n - 1, n, sent, clock.monotonic())
+
+@pytest.mark.parametrize('n_changes', [10, 1000])
+def test_no_drift(n_changes):
+    clock = VirtualClock()
+    scheduler = _scheduler(clock, interval=INTERVAL)
+    records = [_change(scheduler, clock, n) for n in range(1, n_changes + 1)]
+
+    # The command time is paid once, before the overhead is learnt, and never
+    # accumulates across tube changes.
+    errors = np.array([record.error for record in records])
+    assert errors[0] == pytest.approx(COMMAND_TIME)
+    assert np.all(np.diff(errors) <= 0)
+    assert errors[-1] == pytest.approx(0, abs=1e-3)
+    assert records[-1].planned == pytest.approx(n_changes * INTERVAL)
+    assert clock.monotonic() == pytest.approx(n_changes * INTERVAL, abs=1e-3)
+
+def test_overhead_converges():
+    clock = VirtualClock()
+    scheduler = _scheduler(clock, interval=INTERVAL)
+    for n in range(1, 21):
+        record = _change(scheduler, clock, n)
+        assert record.overhead == pytest.approx(COMMAND_TIME)
+        # Exponentially weighted moving average of a constant overhead
+        expected = COMMAND_TIME * (1 - (1 - scheduler.SMOOTHING) ** n)
+        assert scheduler.overhead == pytest.approx(expected)
+    assert scheduler.overhead == pytest.approx(COMMAND_TIME, rel=1e-5)
+
+def test_changes_and_lead():
+    clock = VirtualClock()
+    changes = np.array([5.0, 7.0, 20.0])
+    lead = np.array([1.0, 0.5, 2.0])
+    scheduler = _scheduler(clock, changes=changes, lead=lead)
+    for n, (change, travel) in enumerate(zip(changes, lead), start=1):
+        assert scheduler.deadline(n) == change
+        overhead = scheduler.overhead
+        assert scheduler.remaining(n) == pytest.approx(
+            change - travel - overhead - clock.monotonic()
+        )
+        record = _change(scheduler, clock, n)
+        # The command is sent 'travel' early, and the tube change happens once
+        # the move is done.
+        assert record.planned == change
+        assert record.actual == pytest.approx(change - overhead + COMMAND_TIME)
+
+def test_wait_interrupted():
+    clock = VirtualClock()
+    scheduler = _scheduler(clock, interval=INTERVAL)
+    interrupt = threading.Event()
+    interrupt.set()
+    assert not scheduler.wait(1, interrupt=interrupt)
+    assert clock.monotonic() == 0
+
+class PausingClock(VirtualClock):
+    """Virtual clock that calls 'pause' once it reaches 'pause_at'."""
+
+    def __init__(self, pause_at):
+        super().__init__(start=0.0)
+        self.pause_at = pause_at
+        self.pause = None
+
+    def wait(self, event, timeout):
+        if self.pause is not None and self.now + timeout >= self.pause_at:
+            self.sleep(self.pause_at - self.now)
+            pause, self.pause = self.pause, None
+            pause()
+        return super().wait(event, timeout)
+
+def test_pause_resume_shifts_deadlines():
+    pause_at, paused_for = 25.0, 100.0
+    clock = PausingClock(pause_at)
+    colosseum = Colosseum('emulator://', clock=clock)
+    schedule = Schedule.constant(INTERVAL, 6)
+    clock.pause = colosseum.pause
+
+    colosseum.run(schedule=schedule)
+    assert not colosseum.done
+    assert colosseum.position == 2
+    assert [fraction.planned for fraction in colosseum.fractions] == [10.0, 20.0]
+
+    clock.sleep(paused_for)
+    resumed = clock.monotonic() - colosseum.run_start
+    colosseum.resume()
+    assert colosseum.done
+    assert colosseum.position == len(schedule)
+
+    # The fraction that was paused is collected again in full after resuming,
+    # and every later tube change is shifted by as much.
+    planned = [fraction.planned for fraction in colosseum.fractions[2:]]
+    expected = resumed + schedule.offsets(2)
+    assert planned == pytest.approx(expected)
+    assert planned[0] == pytest.approx(pause_at + paused_for + INTERVAL)
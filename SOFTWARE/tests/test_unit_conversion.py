@@ -0,0 +1,78 @@
+"""Run parameters of the parameter table.
+
+Run from the SOFTWARE/ folder with:
+
+    python -m pytest tests
+"""
+import math
+
+import numpy as np
+import pytest
+
+from colosseum_ui.flow import FlowProfile
+from colosseum_ui.unit_conversion import RunParameters, RunSolver
+
+@pytest.mark.parametrize('given, expected', [
+    (dict(total_time=60, n_fractions=10), RunParameters(60, 60, 6, 10)),
+    (dict(total_time=60, fraction_volume=6), RunParameters(60, 60, 6, 10)),
+    (dict(total_volume=60, n_fractions=10), RunParameters(60, 60, 6, 10)),
+    (dict(total_volume=60, fraction_volume=6), RunParameters(60, 60, 6, 10)),
+    (dict(fraction_volume=6, n_fractions=10), RunParameters(60, 60, 6, 10)),
+    (dict(total_time=60), RunParameters(60, 60, None, None)),
+    (dict(n_fractions=10), RunParameters(None, None, None, 10)),
+    (dict(), RunParameters(None, None, None, None)),
+])
+def test_solve(given, expected):
+    assert RunSolver().solve(1.0, **given) == expected
+
+def test_solve_units():
+    solver = RunSolver('mL/min', 'min', 'mL', 'uL')
+    params = solver.solve(1.0, total_time=60, n_fractions=87)
+    assert params.total_volume == pytest.approx(60)
+    assert params.fraction_volume == pytest.approx(60000 / 87)
+
+def test_solve_arrays():
+    flow_rates = np.array([[1.0], [2.0]])
+    params = RunSolver().solve(flow_rates, total_time=60, n_fractions=np.arange(1, 4))
+    assert params.fraction_volume.shape == (2, 3)
+    assert params.fraction_volume == pytest.approx(flow_rates * 60 / np.arange(1, 4))
+
+def test_solve_profile():
+    profile = FlowProfile([0, 10], [1, 3])
+    params = RunSolver(profile=profile).solve(None, total_volume=20, n_fractions=2)
+    assert params.total_time == pytest.approx(float(profile.time_at_volume(20)))
+    assert params.fraction_volume == pytest.approx(10)
+
+@pytest.mark.parametrize('given, match', [
+    (dict(total_time=60, total_volume=60), 'total_time and total_volume'),
+    (dict(total_time=60, total_volume=60, n_fractions=10), 'over-determine'),
+    (dict(total_time=60, fraction_volume=6, n_fractions=10),
+     'total_time and fraction_volume and n_fractions over-determine'),
+    (dict(total_volume=60, fraction_volume=6, n_fractions=10), 'over-determine'),
+])
+def test_solve_over_determined(given, match):
+    with pytest.raises(ValueError, match=match):
+        RunSolver().solve(1.0, **given)
+
+@pytest.mark.parametrize('units, unit', [
+    (dict(flow_unit='L/day'), 'L/day'),
+    (dict(time_unit='fortnight'), 'fortnight'),
+    (dict(volume_unit='gallon'), 'gallon'),
+    (dict(fraction_unit='drop'), 'drop'),
+])
+def test_unknown_unit(units, unit):
+    with pytest.raises(ValueError, match=f"unknown unit '{unit}'"):
+        RunSolver(**units)
+
+@pytest.mark.parametrize('flow_rate, given, field, value', [
+    # No flow never delivers any volume.
+    (0.0, dict(total_volume=60), 'total_time', math.inf),
+    (0.0, dict(total_volume=0), 'total_time', math.nan),
+    (1.0, dict(total_volume=60, n_fractions=0), 'fraction_volume', math.inf),
+    (1.0, dict(total_volume=60, fraction_volume=0), 'n_fractions', math.inf),
+])
+def test_solve_division_by_zero(flow_rate, given, field, value):
+    # Numbers and arrays give the same, without raising.
+    for rate in (flow_rate, np.array([flow_rate])):
+        result = getattr(RunSolver().solve(rate, **given), field)
+        assert np.array_equal(np.ravel(result), [value], equal_nan=True)